@@ -10,7 +10,8 @@ import json
 import os
 
 # Azure OpenAI Embedding API 配置
-endpoint_url = "https://bk-cloud.openai.azure.com/openai/deployments/text-embedding-3-small/embeddings?api-version=2023-05-15"
+# 可通过环境变量 AZURE_OPENAI_EMBEDDING_ENDPOINT 指向本地模拟服务（test2/fake_azure_server.py）
+endpoint_url = os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT", "https://bk-cloud.openai.azure.com") + "/openai/deployments/text-embedding-3-small/embeddings?api-version=2023-05-15"
 api_key = os.getenv("TEXT_EMBEDDING_3_SMALL")
 
 # 设置请求头
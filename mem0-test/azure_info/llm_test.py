@@ -9,7 +9,8 @@ import json
 import os
 
 # Azure OpenAI API 配置
-endpoint_url = "https://bk-us-2.openai.azure.com/openai/deployments/gpt-4.1-nano/chat/completions?api-version=2025-01-01-preview"
+# 可通过环境变量 AZURE_OPENAI_LLM_ENDPOINT 指向本地模拟服务（test2/fake_azure_server.py）
+endpoint_url = os.getenv("AZURE_OPENAI_LLM_ENDPOINT", "https://bk-us-2.openai.azure.com") + "/openai/deployments/gpt-4.1-nano/chat/completions?api-version=2025-01-01-preview"
 api_key = os.getenv("GPT_41_NANO_KEY")
 
 # 设置请求头
@@ -0,0 +1,245 @@
+"""
+准入控制与背压
+供 mem0_server.py 使用：在请求进入线程池之前按接口类别和 user_id 限流
+
+- 每个接口类别（read / write / batch）有最大并发数与最大排队数，
+  并发已满时请求排队等待（最多 max_wait_seconds），排队也满或等待超时则返回 429
+- 每个 user_id 有最大待处理数（并发 + 排队），单个用户的突发请求不会占满整个类别
+- 429 响应带 Retry-After：按该类别观测到的平均服务时间与当前排队深度估算
+- 记录排队深度、拒绝次数（按原因）与排队等待时间，供 /stats 与 /metrics 使用
+
+以纯 ASGI 中间件实现：POST 请求需要从 JSON 请求体中读取 user_id，读取后原样回放给后续处理。
+"""
+
+import json
+import math
+import time
+import asyncio
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+
+class OverloadedError(Exception):
+    """请求被准入控制拒绝"""
+
+    def __init__(self, endpoint_class: str, reason: str, retry_after: int):
+        super().__init__(f"服务繁忙（{endpoint_class}: {reason}），请 {retry_after} 秒后重试")
+        self.endpoint_class = endpoint_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ClassState:
+    """单个接口类别的并发 / 排队状态"""
+
+    def __init__(self, name: str, max_in_flight: int, max_queued: int, max_wait_seconds: float):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queued = max(0, max_queued)
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.service_time = 1.0     # 服务时间的指数滑动平均（秒）
+        self.admitted = 0
+        self.shed: Dict[str, int] = {"queue_full": 0, "wait_timeout": 0, "user_limit": 0}
+        self.wait_total = 0.0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for w in self.waiters if not w.done())
+
+    def retry_after(self) -> int:
+        """排在当前队列之后大约需要等待的秒数"""
+        backlog = self.queued + self.in_flight + 1
+        return max(1, math.ceil(backlog * self.service_time / self.max_in_flight))
+
+
+class AdmissionController:
+    """按接口类别与 user_id 的准入控制（在事件循环线程中使用）"""
+
+    def __init__(
+        self,
+        classes: Dict[str, Dict[str, Any]],
+        per_user_max_pending: int = 16,
+        service_time_alpha: float = 0.2,
+        on_wait: Optional[Callable[[str, float], None]] = None,
+        on_shed: Optional[Callable[[str, str], None]] = None
+    ):
+        self.classes = {
+            name: _ClassState(
+                name,
+                limits["max_in_flight"],
+                limits["max_queued"],
+                limits.get("max_wait_seconds", 30.0)
+            )
+            for name, limits in classes.items()
+        }
+        self.per_user_max_pending = per_user_max_pending
+        self.alpha = service_time_alpha
+        self.on_wait = on_wait
+        self.on_shed = on_shed
+        self._user_pending: Dict[Tuple[str, str], int] = {}
+
+    def _shed(self, state: _ClassState, reason: str):
+        state.shed[reason] += 1
+        if self.on_shed is not None:
+            self.on_shed(state.name, reason)
+        raise OverloadedError(state.name, reason, state.retry_after())
+
+    async def acquire(self, endpoint_class: str, user_id: Optional[str]) -> Tuple[_ClassState, float]:
+        """取得执行许可；返回 (类别状态, 开始执行时间)"""
+        state = self.classes[endpoint_class]
+        user_key = (endpoint_class, user_id or "")
+        if user_id and self._user_pending.get(user_key, 0) >= self.per_user_max_pending:
+            self._shed(state, "user_limit")
+
+        started = time.perf_counter()
+        if state.in_flight < state.max_in_flight and not state.queued:
+            state.in_flight += 1
+        else:
+            if state.queued >= state.max_queued:
+                self._shed(state, "queue_full")
+            waiter = asyncio.get_running_loop().create_future()
+            state.waiters.append(waiter)
+            self._user_pending[user_key] = self._user_pending.get(user_key, 0) + 1
+            try:
+                # 被唤醒时许可已转交给本请求（in_flight 已计入）
+                await asyncio.wait_for(asyncio.shield(waiter), timeout=state.max_wait_seconds)
+            except BaseException as e:
+                # 等待超时或客户端断开
+                if waiter.done() and not waiter.cancelled():
+                    # 同时已被唤醒：把许可交还
+                    self._release_slot(state)
+                else:
+                    waiter.cancel()
+                if isinstance(e, asyncio.TimeoutError):
+                    self._shed(state, "wait_timeout")
+                raise
+            finally:
+                self._user_pending[user_key] -= 1
+                if not self._user_pending[user_key]:
+                    del self._user_pending[user_key]
+
+        waited = time.perf_counter() - started
+        state.wait_total += waited
+        state.admitted += 1
+        if self.on_wait is not None:
+            self.on_wait(endpoint_class, waited)
+        self._user_pending[user_key] = self._user_pending.get(user_key, 0) + 1
+        return state, time.perf_counter()
+
+    def release(self, state: _ClassState, user_id: Optional[str], service_started: float):
+        elapsed = time.perf_counter() - service_started
+        state.service_time = (1 - self.alpha) * state.service_time + self.alpha * elapsed
+        user_key = (state.name, user_id or "")
+        self._user_pending[user_key] -= 1
+        if not self._user_pending[user_key]:
+            del self._user_pending[user_key]
+        self._release_slot(state)
+
+    def _release_slot(self, state: _ClassState):
+        # 许可直接转交给下一个仍在等待的请求
+        while state.waiters:
+            waiter = state.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        state.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "in_flight": state.in_flight,
+                "queued": state.queued,
+                "max_in_flight": state.max_in_flight,
+                "max_queued": state.max_queued,
+                "admitted": state.admitted,
+                "shed": dict(state.shed),
+                "avg_wait_ms": round(state.wait_total / state.admitted * 1000, 2) if state.admitted else 0.0,
+                "service_time_ms": round(state.service_time * 1000, 2),
+                "retry_after_seconds": state.retry_after(),
+            }
+            for name, state in self.classes.items()
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI 中间件
+    classify(method, path) 返回接口类别，None 表示不限流；get_controller() 返回当前的控制器
+    """
+
+    def __init__(
+        self,
+        app,
+        classify: Callable[[str, str], Optional[str]],
+        get_controller: Callable[[], Optional[AdmissionController]],
+        max_body_bytes: int = 1 << 20
+    ):
+        self.app = app
+        self.classify = classify
+        self.get_controller = get_controller
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        controller = self.get_controller()
+        if scope["type"] != "http" or controller is None:
+            return await self.app(scope, receive, send)
+        endpoint_class = self.classify(scope["method"], scope["path"])
+        if endpoint_class is None:
+            return await self.app(scope, receive, send)
+
+        user_id = parse_qs(scope.get("query_string", b"").decode()).get("user_id", [None])[0]
+        if user_id is None and scope["method"] in ("POST", "PUT"):
+            user_id, receive = await self._user_id_from_body(receive)
+
+        try:
+            state, service_started = await controller.acquire(endpoint_class, user_id)
+        except OverloadedError as e:
+            body = json.dumps({"detail": str(e)}, ensure_ascii=False).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(e.retry_after).encode()),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(state, user_id, service_started)
+
+    async def _user_id_from_body(self, receive):
+        """读取请求体取出 user_id，并返回可回放请求体的 receive"""
+        messages = []
+        size = 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            size += len(message.get("body", b""))
+            if not message.get("more_body") or size > self.max_body_bytes:
+                break
+
+        user_id = None
+        if size <= self.max_body_bytes:
+            try:
+                payload = json.loads(b"".join(m.get("body", b"") for m in messages) or b"null")
+                if isinstance(payload, dict) and isinstance(payload.get("user_id"), str):
+                    user_id = payload["user_id"]
+            except ValueError:
+                pass
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        return user_id, replay
@@ -0,0 +1,421 @@
+"""
+批量写入记忆的流水线
+供 mem0_server.py 的 POST /memories/batch 使用
+
+Memory.add 对每条对话串行执行：事实抽取 -> 逐条 embedding -> 检索旧记忆 ->
+更新决策 -> 逐条写向量库 -> 逐条写历史表。批量导入时这些步骤按阶段重新组织：
+
+    阶段 1  事实抽取 LLM 调用（各条目并行）
+    阶段 2  所有事实一次性批量 embedding（多输入 Azure 调用）
+    阶段 3  检索旧记忆 + 更新决策 LLM 调用（各条目并行）
+    阶段 4  新增记忆合并为一次向量库写入 + 一个 SQLite 事务写历史
+
+infer=False 的条目跳过 LLM，直接进入阶段 2 和阶段 4。
+传入 dedup（dedup.py 的 DedupIndex）时：完全相同的重发条目不进入任何阶段；
+阶段 1 之后去掉同一范围内已存在的事实（infer=False 时为消息），没有剩余事实的条目跳过更新决策。
+程序性记忆（procedural_memory）和图数据库写入仍按条目调用 mem0，但并行执行；
+传入 procedural_summarizer 时，incremental=True 的程序性记忆条目走增量摘要（procedural_summary.py）。
+条目的 graph 参数：off / deferred 不写图数据库，only 只写图数据库。
+"""
+
+import json
+import uuid
+import hashlib
+import traceback
+from copy import deepcopy
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import pytz
+from mem0.configs.prompts import get_update_memory_messages
+from mem0.memory.utils import get_fact_retrieval_messages, parse_messages, remove_code_blocks
+
+from dedup import DedupIndex, request_digest
+from embedding_cache import embed_many
+from procedural_summary import ProceduralSummarizer
+
+
+def write_history_rows(db, rows: List[tuple]):
+    """在一个 SQLite 事务中批量写入 history 表"""
+    if not rows:
+        return
+    with db._lock:
+        db.connection.executemany(
+            """
+            INSERT INTO history (
+                id, memory_id, old_memory, new_memory, event,
+                created_at, updated_at, is_deleted, actor_id, role
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows
+        )
+        db.connection.commit()
+
+
+def _now() -> str:
+    """与 mem0 保持一致的时间戳格式"""
+    return datetime.now(pytz.timezone("US/Pacific")).isoformat()
+
+
+class _Item:
+    """批量请求中的单个条目及其中间状态"""
+
+    def __init__(self, index: int, request: Any):
+        self.index = index
+        self.request = request
+        self.messages = [msg.dict() for msg in request.messages]
+        self.metadata: Dict[str, Any] = {}
+        self.filters: Dict[str, Any] = {}
+        for key in ("user_id", "agent_id", "run_id"):
+            value = getattr(request, key, None)
+            if value:
+                self.metadata[key] = value
+                self.filters[key] = value
+        self.facts: List[str] = []
+        self.actions: List[Dict[str, Any]] = []
+        self.results: List[Dict[str, Any]] = []
+        self.relations: Optional[Any] = None
+        self.error: Optional[str] = None
+        self.digest: Optional[str] = None
+        self.deduplicated: Optional[Dict[str, Any]] = None
+
+    @property
+    def is_procedural(self) -> bool:
+        return bool(self.request.agent_id) and self.request.memory_type == "procedural_memory"
+
+    @property
+    def is_incremental(self) -> bool:
+        return self.is_procedural and bool(getattr(self.request, "incremental", False))
+
+    @property
+    def graph_mode(self) -> str:
+        return getattr(self.request, "graph", "on")
+
+
+class BatchIngestor:
+    """按阶段批量写入记忆"""
+
+    def __init__(
+        self,
+        memory,
+        llm_concurrency: int = 8,
+        procedural_prompt: Optional[str] = None,
+        dedup: Optional[DedupIndex] = None,
+        procedural_summarizer: Optional[ProceduralSummarizer] = None
+    ):
+        self.memory = memory
+        self.llm_concurrency = max(1, llm_concurrency)
+        self.procedural_prompt = procedural_prompt
+        self.dedup = dedup
+        self.procedural_summarizer = procedural_summarizer
+
+    # ----------------------------------------
+    # 入口
+    # ----------------------------------------
+
+    def run(self, requests: List[Any]) -> List[Dict[str, Any]]:
+        items = [_Item(idx, req) for idx, req in enumerate(requests)]
+        active = [item for item in items if not self._is_repeat(item)]
+        procedural = [item for item in active if item.is_procedural]
+        vector_items = [item for item in active if not item.is_procedural and item.graph_mode != "only"]
+        inferred = [item for item in vector_items if item.request.infer]
+        raw = [item for item in vector_items if not item.request.infer]
+
+        with ThreadPoolExecutor(max_workers=self.llm_concurrency, thread_name_prefix="mem0-batch") as pool:
+            # 程序性记忆与图写入和主流水线并行
+            procedural_futures = [pool.submit(self._guard, item, self._add_procedural, item) for item in procedural]
+            graph_futures = []
+            if getattr(self.memory, "enable_graph", False):
+                graph_futures = [
+                    pool.submit(self._add_graph, item)
+                    for item in active if not item.is_procedural and item.graph_mode in ("on", "only")
+                ]
+
+            # 阶段 1：事实抽取
+            list(pool.map(lambda item: self._guard(item, self._extract_facts, item), inferred))
+            self._drop_known(inferred, raw)
+
+            # 阶段 2：批量 embedding
+            fact_vectors = self._embed_stage(inferred, raw)
+
+            # 阶段 3：检索旧记忆 + 更新决策
+            list(pool.map(lambda item: self._guard(item, self._decide, item, fact_vectors), inferred))
+
+            # 阶段 4：合并写入
+            self._write_stage(inferred + raw, fact_vectors)
+
+            for future in procedural_futures + graph_futures:
+                future.result()
+
+        if self.dedup is not None:
+            for item in active:
+                if item.error is None and item.digest is not None:
+                    self.dedup.remember(item.request.user_id, item.digest)
+        return [self._item_result(item) for item in items]
+
+    # ----------------------------------------
+    # 去重
+    # ----------------------------------------
+
+    def _is_repeat(self, item: _Item) -> bool:
+        """消息级：与之前成功添加过的条目完全相同"""
+        if self.dedup is None or (item.is_incremental and self.procedural_summarizer is not None):
+            # 增量程序性记忆每次只发送新的一步，重复的消息也是新步骤
+            return False
+        item.digest = request_digest(item.request, item.messages)
+        if not self.dedup.seen(item.request.user_id, item.digest):
+            return False
+        self.dedup.record_hit("messages", len(item.messages))
+        item.deduplicated = {"level": "messages", "skipped": len(item.messages)}
+        return True
+
+    def _drop_known(self, inferred: List[_Item], raw: List[_Item]):
+        """事实级：去掉同一范围内已存在的事实 / 消息，省掉它们的 embedding 与更新决策"""
+        if self.dedup is None:
+            return
+        writes_graph = getattr(self.memory, "enable_graph", False)
+        for item in inferred + raw:
+            if item.error is not None:
+                continue
+            if item.request.infer:
+                known = self.dedup.known_texts(item.filters, item.facts)
+                kept = [fact for fact in item.facts if fact not in known]
+                skipped = len(item.facts) - len(kept)
+                item.facts = kept
+            elif writes_graph and item.graph_mode == "on":
+                # 图写入在并行读取 item.messages
+                continue
+            else:
+                item.messages, skipped = self.dedup.drop_known_messages(item.filters, item.messages)
+            if skipped:
+                self.dedup.record_hit("facts", skipped)
+                item.deduplicated = {"level": "facts", "skipped": skipped}
+
+    # ----------------------------------------
+    # 各阶段
+    # ----------------------------------------
+
+    def _extract_facts(self, item: _Item):
+        parsed_messages = parse_messages(item.messages)
+        custom_prompt = getattr(self.memory.config, "custom_fact_extraction_prompt", None)
+        if custom_prompt:
+            system_prompt = custom_prompt
+            user_prompt = f"Input:\n{parsed_messages}"
+        else:
+            system_prompt, user_prompt = get_fact_retrieval_messages(parsed_messages)
+
+        response = self.memory.llm.generate_response(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            response_format={"type": "json_object"},
+        )
+        try:
+            item.facts = json.loads(remove_code_blocks(response)).get("facts", [])
+        except Exception:
+            item.facts = []
+
+    def _embed_stage(self, inferred: List[_Item], raw: List[_Item]) -> Dict[str, List[float]]:
+        texts = []
+        for item in inferred:
+            if item.error is None:
+                texts.extend(item.facts)
+        for item in raw:
+            texts.extend(msg["content"] for msg in item.messages if msg["role"] != "system")
+
+        unique_texts = list(dict.fromkeys(texts))
+        try:
+            vectors = embed_many(self.memory.embedding_model, unique_texts, "add")
+        except Exception:
+            error = traceback.format_exc()
+            for item in inferred + raw:
+                item.error = item.error or error
+            return {}
+        return dict(zip(unique_texts, vectors))
+
+    def _decide(self, item: _Item, fact_vectors: Dict[str, List[float]]):
+        if item.error is not None or not item.facts:
+            return
+
+        retrieved_old_memory = []
+        for fact in item.facts:
+            existing = self.memory.vector_store.search(
+                query=fact,
+                vectors=fact_vectors[fact],
+                limit=5,
+                filters=item.filters,
+            )
+            for mem in existing:
+                retrieved_old_memory.append({"id": mem.id, "text": mem.payload.get("data", "")})
+
+        unique_data = {}
+        for mem in retrieved_old_memory:
+            unique_data[mem["id"]] = mem
+        retrieved_old_memory = list(unique_data.values())
+
+        # 用序号代替 UUID，避免模型编造 ID
+        temp_uuid_mapping = {}
+        for idx, mem in enumerate(retrieved_old_memory):
+            temp_uuid_mapping[str(idx)] = mem["id"]
+            retrieved_old_memory[idx]["id"] = str(idx)
+
+        prompt = get_update_memory_messages(
+            retrieved_old_memory, item.facts, self.memory.config.custom_update_memory_prompt
+        )
+        response = self.memory.llm.generate_response(
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+        )
+        try:
+            actions = json.loads(remove_code_blocks(response)).get("memory", [])
+        except Exception:
+            actions = []
+
+        for action in actions:
+            if action.get("event") in ("UPDATE", "DELETE"):
+                real_id = temp_uuid_mapping.get(str(action.get("id")))
+                if real_id is None:
+                    continue
+                action["id"] = real_id
+            item.actions.append(action)
+
+    def _write_stage(self, items: List[_Item], fact_vectors: Dict[str, List[float]]):
+        pending = []   # (item, text, metadata)
+        for item in items:
+            if item.error is not None:
+                continue
+            if item.request.infer:
+                for action in item.actions:
+                    event = action.get("event")
+                    text = action.get("text")
+                    if event == "ADD" and text:
+                        pending.append((item, text, deepcopy(item.metadata)))
+                    elif event in ("UPDATE", "DELETE"):
+                        self._guard(item, self._apply_change, item, action, fact_vectors)
+            else:
+                for msg in item.messages:
+                    if msg["role"] == "system":
+                        continue
+                    metadata = deepcopy(item.metadata)
+                    metadata["role"] = msg["role"]
+                    pending.append((item, msg["content"], metadata))
+
+        if not pending:
+            return
+
+        # 更新决策可能改写了事实文本，补齐缺失的向量
+        missing = list(dict.fromkeys(text for _, text, _ in pending if text not in fact_vectors))
+        if missing:
+            try:
+                fact_vectors.update(zip(missing, embed_many(self.memory.embedding_model, missing, "add")))
+            except Exception:
+                # 只有缺向量的条目失败；它们已执行的 UPDATE / DELETE 仍保留在结果中
+                error = traceback.format_exc()
+                failed = {id(item) for item, text, _ in pending if text not in fact_vectors}
+                for item, _, _ in pending:
+                    if id(item) in failed:
+                        item.error = item.error or error
+                pending = [entry for entry in pending if id(entry[0]) not in failed]
+                if not pending:
+                    return
+
+        vectors, ids, payloads, history_rows = [], [], [], []
+        for item, text, metadata in pending:
+            memory_id = str(uuid.uuid4())
+            created_at = _now()
+            metadata["data"] = text
+            metadata["hash"] = hashlib.md5(text.encode()).hexdigest()
+            metadata["created_at"] = created_at
+            vectors.append(fact_vectors[text])
+            ids.append(memory_id)
+            payloads.append(metadata)
+            history_rows.append((
+                str(uuid.uuid4()), memory_id, None, text, "ADD",
+                created_at, None, 0, metadata.get("actor_id"), metadata.get("role"),
+            ))
+            result = {"id": memory_id, "memory": text, "event": "ADD"}
+            if "role" in metadata:
+                result["role"] = metadata["role"]
+            item.results.append(result)
+
+        try:
+            self.memory.vector_store.insert(vectors=vectors, ids=ids, payloads=payloads)
+            write_history_rows(self.memory.db, history_rows)
+        except Exception:
+            error = traceback.format_exc()
+            for item, _, _ in pending:
+                item.error = item.error or error
+                item.results = [r for r in item.results if r.get("event") != "ADD"]
+
+    def _apply_change(self, item: _Item, action: Dict[str, Any], fact_vectors: Dict[str, List[float]]):
+        memory_id = action["id"]
+        if action["event"] == "UPDATE":
+            text = action.get("text")
+            vector = fact_vectors.get(text) or self.memory.embedding_model.embed(text, "update")
+            self.memory._update_memory(memory_id, text, {text: vector}, deepcopy(item.metadata))
+            item.results.append({
+                "id": memory_id,
+                "memory": text,
+                "event": "UPDATE",
+                "previous_memory": action.get("old_memory"),
+            })
+        else:
+            self.memory._delete_memory(memory_id)
+            item.results.append({"id": memory_id, "memory": action.get("text"), "event": "DELETE"})
+
+    def _add_procedural(self, item: _Item):
+        if item.is_incremental and self.procedural_summarizer is not None:
+            result = self.procedural_summarizer.add(
+                item.messages,
+                agent_id=item.request.agent_id,
+                user_id=item.request.user_id,
+                run_id=getattr(item.request, "run_id", None),
+            )
+            item.results.extend(result.get("results", []))
+            return
+        result = self.memory.add(
+            messages=item.messages,
+            user_id=item.request.user_id,
+            agent_id=item.request.agent_id,
+            run_id=getattr(item.request, "run_id", None),
+            infer=item.request.infer,
+            memory_type=item.request.memory_type,
+            prompt=self.procedural_prompt,
+        )
+        item.results.extend(result.get("results", []))
+        if "relations" in result:
+            item.relations = result["relations"]
+
+    def _add_graph(self, item: _Item):
+        try:
+            item.relations = self.memory._add_to_graph(item.messages, dict(item.filters))
+        except Exception:
+            item.relations = {"error": traceback.format_exc()}
+
+    # ----------------------------------------
+    # 工具方法
+    # ----------------------------------------
+
+    @staticmethod
+    def _guard(item: _Item, fn, *args):
+        """单个条目出错不影响整批"""
+        try:
+            fn(*args)
+        except Exception:
+            item.error = traceback.format_exc()
+
+    def _item_result(self, item: _Item) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "index": item.index,
+            "success": item.error is None,
+            "results": item.results,
+        }
+        if item.relations is not None:
+            result["relations"] = item.relations
+        if item.deduplicated is not None:
+            result["deduplicated"] = item.deduplicated
+        if item.error is not None:
+            result["error"] = item.error
+        return result
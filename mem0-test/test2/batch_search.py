@@ -0,0 +1,106 @@
+"""
+多查询批量搜索
+供 mem0_server.py 的 POST /memories/search/batch 使用
+
+规划类 agent 每一步会发出多条相关的搜索（"我喜欢吃什么" / "我喜欢干什么" / "关于苹果"），
+逐条调用 Memory.search 时每条都有一次 HTTP 往返和一次 embedding 请求。这里:
+
+    1. 所有查询一次多输入 embedding 请求（经过 embedding 缓存时只请求未命中的）
+    2. 一次 Qdrant query_batch_points 完成全部向量搜索（同一个用户过滤条件）
+    3. 可选：按记忆 ID 合并去重，保留最高分，并记录命中的查询序号
+
+单条结果的格式与 Memory.search 相同；graph=on 时图数据库搜索按查询并行执行。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from qdrant_client.models import QueryRequest
+
+from embedding_cache import embed_many
+from graph_mode import _build_filters, _require_graph
+from matryoshka import TwoTierVectorStore
+from memory_pager import format_record
+
+
+MAX_BATCH_QUERIES = 50
+
+
+def _search_vectors(memory, vectors: List[List[float]], filters: Dict[str, Any], limit: int):
+    """一次请求完成多条向量搜索，返回每条查询的命中列表"""
+    vector_store = memory.vector_store
+    if isinstance(vector_store, TwoTierVectorStore):
+        # 截断向量初筛 + 完整向量重打分
+        return vector_store.query_batch(vectors, filters, limit)
+    query_filter = vector_store._create_filter(filters)
+    # 开启量化时的 rescore / oversampling 参数（见 quantization.py）
+    params = getattr(vector_store, "quantization_search_params", None)
+    responses = vector_store.client.query_batch_points(
+        collection_name=vector_store.collection_name,
+        requests=[
+            QueryRequest(query=vector, filter=query_filter, limit=limit, with_payload=True, params=params)
+            for vector in vectors
+        ],
+    )
+    return [response.points for response in responses]
+
+
+def _format_hit(point) -> Dict[str, Any]:
+    item = format_record(point)
+    item["score"] = point.score
+    return item
+
+
+def merge_results(per_query: List[Dict[str, Any]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """按记忆 ID 去重，保留最高分，按分数降序"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for index, result in enumerate(per_query):
+        for item in result.get("results", []):
+            existing = merged.get(item["id"])
+            if existing is None:
+                merged[item["id"]] = {**item, "queries": [index]}
+                continue
+            existing["queries"].append(index)
+            if item["score"] > existing["score"]:
+                existing["score"] = item["score"]
+    ranked = sorted(merged.values(), key=lambda item: item["score"], reverse=True)
+    return ranked[:limit] if limit else ranked
+
+
+def search_many(
+    memory,
+    queries: List[str],
+    graph: str = "off",
+    user_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    run_id: Optional[str] = None,
+    limit: int = 5,
+    threshold: Optional[float] = None,
+    graph_concurrency: int = 8
+) -> List[Dict[str, Any]]:
+    """
+    批量搜索，返回与 queries 一一对应的结果（格式同 Memory.search）
+    graph: on 同时搜索图数据库 / off 只搜索向量库
+    """
+    if not queries:
+        return []
+    if graph not in ("on", "off"):
+        raise ValueError(f"批量搜索不支持的 graph 模式: {graph}")
+    if graph == "on":
+        _require_graph(memory)
+
+    _, filters = _build_filters(user_id, agent_id, run_id)
+
+    vectors = embed_many(memory.embedding_model, queries, "search")
+    hits = _search_vectors(memory, vectors, filters, limit)
+    results = [
+        {"results": [_format_hit(p) for p in points if threshold is None or p.score >= threshold]}
+        for points in hits
+    ]
+
+    if graph == "on":
+        with ThreadPoolExecutor(max_workers=min(graph_concurrency, len(queries))) as pool:
+            relations = list(pool.map(lambda q: memory.graph.search(q, filters, limit), queries))
+        for result, rel in zip(results, relations):
+            result["relations"] = rel
+    return results
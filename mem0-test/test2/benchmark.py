@@ -0,0 +1,395 @@
+"""
+mem0_server.py 压测与延迟基准工具
+按配置的并发数与到达速率回放工作负载，输出各接口的吞吐量与 p50/p95/p99（JSON）
+
+工作负载文件（可指定多个）:
+    chats*.txt    每行一个消息列表（JSON 数组），作为 add 的内容，
+                  其中 user 消息同时作为 search 的查询语句
+    *.jsonl       每行一个操作对象，显式指定操作:
+                    {"op": "add", "messages": [...], "user_id": "u1", "infer": true}
+                    {"op": "search", "query": "...", "user_id": "u1", "limit": 5}
+                    {"op": "get"} / {"op": "list"} / {"op": "delete"}
+                  不含 op 但含 messages 的行按 add 处理
+
+未显式指定操作时，按 --mix 的比例随机生成 add / search / get / list / delete，
+get 与 delete 使用本次运行中 add 返回的记忆 ID（尚无 ID 时退化为 list）。
+
+使用示例:
+  # 8 并发闭环压测 500 个请求
+  python benchmark.py run --workload chats.txt --concurrency 8 --requests 500 --output base.json
+
+  # 开环：每秒 20 个请求到达，持续 60 秒，自定义操作比例
+  python benchmark.py run --workload chats.txt chats3.txt --rate 20 --duration 60 \\
+      --mix add=0.2,search=0.6,get=0.1,list=0.05,delete=0.05 --output new.json
+
+  # 对比两次运行，p95 变差超过 10% 时返回码为 1
+  python benchmark.py compare base.json new.json --threshold 10
+
+开环模式（--rate）下延迟从计划发送时间算起，客户端排队也计入延迟，避免协同遗漏。
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import requests
+
+
+OPERATIONS = ("add", "search", "get", "list", "delete")
+DEFAULT_MIX = "add=0.3,search=0.5,get=0.1,list=0.05,delete=0.05"
+
+
+# ============================================
+# 工作负载
+# ============================================
+
+def load_workload(paths: List[str]) -> List[Dict[str, Any]]:
+    """读取工作负载文件，返回操作列表（add 操作带 messages，search 操作带 query）"""
+    entries = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                if isinstance(item, list):
+                    entries.append({"op": "add", "messages": item})
+                elif isinstance(item, dict) and item.get("op") in OPERATIONS:
+                    entries.append(item)
+                elif isinstance(item, dict) and "messages" in item:
+                    entries.append({**item, "op": "add"})
+    return entries
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"未知的操作: {name}")
+        weights[name] = float(value)
+    return weights
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """从已排序列表中取百分位数"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class WorkloadPlayer:
+    """按比例生成请求并发送，记录每个请求的延迟"""
+
+    def __init__(self, args, entries: List[Dict[str, Any]]):
+        self.args = args
+        self.base_url = args.server.rstrip("/")
+        self.rng = random.Random(args.seed)
+        self.adds = [e for e in entries if e["op"] == "add"]
+        self.explicit = [e for e in entries if e["op"] != "add"]
+        self.queries = [
+            msg["content"]
+            for e in self.adds for msg in e["messages"] if msg.get("role") == "user"
+        ] + [e["query"] for e in self.explicit if e["op"] == "search" and e.get("query")]
+        self.mix = parse_mix(args.mix)
+        self.scripted = args.scripted
+        self.entries = entries
+        self.cursor = 0
+
+        self.memory_ids: List[Tuple[str, str]] = []    # (user_id, memory_id)
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {op: [] for op in OPERATIONS}
+        self.errors: Dict[str, int] = {op: 0 for op in OPERATIONS}
+        self.shed: Dict[str, int] = {op: 0 for op in OPERATIONS}     # 被准入控制拒绝（429）
+        self.local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def _user(self) -> str:
+        return f"{self.args.user_prefix}_{self.rng.randrange(self.args.users)}"
+
+    def next_operation(self) -> Dict[str, Any]:
+        """取下一个操作：--scripted 时按文件顺序循环，否则按比例随机"""
+        with self.lock:
+            if self.scripted:
+                entry = dict(self.entries[self.cursor % len(self.entries)])
+                self.cursor += 1
+            else:
+                op = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+                if op == "add":
+                    entry = dict(self.adds[self.cursor % len(self.adds)])
+                    self.cursor += 1
+                elif op == "search":
+                    entry = {"op": "search", "query": self.rng.choice(self.queries)}
+                else:
+                    entry = {"op": op}
+            entry.setdefault("user_id", self._user())
+
+            # get / delete 需要已有的记忆 ID
+            if entry["op"] in ("get", "delete") and "memory_id" not in entry:
+                if not self.memory_ids:
+                    entry["op"] = "list"
+                elif entry["op"] == "delete":
+                    entry["user_id"], entry["memory_id"] = self.memory_ids.pop(
+                        self.rng.randrange(len(self.memory_ids))
+                    )
+                else:
+                    entry["user_id"], entry["memory_id"] = self.rng.choice(self.memory_ids)
+            return entry
+
+    def execute(self, entry: Dict[str, Any], scheduled: float):
+        op = entry["op"]
+        session = self._session()
+        ok = False
+        shed = False
+        try:
+            if op == "add":
+                body = {
+                    "messages": entry["messages"],
+                    "user_id": entry["user_id"],
+                    "infer": entry.get("infer", self.args.infer),
+                    "graph": entry.get("graph", self.args.graph),
+                }
+                for key in ("agent_id", "run_id", "memory_type"):
+                    if entry.get(key):
+                        body[key] = entry[key]
+                response = session.post(f"{self.base_url}/memories", json=body, timeout=self.args.timeout)
+            elif op == "search":
+                body = {
+                    "query": entry["query"],
+                    "user_id": entry["user_id"],
+                    "limit": entry.get("limit", 5),
+                    "graph": entry.get("graph", "on" if self.args.graph != "off" else "off"),
+                }
+                response = session.post(f"{self.base_url}/memories/search", json=body, timeout=self.args.timeout)
+            elif op == "get":
+                response = session.get(f"{self.base_url}/memories/{entry['memory_id']}", timeout=self.args.timeout)
+            elif op == "delete":
+                response = session.delete(f"{self.base_url}/memories/{entry['memory_id']}", timeout=self.args.timeout)
+            else:
+                response = session.get(
+                    f"{self.base_url}/memories",
+                    params={"user_id": entry["user_id"], "page_size": 100},
+                    timeout=self.args.timeout
+                )
+
+            shed = response.status_code == 429
+            data = response.json() if response.content else {}
+            ok = response.status_code < 400 and data.get("success", True)
+            if ok and op == "add":
+                results = (data.get("data") or {}).get("results", [])
+                with self.lock:
+                    self.memory_ids.extend(
+                        (entry["user_id"], r["id"]) for r in results if r.get("event") == "ADD"
+                    )
+        except Exception:
+            ok = False
+        finally:
+            elapsed = time.perf_counter() - scheduled
+            with self.lock:
+                self.samples[op].append(elapsed)
+                # 429 是准入控制的主动拒绝，只计入 shed，不算错误
+                if shed:
+                    self.shed[op] += 1
+                elif not ok:
+                    self.errors[op] += 1
+
+    def run(self) -> Dict[str, Any]:
+        args = self.args
+        started = time.perf_counter()
+        deadline = started + args.duration if args.duration else None
+        sent = 0
+
+        with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="bench") as pool:
+            if args.rate:
+                # 开环：按泊松到达间隔提交，延迟从计划时间算起
+                next_at = started
+                futures = []
+                while (deadline is None or next_at < deadline) and (args.requests is None or sent < args.requests):
+                    delay = next_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    futures.append(pool.submit(self.execute, self.next_operation(), next_at))
+                    sent += 1
+                    next_at += self.rng.expovariate(args.rate)
+                for future in futures:
+                    future.result()
+            else:
+                # 闭环：每个并发槽位发完一个再发下一个
+                counter_lock = threading.Lock()
+
+                def worker():
+                    nonlocal sent
+                    while True:
+                        with counter_lock:
+                            if args.requests is not None and sent >= args.requests:
+                                return
+                            sent += 1
+                        if deadline is not None and time.perf_counter() >= deadline:
+                            return
+                        self.execute(self.next_operation(), time.perf_counter())
+
+                for future in [pool.submit(worker) for _ in range(args.concurrency)]:
+                    future.result()
+
+        wall = time.perf_counter() - started
+        return self.report(wall)
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        def summarize(values: List[float], errors: int, shed: int) -> Dict[str, Any]:
+            values = sorted(values)
+            return {
+                "count": len(values),
+                "errors": errors,
+                "shed": shed,
+                "error_rate": round(errors / len(values), 4) if values else 0.0,
+                "shed_rate": round(shed / len(values), 4) if values else 0.0,
+                "throughput_rps": round(len(values) / wall, 3) if wall else 0.0,
+                "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+                "p50_ms": round(_percentile(values, 50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 95) * 1000, 2),
+                "p99_ms": round(_percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+            }
+
+        endpoints = {
+            op: summarize(values, self.errors[op], self.shed[op])
+            for op, values in self.samples.items() if values
+        }
+        all_values = [v for values in self.samples.values() for v in values]
+        return {
+            "meta": {
+                "server": self.base_url,
+                "workload": self.args.workload,
+                "concurrency": self.args.concurrency,
+                "rate": self.args.rate,
+                "mix": None if self.scripted else self.mix,
+                "users": self.args.users,
+                "infer": self.args.infer,
+                "graph": self.args.graph,
+                "seed": self.args.seed,
+                "started_at": datetime.now().isoformat(timespec="seconds"),
+                "wall_seconds": round(wall, 3),
+            },
+            "overall": summarize(all_values, sum(self.errors.values()), sum(self.shed.values())),
+            "endpoints": endpoints,
+        }
+
+
+# ============================================
+# 对比两次运行
+# ============================================
+
+COMPARED_METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "error_rate", "shed_rate")
+
+# 比例类指标：任何升高都记为退化
+_RATE_METRICS = ("error_rate", "shed_rate")
+
+
+def compare_runs(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """逐接口对比；错误率 / 拒绝率升高、延迟升高与吞吐量下降超过阈值（百分比）记为退化"""
+    rows = {}
+    regressions = []
+    for name in sorted(set(base["endpoints"]) | set(new["endpoints"]) | {"overall"}):
+        before = base["overall"] if name == "overall" else base["endpoints"].get(name)
+        after = new["overall"] if name == "overall" else new["endpoints"].get(name)
+        if not before or not after:
+            continue
+        row = {}
+        for metric in COMPARED_METRICS:
+            if metric not in before or metric not in after:
+                # 旧版本的报告没有 shed_rate
+                continue
+            old_value, new_value = before[metric], after[metric]
+            change = round((new_value - old_value) / old_value * 100, 2) if old_value else None
+            row[metric] = {"base": old_value, "new": new_value, "change_pct": change}
+            if metric in _RATE_METRICS:
+                worse = new_value > old_value
+            elif change is None:
+                worse = False
+            elif metric == "throughput_rps":
+                worse = change < -threshold
+            else:
+                worse = change > threshold
+            if worse:
+                regressions.append(f"{name}.{metric}")
+        rows[name] = row
+    return {"threshold_pct": threshold, "endpoints": rows, "regressions": regressions}
+
+
+# ============================================
+# 命令行
+# ============================================
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='mem0_server 压测与延迟基准工具',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="回放工作负载并输出结果 JSON")
+    run_parser.add_argument('--server', default='http://localhost:8000', help='服务器地址（默认: http://localhost:8000）')
+    run_parser.add_argument('--workload', nargs='+', default=['chats.txt'], metavar='FILE', help='工作负载文件（默认: chats.txt）')
+    run_parser.add_argument('--concurrency', type=int, default=8, help='并发数 / 客户端线程数（默认: 8）')
+    run_parser.add_argument('--rate', type=float, default=0.0, help='开环到达速率（请求/秒），0 表示闭环（默认: 0）')
+    run_parser.add_argument('--requests', type=int, default=None, help='请求总数')
+    run_parser.add_argument('--duration', type=float, default=None, help='运行时长（秒）')
+    run_parser.add_argument('--mix', default=DEFAULT_MIX, help=f'操作比例（默认: {DEFAULT_MIX}）')
+    run_parser.add_argument('--scripted', action='store_true', help='按工作负载文件中的顺序和操作回放，忽略 --mix')
+    run_parser.add_argument('--users', type=int, default=4, help='模拟的用户数（默认: 4）')
+    run_parser.add_argument('--user-prefix', default='bench_user', help='用户 ID 前缀（默认: bench_user）')
+    run_parser.add_argument('--infer', action='store_true', help='add 请求启用 infer')
+    run_parser.add_argument('--graph', default='on', choices=['on', 'off', 'only', 'deferred'], help='add 请求的 graph 模式（默认: on）')
+    run_parser.add_argument('--timeout', type=float, default=120.0, help='单个请求超时（秒）')
+    run_parser.add_argument('--seed', type=int, default=42, help='随机种子（默认: 42）')
+    run_parser.add_argument('--output', default=None, metavar='FILE', help='结果 JSON 输出路径（默认输出到标准输出）')
+
+    compare_parser = subparsers.add_parser("compare", help="对比两次运行的结果 JSON")
+    compare_parser.add_argument('base', help='基准结果 JSON')
+    compare_parser.add_argument('new', help='新结果 JSON')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='判定退化的变化百分比（默认: 10）')
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.base, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        with open(args.new, 'r', encoding='utf-8') as f:
+            new = json.load(f)
+        result = compare_runs(base, new, args.threshold)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        sys.exit(1 if result["regressions"] else 0)
+
+    if args.requests is None and args.duration is None:
+        args.requests = 200
+    entries = load_workload(args.workload)
+    if not any(e["op"] == "add" for e in entries) and not args.scripted:
+        parser.error("工作负载中没有可用于 add 的对话")
+
+    print(f"🚀 回放 {len(entries)} 条工作负载 -> {args.server}", file=sys.stderr)
+    result = WorkloadPlayer(args, entries).run()
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"✅ 结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+按用户批量清除记忆
+供 mem0_server.py 的 DELETE /memories 使用
+
+Memory.delete_all 逐条删除：每条记忆一次向量库删除 + 一行历史写入（且只处理
+vector_store.list 默认返回的前 100 条）。这里改为按页批量执行，内存与单次请求大小只与页大小有关:
+
+    阶段 1  分页 scroll 该用户的记忆（只取写历史需要的 data / actor_id / role），每页:
+              一次过滤删除（user_id 过滤 + 本页 ID，不会误删期间新写入的记忆）
+              一个 SQLite 事务写入本页的 DELETE 历史
+    阶段 2  一条 Cypher MATCH ... DETACH DELETE 清除图数据库中该用户的实体
+
+向量先于历史删除：中途失败时宁可缺少历史行，也不留下已记录删除但仍可检索的记忆。
+"""
+
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from qdrant_client.models import Filter, FilterSelector, HasIdCondition
+
+from batch_ingest import write_history_rows
+
+
+class BulkPurger:
+    """按过滤条件批量删除向量库、图数据库与历史表中的记忆"""
+
+    def __init__(self, memory, scroll_batch_size: int = 1000):
+        self.memory = memory
+        self.scroll_batch_size = scroll_batch_size
+
+    def purge(
+        self,
+        filters: Dict[str, Any],
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """删除匹配 filters 的全部记忆，返回各阶段数量与耗时"""
+        if not any(filters.get(key) for key in ("user_id", "agent_id", "run_id")):
+            raise ValueError("至少需要提供 user_id / agent_id / run_id 之一")
+
+        started = time.perf_counter()
+        report: Dict[str, Any] = {"filters": filters, "stage": "vectors", "collected": 0, "stages": {}}
+
+        def advance(stage: str, stage_started: float, **counts):
+            report["stages"][report["stage"]] = round(time.perf_counter() - stage_started, 3)
+            report.update(counts)
+            report["stage"] = stage
+            report["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+            if progress is not None:
+                progress(dict(report))
+
+        # 阶段 1：向量库与历史表，逐页删除
+        stage_started = time.perf_counter()
+        report.update(deleted=0, history_rows=0)
+        for page in self._pages(filters):
+            self._delete_vectors(filters, [record.id for record in page])
+            report["collected"] += len(page)
+            report["deleted"] += len(page)
+            rows = [
+                (
+                    str(uuid.uuid4()),
+                    str(record.id),
+                    (record.payload or {}).get("data"),
+                    None,
+                    "DELETE",
+                    None,
+                    None,
+                    1,
+                    (record.payload or {}).get("actor_id"),
+                    (record.payload or {}).get("role"),
+                )
+                for record in page
+            ]
+            write_history_rows(self.memory.db, rows)
+            report["history_rows"] += len(rows)
+            if progress is not None:
+                progress({**report, "elapsed_seconds": round(time.perf_counter() - started, 3)})
+        advance("graph", stage_started)
+
+        # 阶段 2：图数据库
+        stage_started = time.perf_counter()
+        graph_enabled = getattr(self.memory, "enable_graph", False)
+        if graph_enabled:
+            self.memory.graph.delete_all(filters)
+        advance("done", stage_started, graph_purged=graph_enabled)
+
+        report["duration_seconds"] = report.pop("elapsed_seconds")
+        return report
+
+    def _pages(self, filters) -> Iterator[List[Any]]:
+        """分页 scroll 匹配的记忆；offset 指向下一页的首个点，删除本页不影响后续分页"""
+        vector_store = self.memory.vector_store
+        offset = None
+        while True:
+            page, offset = vector_store.client.scroll(
+                collection_name=vector_store.collection_name,
+                scroll_filter=vector_store._create_filter(filters),
+                limit=self.scroll_batch_size,
+                offset=offset,
+                with_payload=["data", "actor_id", "role"],
+                with_vectors=False,
+            )
+            if page:
+                yield page
+            if offset is None:
+                return
+
+    def _delete_vectors(self, filters: Dict[str, Any], ids: List[Any]):
+        vector_store = self.memory.vector_store
+        base = vector_store._create_filter(filters)
+        vector_store.client.delete(
+            collection_name=vector_store.collection_name,
+            points_selector=FilterSelector(
+                filter=Filter(must=[*(base.must or []), HasIdCondition(has_id=ids)])
+            ),
+        )
@@ -0,0 +1,453 @@
+"""
+按用户合并近似重复的记忆
+用户的集合里会逐渐积累表达同一事实的多条记忆（"喜欢吃苹果" / "我喜欢吃苹果" / "用户喜欢吃苹果"），
+每次搜索都要多扫这些点，更新决策 LLM 的提示里也会塞进重复的旧记忆。
+
+    1. scroll 该用户的全部记忆与向量（Matryoshka 两级存储时取侧存储中的完整向量），
+       按 (user_id, agent_id, run_id) 归属范围分组，只在同一范围内合并；程序性记忆不参与合并
+    2. 分块计算余弦相似度（block_size 行 × 全部列，内存 O(block_size × n)），
+       相似度 >= threshold 的点对用并查集聚成簇
+    3. 每簇保留最长（其次最新）的一条；传递聚类可能把不相似的两端连在一起，
+       只合并与保留项本身相似度 >= threshold 的成员
+    4. 可选 use_llm：由 LLM 把簇内文本合并成一条；否则保留项文本不变
+    5. 保留项经 Memory._update_memory 写入合并后的文本和 merged_from（历史表记 UPDATE），
+       其余成员经 Memory._delete_memory 删除（历史表记 DELETE）
+
+写操作经过 vector_store，倒排索引 / 去重索引 / 两级存储的包装会同步更新。
+速率限制：writes_per_second（向量库写入）、llm_calls_per_minute、max_merges_per_run（每次运行最多合并的簇数）。
+
+供 mem0_server.py 的 POST /memories/compact 与定时任务使用；
+命令行只做离线评估（不修改数据，本地库有文件锁，需先停止 mem0_server.py）:
+    python compaction.py --path ./memorydb/vector --threshold 0.92
+"""
+
+import json
+import time
+import argparse
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import FieldCondition, Filter, MatchValue
+from mem0.memory.utils import remove_code_blocks
+
+from dedup import scope_of
+from matryoshka import TwoTierVectorStore
+from payload_index import DEFAULT_COLLECTION
+
+
+MERGE_PROMPT = """你负责整理用户的长期记忆。下面几条记忆表达的是同一件事，请合并为一条简洁的记忆：
+保留所有不重复的信息，不要编造，使用与原记忆相同的语言。
+只输出 JSON：{"memory": "合并后的记忆"}"""
+
+# 侧存储按 ID 批量读取时每批的数量（SQLite 参数个数上限）
+_SIDE_BATCH = 500
+
+# 由 _update_memory 重新生成的 payload 字段
+_REWRITTEN_PAYLOAD_KEYS = ("data", "hash", "created_at", "updated_at")
+
+
+# ============================================
+# 聚类
+# ============================================
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def cluster(matrix: np.ndarray, threshold: float, block_size: int = 1024) -> List[List[int]]:
+    """对已归一化的向量分块计算相似度，返回大小 >= 2 的簇（行号列表）"""
+    n = len(matrix)
+    uf = _UnionFind(n)
+    for start in range(0, n, block_size):
+        block = matrix[start:start + block_size] @ matrix.T
+        rows, cols = np.nonzero(block >= threshold)
+        for row, col in zip((rows + start).tolist(), cols.tolist()):
+            if col > row:
+                uf.union(row, col)
+
+    groups: Dict[int, List[int]] = {}
+    for idx in range(n):
+        groups.setdefault(uf.find(idx), []).append(idx)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def _pick_keeper(records: List[Any], members: List[int]) -> int:
+    """最长的文本信息最全；长度相同时取最近更新的"""
+    def key(idx):
+        payload = records[idx].payload or {}
+        return len(payload.get("data") or ""), payload.get("updated_at") or payload.get("created_at") or ""
+    return max(members, key=key)
+
+
+def plan_merges(records: List[Any], matrix: np.ndarray, threshold: float, block_size: int = 1024) -> List[Dict[str, Any]]:
+    """返回合并计划：[{keep, remove, scores}]，按可删除的条数降序"""
+    plans = []
+    for members in cluster(matrix, threshold, block_size):
+        keeper = _pick_keeper(records, members)
+        others = [idx for idx in members if idx != keeper]
+        scores = matrix[others] @ matrix[keeper]
+        remove = [(idx, float(score)) for idx, score in zip(others, scores) if score >= threshold]
+        if remove:
+            plans.append({
+                "keep": keeper,
+                "remove": [idx for idx, _ in remove],
+                "scores": [round(score, 4) for _, score in remove],
+            })
+    plans.sort(key=lambda plan: len(plan["remove"]), reverse=True)
+    return plans
+
+
+def plan_scoped_merges(records: List[Any], matrix: np.ndarray, threshold: float, block_size: int = 1024) -> List[Dict[str, Any]]:
+    """
+    按归属范围（user_id, agent_id, run_id）分别生成合并计划，不跨范围合并；
+    程序性记忆（每个 agent / run 一条摘要，由 ProceduralSummarizer 维护）跳过
+    """
+    groups: Dict[Tuple[str, str, str], List[int]] = {}
+    for idx, record in enumerate(records):
+        payload = record.payload or {}
+        if payload.get("memory_type") == "procedural_memory":
+            continue
+        groups.setdefault(scope_of(payload), []).append(idx)
+
+    plans = []
+    for indexes in groups.values():
+        if len(indexes) < 2:
+            continue
+        for plan in plan_merges([records[i] for i in indexes], matrix[indexes], threshold, block_size):
+            plans.append({**plan, "keep": indexes[plan["keep"]], "remove": [indexes[i] for i in plan["remove"]]})
+    plans.sort(key=lambda plan: len(plan["remove"]), reverse=True)
+    return plans
+
+
+# ============================================
+# 读取
+# ============================================
+
+def list_users(client, collection_name: str, batch_size: int = 1000) -> List[str]:
+    users, offset = set(), None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name, limit=batch_size, offset=offset,
+            with_payload=["user_id"], with_vectors=False,
+        )
+        users.update((r.payload or {}).get("user_id") for r in records)
+        if offset is None:
+            break
+    users.discard(None)
+    return sorted(users)
+
+
+def load_user_vectors(
+    client,
+    collection_name: str,
+    user_id: str,
+    side=None,
+    batch_size: int = 1000
+) -> Tuple[List[Any], np.ndarray]:
+    """scroll 用户的全部记忆，返回 (记录列表, 归一化的向量矩阵)；side 为 Matryoshka 侧存储"""
+    records, offset = [], None
+    user_filter = Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))])
+    while True:
+        page, offset = client.scroll(
+            collection_name=collection_name, scroll_filter=user_filter, limit=batch_size,
+            offset=offset, with_payload=True, with_vectors=side is None,
+        )
+        records.extend(page)
+        if offset is None:
+            break
+
+    if side is not None:
+        full: Dict[str, np.ndarray] = {}
+        ids = [str(r.id) for r in records]
+        for start in range(0, len(ids), _SIDE_BATCH):
+            full.update(side.get_many(ids[start:start + _SIDE_BATCH]))
+        # 侧存储缺失的点（迁移前写入）不参与合并
+        records = [r for r in records if str(r.id) in full]
+        vectors = [full[str(r.id)] for r in records]
+    else:
+        vectors = [r.vector for r in records]
+
+    if not records:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return records, normalize(np.asarray(vectors, dtype=np.float32))
+
+
+# ============================================
+# 合并
+# ============================================
+
+class RateLimiter:
+    """把调用间隔拉平到 rate 次 / 秒；rate <= 0 不限速"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Compactor:
+    """按用户合并近似重复的记忆"""
+
+    def __init__(
+        self,
+        memory,
+        threshold: float = 0.92,
+        block_size: int = 1024,
+        use_llm: bool = False,
+        max_merges_per_run: int = 500,
+        writes_per_second: float = 20,
+        llm_calls_per_minute: float = 30
+    ):
+        self.memory = memory
+        self.threshold = threshold
+        self.block_size = block_size
+        self.use_llm = use_llm
+        self.max_merges_per_run = max_merges_per_run
+        self._write_limiter = RateLimiter(writes_per_second)
+        self._llm_limiter = RateLimiter(llm_calls_per_minute / 60)
+
+    def run(
+        self,
+        user_id: Optional[str] = None,
+        dry_run: bool = False,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """合并指定用户（None 为全部用户）的近似重复记忆，返回各用户的条数变化"""
+        started = time.perf_counter()
+        vector_store = self.memory.vector_store
+        user_ids = [user_id] if user_id else list_users(vector_store.client, vector_store.collection_name)
+        report: Dict[str, Any] = {
+            "threshold": self.threshold,
+            "dry_run": dry_run,
+            "users": [],
+            "before": 0,
+            "after": 0,
+            "merged_clusters": 0,
+            "deleted": 0,
+            "llm_calls": 0,
+            "truncated": False,
+        }
+
+        budget = self.max_merges_per_run
+        for uid in user_ids:
+            if budget <= 0:
+                report["truncated"] = True
+                break
+            user_report = self.compact_user(uid, dry_run=dry_run, max_merges=budget)
+            budget -= user_report["merged_clusters"]
+            report["users"].append(user_report)
+            for key in ("before", "after", "merged_clusters", "deleted", "llm_calls"):
+                report[key] += user_report[key]
+            report["truncated"] = report["truncated"] or user_report["truncated"]
+            if progress is not None:
+                progress({**{k: v for k, v in report.items() if k != "users"}, "current_user": uid})
+
+        report["reduction"] = round(1 - report["after"] / report["before"], 4) if report["before"] else 0.0
+        report["duration_seconds"] = round(time.perf_counter() - started, 3)
+        return report
+
+    def compact_user(self, user_id: str, dry_run: bool = False, max_merges: Optional[int] = None) -> Dict[str, Any]:
+        vector_store = self.memory.vector_store
+        side = vector_store.side if isinstance(vector_store, TwoTierVectorStore) else None
+        records, matrix = load_user_vectors(vector_store.client, vector_store.collection_name, user_id, side=side)
+        plans = plan_scoped_merges(records, matrix, self.threshold, self.block_size)
+        truncated = max_merges is not None and len(plans) > max_merges
+        if truncated:
+            plans = plans[:max_merges]
+
+        report = {
+            "user_id": user_id,
+            "before": len(records),
+            "after": len(records),
+            "merged_clusters": 0,
+            "deleted": 0,
+            "llm_calls": 0,
+            "truncated": truncated,
+            "merges": [],
+        }
+        for plan in plans:
+            keeper = records[plan["keep"]]
+            removed = [records[idx] for idx in plan["remove"]]
+            text = keeper.payload.get("data")
+            if self.use_llm and not dry_run:
+                text = self._merge_text([keeper, *removed]) or text
+                report["llm_calls"] += 1
+            if not dry_run:
+                self._apply(keeper, matrix[plan["keep"]], text, removed)
+            report["merges"].append({
+                "keep": str(keeper.id),
+                "memory": text,
+                "removed": [{"id": str(r.id), "memory": r.payload.get("data"), "score": score}
+                            for r, score in zip(removed, plan["scores"])],
+            })
+            report["merged_clusters"] += 1
+            report["deleted"] += len(removed)
+            report["after"] -= len(removed)
+        return report
+
+    def _merge_text(self, records: List[Any]) -> Optional[str]:
+        self._llm_limiter.wait()
+        texts = "\n".join(f"- {r.payload.get('data')}" for r in records)
+        response = self.memory.llm.generate_response(
+            messages=[
+                {"role": "system", "content": MERGE_PROMPT},
+                {"role": "user", "content": texts},
+            ],
+            response_format={"type": "json_object"},
+        )
+        try:
+            merged = json.loads(remove_code_blocks(response)).get("memory")
+        except Exception:
+            return None
+        return merged.strip() if isinstance(merged, str) and merged.strip() else None
+
+    def _apply(self, keeper, keeper_vector: np.ndarray, text: str, removed: List[Any]):
+        # _update_memory 只从旧 payload 继承归属字段，其余元数据需要一并传入
+        metadata = {k: v for k, v in keeper.payload.items() if k not in _REWRITTEN_PAYLOAD_KEYS}
+        metadata["merged_from"] = list(keeper.payload.get("merged_from") or []) + [str(r.id) for r in removed]
+        # 文本未变时复用原向量，不重新 embedding
+        existing = {keeper.payload.get("data"): keeper_vector.tolist()}
+        self._write_limiter.wait()
+        self.memory._update_memory(str(keeper.id), text, existing, metadata)
+        for record in removed:
+            self._write_limiter.wait()
+            self.memory._delete_memory(str(record.id))
+
+
+class CompactionScheduler:
+    """
+    按固定间隔提交合并任务（由任务队列执行，可通过 GET /jobs/{job_id} 查看进度）
+    上一次提交的任务仍在排队或执行时跳过本轮
+    """
+
+    def __init__(self, job_queue, interval_seconds: float, payload: Optional[Dict[str, Any]] = None):
+        self.job_queue = job_queue
+        self.interval_seconds = interval_seconds
+        self.payload = payload or {}
+        self.last_job_id: Optional[str] = None
+        self.submitted = 0
+        self.skipped = 0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="mem0-compaction", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _loop(self):
+        while not self._stopping.wait(self.interval_seconds):
+            self.tick()
+
+    def tick(self) -> Optional[str]:
+        last = self.job_queue.get(self.last_job_id) if self.last_job_id else None
+        if last is not None and last["status"] in ("pending", "running"):
+            self.skipped += 1
+            return None
+        self.last_job_id = self.job_queue.enqueue("compact", dict(self.payload))
+        self.submitted += 1
+        return self.last_job_id
+
+    def stats(self) -> Dict[str, Any]:
+        last = self.job_queue.get(self.last_job_id) if self.last_job_id else None
+        return {
+            "interval_seconds": self.interval_seconds,
+            "submitted": self.submitted,
+            "skipped": self.skipped,
+            "last_job_id": self.last_job_id,
+            "last_status": last["status"] if last else None,
+        }
+
+
+# ============================================
+# 离线评估
+# ============================================
+
+def _print_report(reports: List[Dict[str, Any]], threshold: float, samples: int):
+    print("=" * 60)
+    before = sum(r["before"] for r in reports)
+    after = sum(r["after"] for r in reports)
+    print(f"阈值 {threshold}，{len(reports)} 个用户，{before} -> {after} 条记忆"
+          f"（减少 {(1 - after / before) * 100 if before else 0:.1f}%）")
+    for r in reports:
+        if not r["merged_clusters"]:
+            continue
+        print(f"  {r['user_id']}: {r['before']} -> {r['after']}（{r['merged_clusters']} 簇，{r['seconds']}s）")
+        for merge in r["merges"][:samples]:
+            print(f"    保留 {merge['memory']}")
+            for item in merge["removed"]:
+                print(f"      合并 {item['memory']} ({item['score']})")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='评估按用户合并近似重复记忆的效果（不修改数据）')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--path', default='./memorydb/vector', help='Qdrant 本地库路径（默认: ./memorydb/vector）')
+    target.add_argument('--url', default=None, help='Qdrant 服务端地址，如 http://localhost:6333')
+    parser.add_argument('--collection', default=DEFAULT_COLLECTION, help='集合名称（默认: mem0）')
+    parser.add_argument('--user-id', default=None, help='只评估该用户（默认: 全部用户）')
+    parser.add_argument('--threshold', type=float, default=0.92, help='余弦相似度阈值（默认: 0.92）')
+    parser.add_argument('--block-size', type=int, default=1024, help='分块大小（默认: 1024）')
+    parser.add_argument('--samples', type=int, default=3, help='每个用户打印的合并示例数（默认: 3）')
+    args = parser.parse_args()
+
+    qdrant = QdrantClient(url=args.url) if args.url else QdrantClient(path=args.path)
+    reports = []
+    for uid in [args.user_id] if args.user_id else list_users(qdrant, args.collection):
+        user_started = time.perf_counter()
+        records, matrix = load_user_vectors(qdrant, args.collection, uid)
+        plans = plan_scoped_merges(records, matrix, args.threshold, args.block_size)
+        removed = sum(len(plan["remove"]) for plan in plans)
+        reports.append({
+            "user_id": uid,
+            "before": len(records),
+            "after": len(records) - removed,
+            "merged_clusters": len(plans),
+            "seconds": round(time.perf_counter() - user_started, 3),
+            "merges": [
+                {
+                    "memory": records[plan["keep"]].payload.get("data"),
+                    "removed": [
+                        {"memory": records[idx].payload.get("data"), "score": score}
+                        for idx, score in zip(plan["remove"], plan["scores"])
+                    ],
+                }
+                for plan in plans
+            ],
+        })
+    _print_report(reports, args.threshold, args.samples)
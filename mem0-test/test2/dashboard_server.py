@@ -184,15 +184,23 @@ curl http://127.0.0.1:8888/query/graphdb
 import sqlite3
 import uvicorn
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Dict, Any
 from pathlib import Path
 from qdrant_client import QdrantClient
 import kuzu
 
+from json_response import FastJSONResponse, ResponseEncodingMiddleware
+
 # 创建 FastAPI 应用
-app = FastAPI(title="Memory Dashboard API", description="查询记忆数据库的接口")
+app = FastAPI(
+    title="Memory Dashboard API",
+    description="查询记忆数据库的接口",
+    default_response_class=FastJSONResponse
+)
+
+# 大结果集按 Accept-Encoding 压缩，?compact=1 只返回数据
+app.add_middleware(ResponseEncodingMiddleware)
 
 # 添加 CORS 中间件，允许前端页面访问 API
 app.add_middleware(
@@ -272,7 +280,7 @@ async def query_database(
     limit: int = None,
     event: str = None,
     memory_id: str = None
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     查询 sqlite 数据库中的 history 表
     
@@ -334,7 +342,7 @@ async def query_database(
         
         conn.close()
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "success": True,
             "count": len(result),
             "data": result
@@ -378,7 +386,7 @@ async def query_statistics():
         
         conn.close()
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "success": True,
             "statistics": {
                 "total_records": total,
@@ -396,7 +404,7 @@ async def query_vectordb(
     limit: int = None,
     user_id: str = None,
     include_vectors: bool = False
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     查询 Qdrant 向量数据库中的数据
     
@@ -478,7 +486,7 @@ async def query_vectordb(
             
             result.append(point_data)
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "success": True,
             "count": len(result),
             "collection_info": {
@@ -535,7 +543,7 @@ async def query_vectordb_statistics():
             "payload_schema": collection_info.payload_schema if hasattr(collection_info, 'payload_schema') else {}
         }
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "success": True,
             "statistics": stats
         })
@@ -548,7 +556,7 @@ async def query_vectordb_statistics():
 async def query_graphdb(
     user_id: str = None,
     limit: int = None
-) -> JSONResponse:
+) -> FastJSONResponse:
     """
     查询 Kuzu 图数据库中的节点和关系
     
@@ -617,7 +625,7 @@ async def query_graphdb(
                 "updated": str(row[5]) if row[5] else None
             })
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "success": True,
             "nodes_count": len(nodes),
             "relationships_count": len(relationships),
@@ -673,7 +681,7 @@ async def query_graphdb_statistics():
             count = int(row[1])
             relationship_types[rel_type] = count
         
-        return JSONResponse(content={
+        return FastJSONResponse(content={
             "success": True,
             "statistics": {
                 "nodes_count": nodes_count,
@@ -0,0 +1,219 @@
+"""
+添加记忆前的哈希去重
+客户端经常重发完全相同的消息（重试、agent 重复记录同一步骤、kemem_test.py 重跑），
+每次重发都要先付出事实抽取 LLM 与 embedding 的成本，mem0 最后才判定 NONE。
+
+两级检查，都在任何 embedding / LLM 调用之前（事实级在抽取之后、embedding 之前）:
+
+    消息级  规范化后的消息 + 添加参数的摘要，同一用户见过则整条请求直接返回
+    事实级  候选事实（infer=False 时即各条消息，批量导入时为抽取出的事实）的 md5
+            与同一范围（user_id / agent_id / run_id）已有记忆 payload 中的 hash 相同则跳过
+
+- hash 索引启动时 scroll 向量库建立，之后在 vector_store.insert / update / delete 上增量维护
+- 该用户的记忆被更新或删除时，清空其消息摘要，之后的重发会正常处理
+- 绕过 vector_store 的批量删除（bulk_purge）需调用 forget_user
+- 索引只在进程内存中；多进程模式下不启用
+"""
+
+import json
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+DEDUP_LEVELS = ("messages", "facts")
+
+_SCOPE_KEYS = ("user_id", "agent_id", "run_id")
+
+Scope = Tuple[str, str, str]
+
+
+def scope_of(values: Dict[str, Any]) -> Scope:
+    """记忆的归属范围，values 可以是 payload 或过滤条件"""
+    return tuple(values.get(key) or "" for key in _SCOPE_KEYS)
+
+
+def text_hash(text: str) -> str:
+    """与 mem0 payload 中 hash 字段相同的 md5"""
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def _normalize(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def message_digest(messages: List[Dict[str, Any]], **options) -> str:
+    """规范化后的消息（角色 + 折叠空白的内容）与影响结果的添加参数的摘要"""
+    normalized = [[msg.get("role"), _normalize(str(msg.get("content") or ""))] for msg in messages]
+    raw = json.dumps([normalized, sorted(options.items())], ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def request_digest(request: Any, messages: List[Dict[str, Any]]) -> str:
+    """AddMemoryRequest 的消息摘要"""
+    return message_digest(
+        messages,
+        **{key: getattr(request, key, None) for key in (*_SCOPE_KEYS, "infer", "memory_type", "graph")}
+    )
+
+
+class DedupIndex:
+    """按范围的记忆 hash 索引 + 每用户最近添加过的消息摘要（线程安全）"""
+
+    def __init__(self, max_digests_per_user: int = 1024):
+        self.max_digests_per_user = max_digests_per_user
+        self._hashes: Dict[Scope, Dict[str, Set[str]]] = {}      # 范围 -> hash -> memory_id 集合
+        self._memories: Dict[str, Tuple[Scope, str]] = {}         # memory_id -> (范围, hash)
+        self._digests: Dict[str, "OrderedDict[str, None]"] = {}   # user_id -> 消息摘要（LRU）
+        self._lock = threading.Lock()
+        self.hits = {level: 0 for level in DEDUP_LEVELS}
+        self.skipped = {level: 0 for level in DEDUP_LEVELS}
+
+    # ----------------------------------------
+    # hash 索引
+    # ----------------------------------------
+
+    def upsert(self, memory_id: Any, payload: Optional[Dict[str, Any]]):
+        payload = payload or {}
+        memory_id = str(memory_id)
+        scope = scope_of(payload)
+        digest = payload.get("hash") or (text_hash(payload["data"]) if payload.get("data") else None)
+        with self._lock:
+            self._remove_locked(memory_id)
+            if digest is None:
+                return
+            self._hashes.setdefault(scope, {}).setdefault(digest, set()).add(memory_id)
+            self._memories[memory_id] = (scope, digest)
+
+    def remove(self, memory_id: Any):
+        with self._lock:
+            self._remove_locked(str(memory_id))
+
+    def _remove_locked(self, memory_id: str):
+        entry = self._memories.pop(memory_id, None)
+        if entry is None:
+            return
+        scope, digest = entry
+        ids = self._hashes[scope][digest]
+        ids.discard(memory_id)
+        if not ids:
+            del self._hashes[scope][digest]
+            if not self._hashes[scope]:
+                del self._hashes[scope]
+        # 已有记忆变化后，之前的"重复"判断不再成立
+        self._digests.pop(scope[0], None)
+
+    def known_texts(self, filters: Dict[str, Any], texts: Iterable[str]) -> Set[str]:
+        """返回在同一范围内已作为记忆存在的文本"""
+        with self._lock:
+            hashes = self._hashes.get(scope_of(filters), {})
+            return {text for text in texts if text_hash(text) in hashes}
+
+    def drop_known_messages(
+        self, filters: Dict[str, Any], messages: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """infer=False：每条非 system 消息即一条记忆，去掉已存在的，返回 (剩余消息, 跳过数)"""
+        known = self.known_texts(filters, [m["content"] for m in messages if m["role"] != "system"])
+        kept = [m for m in messages if m["role"] == "system" or m["content"] not in known]
+        return kept, len(messages) - len(kept)
+
+    def build(self, memory, batch_size: int = 1000) -> int:
+        """scroll 向量库建立 hash 索引，返回记忆数"""
+        vector_store = memory.vector_store
+        count, offset = 0, None
+        while True:
+            records, offset = vector_store.client.scroll(
+                collection_name=vector_store.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=[*_SCOPE_KEYS, "hash", "data"],
+                with_vectors=False,
+            )
+            for record in records:
+                self.upsert(record.id, record.payload)
+            count += len(records)
+            if offset is None:
+                return count
+
+    # ----------------------------------------
+    # 消息摘要
+    # ----------------------------------------
+
+    def seen(self, user_id: str, digest: str) -> bool:
+        with self._lock:
+            digests = self._digests.get(user_id or "")
+            if digests is None or digest not in digests:
+                return False
+            digests.move_to_end(digest)
+            return True
+
+    def remember(self, user_id: str, digest: str):
+        with self._lock:
+            digests = self._digests.setdefault(user_id or "", OrderedDict())
+            digests[digest] = None
+            digests.move_to_end(digest)
+            while len(digests) > self.max_digests_per_user:
+                digests.popitem(last=False)
+
+    def forget_user(self, user_id: str):
+        """该用户的记忆被批量清除后调用"""
+        user_id = user_id or ""
+        with self._lock:
+            self._digests.pop(user_id, None)
+            for memory_id in [m for m, (scope, _) in self._memories.items() if scope[0] == user_id]:
+                del self._memories[memory_id]
+            for scope in [scope for scope in self._hashes if scope[0] == user_id]:
+                del self._hashes[scope]
+
+    # ----------------------------------------
+    # 统计
+    # ----------------------------------------
+
+    def record_hit(self, level: str, skipped: int = 1):
+        with self._lock:
+            self.hits[level] += 1
+            self.skipped[level] += skipped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "scopes": len(self._hashes),
+                "memories": len(self._memories),
+                "hits": dict(self.hits),
+                "skipped": dict(self.skipped),
+            }
+
+
+def install_dedup_index(memory, index: Optional[DedupIndex] = None) -> DedupIndex:
+    """建立 hash 索引，并在 Memory 实例的向量库写入方法上增量维护"""
+    index = index or DedupIndex()
+    index.build(memory)
+
+    vector_store = memory.vector_store
+    original_insert = vector_store.insert
+    original_update = vector_store.update
+    original_delete = vector_store.delete
+
+    def insert(vectors, payloads=None, ids=None):
+        result = original_insert(vectors=vectors, payloads=payloads, ids=ids)
+        for memory_id, payload in zip(ids or [], payloads or []):
+            index.upsert(memory_id, payload)
+        return result
+
+    def update(vector_id, vector=None, payload=None):
+        result = original_update(vector_id=vector_id, vector=vector, payload=payload)
+        if payload is not None:
+            index.upsert(vector_id, payload)
+        return result
+
+    def delete(vector_id):
+        result = original_delete(vector_id=vector_id)
+        index.remove(vector_id)
+        return result
+
+    vector_store.insert = insert
+    vector_store.update = update
+    vector_store.delete = delete
+    return index
@@ -0,0 +1,234 @@
+"""
+内容寻址的 embedding 缓存
+挡在 Azure embedder 前面，相同文本只请求一次 text-embedding-3-small
+
+缓存键为 (model, dims, md5(text))，与 Qdrant payload 中的 hash 字段算法一致。
+model 一列带上服务地址与部署名（见 cache_model_key），指向 fake_azure_server.py 时写入的假向量
+不会被连接真实 Azure 的运行读到。
+两级存储：
+    - 进程内 LRU（OrderedDict）
+    - 磁盘 SQLite（默认 ./memorydb/embcache/embeddings.db），重启后依然有效
+
+使用方式:
+    memory = Memory.from_config(config_dict=config)
+    cache = install_embedding_cache(memory)
+    ...
+    print(cache.stats())
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+DEFAULT_CACHE_PATH = "./memorydb/embcache/embeddings.db"
+
+# 单次 embedding 请求的最大输入条数（Azure 上限为 2048）
+EMBED_CHUNK_SIZE = 256
+
+
+def embed_many(embedder, texts: List[str], memory_action: str = "add") -> List[List[float]]:
+    """
+    批量计算 embedding
+
+    优先使用 embedder 自带的 embed_batch；否则对 Azure/OpenAI embedder
+    直接发送多输入请求；其它 provider 退化为逐条调用。
+    """
+    if not texts:
+        return []
+    if hasattr(embedder, "embed_batch"):
+        return embedder.embed_batch(texts, memory_action)
+
+    client = getattr(embedder, "client", None)
+    if client is None or not hasattr(client, "embeddings"):
+        return [embedder.embed(text, memory_action) for text in texts]
+
+    vectors: List[List[float]] = []
+    for start in range(0, len(texts), EMBED_CHUNK_SIZE):
+        chunk = [text.replace("\n", " ") for text in texts[start:start + EMBED_CHUNK_SIZE]]
+        response = client.embeddings.create(input=chunk, model=embedder.config.model)
+        vectors.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+    return vectors
+
+
+def cache_model_key(config) -> str:
+    """缓存键中的模型标识：model@服务地址/部署名"""
+    azure = getattr(config, "azure_kwargs", None)
+    endpoint = getattr(azure, "azure_endpoint", None) or getattr(config, "openai_base_url", None) or ""
+    deployment = getattr(azure, "azure_deployment", None) or ""
+    if not endpoint and not deployment:
+        return config.model
+    return f"{config.model}@{endpoint.rstrip('/')}/{deployment}"
+
+
+def text_hash(text: str) -> str:
+    """与 mem0 payload 中 hash 字段相同的 md5"""
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """两级 embedding 缓存：进程内 LRU + SQLite"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lru: "OrderedDict[Tuple[str, int, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0   # 按未命中的平均请求耗时估算
+        self._miss_seconds = 0.0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                dims INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (model, dims, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, dims: int, hashes: List[str]) -> Dict[str, List[float]]:
+        """批量查询，返回命中的 hash -> 向量"""
+        found: Dict[str, List[float]] = {}
+        disk_lookup = []
+        with self._lock:
+            for h in hashes:
+                key = (model, dims, h)
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    found[h] = vector
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.append(h)
+
+            for h in disk_lookup:
+                row = self._conn.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND dims = ? AND text_hash = ?",
+                    (model, dims, h)
+                ).fetchone()
+                if row is None:
+                    continue
+                vector = array("f", row[0]).tolist()
+                self._remember((model, dims, h), vector)
+                found[h] = vector
+                self.disk_hits += 1
+
+            if self._miss_seconds and self.misses:
+                hits = len(found)
+                self.saved_seconds += hits * (self._miss_seconds / self.misses)
+        return found
+
+    def put_many(self, model: str, dims: int, entries: Dict[str, List[float]], elapsed: float = 0.0):
+        """写入新计算的向量（一个事务）"""
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            self.misses += len(entries)
+            self._miss_seconds += elapsed
+            for h, vector in entries.items():
+                self._remember((model, dims, h), vector)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, dims, text_hash, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(model, dims, h, array("f", vector).tobytes(), now) for h, vector in entries.items()]
+            )
+            self._conn.commit()
+
+    def _remember(self, key: Tuple[str, int, str], vector: List[float]):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / total, 4) if total else 0.0,
+                "memory_entries": len(self._lru),
+                "disk_entries": disk_entries,
+                "saved_seconds_estimate": round(self.saved_seconds, 3),
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbedder:
+    """
+    包装 mem0 的 embedder，对 embed 调用做缓存
+
+    未拦截的属性（config、client 等）原样转发给被包装的 embedder。
+    Azure embedder 不区分 memory_action，因此它不参与缓存键。
+    """
+
+    def __init__(self, inner, cache: EmbeddingCache):
+        self._inner = inner
+        self._cache = cache
+        self._model = cache_model_key(inner.config)
+        self._dims = inner.config.embedding_dims or 0
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def embed(self, text: str, memory_action: Optional[str] = None) -> List[float]:
+        return self.embed_batch([text], memory_action)[0]
+
+    def embed_batch(self, texts: List[str], memory_action: Optional[str] = None) -> List[List[float]]:
+        """批量 embedding，只对未命中的文本发起一次多输入请求"""
+        # mem0 在请求前会把换行替换为空格，缓存键按实际发送的文本计算
+        normalized = [text.replace("\n", " ") for text in texts]
+        hashes = [text_hash(text) for text in normalized]
+        found = self._cache.get_many(self._model, self._dims, list(dict.fromkeys(hashes)))
+
+        missing = {}
+        for h, text in zip(hashes, normalized):
+            if h not in found and h not in missing:
+                missing[h] = text
+
+        if missing:
+            started = time.perf_counter()
+            vectors = embed_many(self._inner, list(missing.values()), memory_action or "add")
+            computed = dict(zip(missing.keys(), vectors))
+            self._cache.put_many(self._model, self._dims, computed, time.perf_counter() - started)
+            found.update(computed)
+
+        return [found[h] for h in hashes]
+
+
+def install_embedding_cache(
+    memory,
+    path: str = DEFAULT_CACHE_PATH,
+    max_entries: int = 10000
+) -> EmbeddingCache:
+    """给 Memory 实例（以及图数据库的 embedder）装上缓存"""
+    cache = EmbeddingCache(path=path, max_entries=max_entries)
+    memory.embedding_model = CachedEmbedder(memory.embedding_model, cache)
+
+    graph = getattr(memory, "graph", None)
+    if graph is not None and hasattr(graph, "embedding_model"):
+        graph.embedding_model = CachedEmbedder(graph.embedding_model, cache)
+    return cache
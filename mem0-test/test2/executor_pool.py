@@ -0,0 +1,245 @@
+"""
+Mem0 服务器执行器层
+把同步的 Memory 调用放到线程池中执行，避免阻塞 uvicorn 事件循环
+
+- 读池（search / get / get_all）与写池（add / update / delete）相互隔离，
+  慢的 add 调用不会占满读请求的线程
+- 每个池都有排队深度上限，超过上限时直接拒绝（PoolFullError）
+- 每个池记录排队等待时间与执行耗时，供 /stats 查看
+- Qdrant 本地模式的客户端与 Kuzu 连接不是线程安全的，install_storage_lock 让各线程通过
+  同一把锁串行访问（Qdrant 服务端模式不加锁）
+
+环境变量（均可选）:
+    MEM0_READ_WORKERS   - 读池线程数（默认 8）
+    MEM0_READ_QUEUE     - 读池最大排队数（默认 64）
+    MEM0_WRITE_WORKERS  - 写池线程数（默认 4）
+    MEM0_WRITE_QUEUE    - 写池最大排队数（默认 32）
+"""
+
+import os
+import math
+import time
+import asyncio
+import threading
+import inspect
+import functools
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from payload_index import is_local_client
+
+
+class PoolFullError(Exception):
+    """线程池排队已满"""
+
+    def __init__(self, pool_name: str, pending: int, retry_after: int = 1):
+        super().__init__(f"{pool_name} 线程池繁忙（待处理 {pending} 个任务），请 {retry_after} 秒后重试")
+        self.pool_name = pool_name
+        self.pending = pending
+        self.retry_after = retry_after
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    """从已排序列表中取百分位数"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class BoundedPool:
+    """带排队上限和延迟统计的线程池"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, window: int = 1024):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f"mem0-{name}"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0      # 已提交但未完成（排队 + 执行中）
+        self._active = 0       # 正在执行
+        self._completed = 0
+        self._errors = 0
+        self._rejected = 0
+        self._latencies = deque(maxlen=window)   # 执行耗时（秒）
+        self._waits = deque(maxlen=window)       # 排队等待时间（秒）
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def queued(self) -> int:
+        return max(0, self._pending - self._active)
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """在池中执行同步函数并等待结果"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise PoolFullError(self.name, self._pending, self._retry_after())
+            self._pending += 1
+
+        submitted_at = time.perf_counter()
+        started = False
+
+        def _task():
+            nonlocal started
+            started = True
+            started_at = time.perf_counter()
+            with self._lock:
+                self._active += 1
+                self._waits.append(started_at - submitted_at)
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - started_at
+                with self._lock:
+                    self._active -= 1
+                    self._pending -= 1
+                    self._completed += 1
+                    if failed:
+                        self._errors += 1
+                    self._latencies.append(elapsed)
+
+        # 复制当前上下文，保证 contextvars 在工作线程中可见
+        ctx = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, ctx.run, _task)
+        except RuntimeError:
+            # 执行器已关闭，任务未被调度；fn 自身抛出的 RuntimeError 已在 _task 中计数
+            if not started:
+                with self._lock:
+                    self._pending -= 1
+            raise
+
+    def _retry_after(self) -> int:
+        """按平均执行耗时估算排空当前积压所需的秒数（调用方持有锁）"""
+        if not self._latencies:
+            return 1
+        avg = sum(self._latencies) / len(self._latencies)
+        return max(1, math.ceil(self._pending * avg / self.max_workers))
+
+    def stats(self) -> Dict[str, Any]:
+        """返回池的运行统计"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            waits = sorted(self._waits)
+            pending = self._pending
+            active = self._active
+            completed = self._completed
+            errors = self._errors
+            rejected = self._rejected
+
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "active": active,
+            "queued": max(0, pending - active),
+            "completed": completed,
+            "errors": errors,
+            "rejected": rejected,
+            "latency_ms": {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+                "p50": round(_percentile(latencies, 50) * 1000, 2),
+                "p95": round(_percentile(latencies, 95) * 1000, 2),
+                "p99": round(_percentile(latencies, 99) * 1000, 2),
+            },
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+                "p95": round(_percentile(waits, 95) * 1000, 2),
+                "max": round(waits[-1] * 1000, 2) if waits else 0.0,
+            },
+        }
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池"""
+        self._executor.shutdown(wait=wait)
+
+
+class ExecutorLayer:
+    """读写分离的执行器层"""
+
+    def __init__(
+        self,
+        read_workers: int = 8,
+        read_queue: int = 64,
+        write_workers: int = 4,
+        write_queue: int = 32
+    ):
+        self.read = BoundedPool("read", read_workers, read_queue)
+        self.write = BoundedPool("write", write_workers, write_queue)
+
+    @classmethod
+    def from_env(cls) -> "ExecutorLayer":
+        """从环境变量读取配置"""
+        return cls(
+            read_workers=int(os.getenv("MEM0_READ_WORKERS", "8")),
+            read_queue=int(os.getenv("MEM0_READ_QUEUE", "64")),
+            write_workers=int(os.getenv("MEM0_WRITE_WORKERS", "4")),
+            write_queue=int(os.getenv("MEM0_WRITE_QUEUE", "32")),
+        )
+
+    async def run_read(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """在读池中执行"""
+        return await self.read.run(fn, *args, **kwargs)
+
+    async def run_write(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """在写池中执行"""
+        return await self.write.run(fn, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "read": self.read.stats(),
+            "write": self.write.stats(),
+        }
+
+    def shutdown(self, wait: bool = True):
+        self.read.shutdown(wait=wait)
+        self.write.shutdown(wait=wait)
+
+
+# ============================================
+# 嵌入式存储串行访问
+# ============================================
+
+def _locked(fn: Callable[..., Any], lock) -> Callable[..., Any]:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with lock:
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def install_storage_lock(memory, lock=None) -> Dict[str, bool]:
+    """
+    用一把锁串行化 Memory 实例对嵌入式存储的访问，返回各存储是否加锁
+    Qdrant 本地模式下锁加在 QdrantLocal 的公开方法上，经 vector_store 包装层或直接用 client 的调用都会经过；
+    Kuzu 锁加在 graph.kuzu_execute 上（mem0 的图操作都经由它执行）
+    """
+    lock = lock or threading.RLock()
+    locked = {"vector_store": False, "graph": False}
+
+    client = getattr(memory.vector_store, "client", None)
+    if is_local_client(client):
+        local = client._client
+        for name, member in inspect.getmembers(type(local), inspect.isfunction):
+            if not name.startswith("_"):
+                setattr(local, name, _locked(getattr(local, name), lock))
+        locked["vector_store"] = True
+
+    graph = getattr(memory, "graph", None)
+    if getattr(memory, "enable_graph", False) and graph is not None:
+        graph.kuzu_execute = _locked(graph.kuzu_execute, lock)
+        locked["graph"] = True
+    return locked
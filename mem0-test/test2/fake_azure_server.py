@@ -0,0 +1,296 @@
+"""
+本地模拟的 Azure OpenAI 服务
+兼容 chat/completions 与 embeddings 的请求 / 响应格式，用于离线基准测试和 CI
+
+- embedding：字符 n-gram 特征哈希得到的确定性向量（默认 1536 维，已归一化），
+  相同文本得到相同向量，字面相近的文本向量也相近，检索结果可复现
+- chat：按 mem0 的调用类型返回规则生成的结果
+    事实抽取      每条 user 消息作为一条 fact
+    更新决策      已有记忆保持 NONE，新的 fact 全部 ADD（与已有记忆完全相同的跳过）
+    程序性记忆    逐条列出消息的确定性摘要
+    图数据库工具   返回空的实体 / 关系
+  也可以通过 --script 指定 JSONL 脚本：{"match": "子串", "response": "回复内容"}，按顺序优先匹配
+- 可配置注入延迟与错误率（返回 Azure 格式的错误响应）
+
+运行方式:
+    python fake_azure_server.py --port 8100 --latency-ms 30 --error-rate 0.01
+
+然后让 mem0_server.py / kemem_test.py 指向本地:
+    export AZURE_OPENAI_LLM_ENDPOINT=http://localhost:8100
+    export AZURE_OPENAI_EMBEDDING_ENDPOINT=http://localhost:8100
+    export GPT_41_NANO_KEY=fake TEXT_EMBEDDING_3_SMALL=fake
+"""
+
+import re
+import ast
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+DEFAULT_DIMS = 1536
+NGRAM_SIZES = (1, 2, 3)
+
+
+# ============================================
+# Embedding
+# ============================================
+
+def _hash_int(text: str) -> int:
+    return int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "little")
+
+
+def fake_embedding(text: str, dims: int = DEFAULT_DIMS) -> List[float]:
+    """字符 n-gram 带符号特征哈希，L2 归一化"""
+    vector = [0.0] * dims
+    normalized = text.lower()
+    for n in NGRAM_SIZES:
+        for i in range(max(1, len(normalized) - n + 1)):
+            h = _hash_int(f"{n}:{normalized[i:i + n]}")
+            vector[h % dims] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector))
+    if norm == 0:
+        # 空文本：退化为由哈希决定的单位向量
+        vector[_hash_int(text) % dims] = 1.0
+        return vector
+    return [v / norm for v in vector]
+
+
+def _token_estimate(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# ============================================
+# Chat completions
+# ============================================
+
+_CODE_BLOCK = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+def _literal(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except ValueError:
+        return ast.literal_eval(text)
+
+
+def _extract_facts(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """mem0 把对话整理为 "user: ...\\nassistant: ..." 文本放在最后一条消息中"""
+    conversation = str(messages[-1].get("content", ""))
+    facts = [
+        line.split(":", 1)[1].strip()
+        for line in conversation.splitlines()
+        if line.lower().startswith("user:") and line.split(":", 1)[1].strip()
+    ]
+    return {"facts": facts}
+
+
+def _update_decision(prompt: str) -> Dict[str, Any]:
+    """解析更新决策 prompt 中的已有记忆与新 fact（最后两个代码块）"""
+    blocks = _CODE_BLOCK.findall(prompt)
+    try:
+        old_memory = _literal(blocks[-2].strip()) if len(blocks) >= 2 else []
+        new_facts = _literal(blocks[-1].strip()) if blocks else []
+    except (ValueError, SyntaxError):
+        old_memory, new_facts = [], []
+
+    memory = [{"id": str(m["id"]), "text": m["text"], "event": "NONE"} for m in old_memory or []]
+    existing = {m["text"] for m in memory}
+    next_id = len(memory)
+    for fact in new_facts or []:
+        if fact in existing:
+            continue
+        memory.append({"id": str(next_id), "text": fact, "event": "ADD"})
+        existing.add(fact)
+        next_id += 1
+    return {"memory": memory}
+
+
+def _procedural_summary(messages: List[Dict[str, Any]]) -> str:
+    steps = [m for m in messages[1:-1] if m.get("role") in ("user", "assistant")]
+    lines = ["## Summary of the agent's execution history", ""]
+    for idx, msg in enumerate(steps, 1):
+        lines.append(f"{idx}. **Agent Action**: {msg.get('role')}")
+        lines.append(f"   **Action Result**: {msg.get('content')}")
+    return "\n".join(lines)
+
+
+class FakeChat:
+    """按 mem0 调用类型生成确定性回复"""
+
+    def __init__(self, script: Optional[List[Dict[str, str]]] = None):
+        self.script = script or []
+
+    def respond(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """返回 {"content": ...} 或 {"tool_calls": [...]}"""
+        messages = body.get("messages", [])
+        joined = "\n".join(str(m.get("content", "")) for m in messages)
+
+        for rule in self.script:
+            if rule["match"] in joined:
+                return {"content": rule["response"]}
+
+        if body.get("tools"):
+            return {"tool_calls": self._tool_calls(body["tools"])}
+
+        last = str(messages[-1].get("content", "")) if messages else ""
+        if last.startswith("Create procedural memory"):
+            return {"content": _procedural_summary(messages)}
+        if len(messages) == 1 and "new retrieved facts" in last:
+            return {"content": json.dumps(_update_decision(last), ensure_ascii=False)}
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            return {"content": json.dumps(_extract_facts(messages), ensure_ascii=False)}
+        return {"content": "这是本地模拟服务的回复。"}
+
+    @staticmethod
+    def _tool_calls(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        names = [t.get("function", {}).get("name") for t in tools]
+        if "extract_entities" in names:
+            name, arguments = "extract_entities", {"entities": []}
+        elif "establish_relationships" in names:
+            name, arguments = "establish_relationships", {"entities": []}
+        else:
+            # 删除关系等工具：不调用
+            return []
+        return [{
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps(arguments)},
+        }]
+
+
+# ============================================
+# FastAPI 应用
+# ============================================
+
+def create_app(
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    error_status: int = 429,
+    script: Optional[List[Dict[str, str]]] = None,
+    seed: Optional[int] = None
+) -> FastAPI:
+    app = FastAPI(title="Fake Azure OpenAI", description="本地模拟的 Azure OpenAI 服务")
+    chat = FakeChat(script)
+    rng = random.Random(seed)
+    counters = {"chat": 0, "embeddings": 0, "errors": 0}
+
+    async def inject() -> Optional[JSONResponse]:
+        """注入延迟与错误"""
+        delay = latency_ms + (rng.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+        if error_rate and rng.random() < error_rate:
+            counters["errors"] += 1
+            headers = {"retry-after": "1"} if error_status == 429 else None
+            return JSONResponse(
+                status_code=error_status,
+                headers=headers,
+                content={"error": {"code": str(error_status), "message": "Injected error from fake Azure server"}}
+            )
+        return None
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        error = await inject()
+        if error is not None:
+            return error
+        counters["chat"] += 1
+        body = await request.json()
+        reply = chat.respond(body)
+        prompt_tokens = sum(_token_estimate(str(m.get("content", ""))) for m in body.get("messages", []))
+        completion_tokens = _token_estimate(reply.get("content") or json.dumps(reply.get("tool_calls")))
+        message = {"role": "assistant", "content": reply.get("content")}
+        if reply.get("tool_calls") is not None:
+            message["tool_calls"] = reply["tool_calls"]
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or deployment,
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if reply.get("tool_calls") else "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.post("/openai/deployments/{deployment}/embeddings")
+    async def embeddings(deployment: str, request: Request):
+        error = await inject()
+        if error is not None:
+            return error
+        counters["embeddings"] += 1
+        body = await request.json()
+        inputs = body.get("input", "")
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        texts = [item if isinstance(item, str) else " ".join(map(str, item)) for item in inputs]
+        dims = int(body.get("dimensions") or DEFAULT_DIMS)
+        tokens = sum(_token_estimate(t) for t in texts)
+        return {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": idx, "embedding": fake_embedding(text, dims)}
+                for idx, text in enumerate(texts)
+            ],
+            "model": body.get("model") or deployment,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    return app
+
+
+def load_script(path: Optional[str]) -> List[Dict[str, str]]:
+    if not path:
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='本地模拟的 Azure OpenAI 服务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认: 127.0.0.1）')
+    parser.add_argument('--port', type=int, default=8100, help='监听端口（默认: 8100）')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='每个请求注入的延迟（毫秒）')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='延迟的随机抖动范围（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='注入错误的比例（0-1）')
+    parser.add_argument('--error-status', type=int, default=429, help='注入错误的 HTTP 状态码（默认: 429）')
+    parser.add_argument('--script', default=None, metavar='FILE', help='JSONL 脚本：{"match": "子串", "response": "回复"}')
+    parser.add_argument('--seed', type=int, default=None, help='延迟与错误注入的随机种子')
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+            script=load_script(args.script),
+            seed=args.seed
+        ),
+        host=args.host,
+        port=args.port,
+        log_level="warning"
+    )
@@ -0,0 +1,100 @@
+"""
+按请求选择是否走图数据库
+供 mem0_server.py 的添加 / 搜索接口使用
+
+Memory.add / Memory.search 在启用图数据库时，总会同时执行向量库与图数据库两条路径
+（图路径包含实体抽取 LLM 调用），不关心 relations 的调用方也要承担这部分延迟。
+这里直接调用 mem0 内部的两条路径，按 graph 参数选择:
+
+    on        与 Memory.add / Memory.search 相同
+    off       只走向量库
+    only      只走图数据库
+    deferred  （仅添加）同步写向量库，图关系由调用方放到后台构建
+"""
+
+from copy import deepcopy
+from typing import Any, Dict, List, Optional, Tuple
+
+import mem0.memory.main as mem0_main
+
+
+ADD_GRAPH_MODES = ("on", "off", "only", "deferred")
+SEARCH_GRAPH_MODES = ("on", "off", "only")
+
+
+def _build_filters(
+    user_id: Optional[str],
+    agent_id: Optional[str] = None,
+    run_id: Optional[str] = None
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    # 通过模块属性调用，保留 metrics 对该函数的埋点
+    return mem0_main._build_filters_and_metadata(user_id=user_id, agent_id=agent_id, run_id=run_id)
+
+
+def _require_graph(memory):
+    if not getattr(memory, "enable_graph", False):
+        raise ValueError("图数据库未启用，不能使用 graph=only")
+
+
+def add_with_graph_mode(
+    memory,
+    messages: List[Dict[str, Any]],
+    graph: str,
+    user_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    run_id: Optional[str] = None,
+    infer: bool = True
+) -> Dict[str, Any]:
+    """按 graph 模式添加记忆（deferred 时只写向量库，不含 relations）"""
+    if graph not in ADD_GRAPH_MODES:
+        raise ValueError(f"未知的 graph 模式: {graph}")
+    if graph == "on":
+        return memory.add(messages=messages, user_id=user_id, agent_id=agent_id, run_id=run_id, infer=infer)
+
+    metadata, filters = _build_filters(user_id, agent_id, run_id)
+    if graph == "only":
+        _require_graph(memory)
+        return {"results": [], "relations": memory._add_to_graph(messages, filters)}
+
+    results = memory._add_to_vector_store(messages, deepcopy(metadata), filters, infer)
+    return {"results": results}
+
+
+def add_graph_relations(
+    memory,
+    messages: List[Dict[str, Any]],
+    user_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    run_id: Optional[str] = None
+) -> Any:
+    """只构建图关系，供 deferred 模式的后台任务调用"""
+    _require_graph(memory)
+    _, filters = _build_filters(user_id, agent_id, run_id)
+    return memory._add_to_graph(messages, filters)
+
+
+def search_with_graph_mode(
+    memory,
+    query: str,
+    graph: str,
+    user_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    run_id: Optional[str] = None,
+    limit: int = 100,
+    threshold: Optional[float] = None
+) -> Dict[str, Any]:
+    """按 graph 模式搜索记忆"""
+    if graph not in SEARCH_GRAPH_MODES:
+        raise ValueError(f"未知的 graph 模式: {graph}")
+
+    if graph == "on":
+        return memory.search(
+            query=query, user_id=user_id, agent_id=agent_id, run_id=run_id,
+            limit=limit, threshold=threshold
+        )
+
+    _, filters = _build_filters(user_id, agent_id, run_id)
+    if graph == "only":
+        _require_graph(memory)
+        return {"results": [], "relations": memory.graph.search(query, filters, limit)}
+    return {"results": memory._search_vector_store(query, filters, limit, threshold)}
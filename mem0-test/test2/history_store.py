@@ -0,0 +1,172 @@
+"""
+直接读取 mem0 history 表的历史记录查询
+供 mem0_server.py 的 GET /history 使用，查询时不访问 Qdrant
+
+- 启动时为 history 表创建索引（memory_id / event / actor_id / created_at）
+- history 表本身没有 user_id，因此在同一个数据库中维护 memory_owner 表
+  (memory_id -> user_id)：服务写入记忆时登记，启动时从向量库补齐一次
+- 分页使用 rowid 作为 keyset：rowid 与写入顺序一致；
+  mem0 写 DELETE 事件时不填 created_at，按 created_at 分页会把这些事件排错位置
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from memory_pager import decode_cursor, encode_cursor
+
+
+HISTORY_COLUMNS = [
+    "id", "memory_id", "old_memory", "new_memory", "event",
+    "created_at", "updated_at", "is_deleted", "actor_id", "role",
+]
+
+MAX_HISTORY_PAGE_SIZE = 1000
+
+
+class HistoryStore:
+    """history 表的只读查询 + memory_owner 维护"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def ensure_schema(self):
+        """创建索引与 memory_owner 表（幂等）"""
+        with self._write_lock, closing(self._connect()) as conn:
+            # mem0 尚未建表时先按它的结构建表，避免索引创建失败
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS history (
+                    id TEXT PRIMARY KEY,
+                    memory_id TEXT,
+                    old_memory TEXT,
+                    new_memory TEXT,
+                    event TEXT,
+                    created_at DATETIME,
+                    updated_at DATETIME,
+                    is_deleted INTEGER,
+                    actor_id TEXT,
+                    role TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_memory_id ON history(memory_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_event ON history(event)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_actor_id ON history(actor_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_created_at ON history(created_at)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS memory_owner (
+                    memory_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_owner_user_id ON memory_owner(user_id)")
+            conn.commit()
+
+    def record_owners(self, pairs: Iterable[Tuple[str, str]]):
+        """登记 (memory_id, user_id)"""
+        pairs = [(memory_id, user_id) for memory_id, user_id in pairs if memory_id and user_id]
+        if not pairs:
+            return
+        with self._write_lock, closing(self._connect()) as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO memory_owner (memory_id, user_id) VALUES (?, ?)",
+                pairs
+            )
+            conn.commit()
+
+    def backfill_owners(self, memory, batch_size: int = 1000) -> int:
+        """从向量库补齐已有记忆的归属（只读取 user_id 字段），返回新增条数"""
+        vector_store = memory.vector_store
+        with closing(self._connect()) as conn:
+            before = conn.execute("SELECT COUNT(*) FROM memory_owner").fetchone()[0]
+
+        offset = None
+        while True:
+            records, offset = vector_store.client.scroll(
+                collection_name=vector_store.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=["user_id"],
+                with_vectors=False,
+            )
+            self.record_owners(
+                (str(record.id), (record.payload or {}).get("user_id")) for record in records
+            )
+            if offset is None:
+                break
+
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM memory_owner").fetchone()[0] - before
+
+    def query(
+        self,
+        user_id: Optional[str] = None,
+        memory_id: Optional[str] = None,
+        event: Optional[str] = None,
+        actor_id: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        order: str = "desc"
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按条件查询历史事件，返回 (事件列表, 下一页游标)
+
+        since / until 与 created_at 做字符串比较（ISO 8601），没有 created_at 的事件不会匹配时间范围
+        """
+        conditions = []
+        params: List[Any] = []
+
+        if user_id:
+            conditions.append("memory_id IN (SELECT memory_id FROM memory_owner WHERE user_id = ?)")
+            params.append(user_id)
+        if memory_id:
+            conditions.append("memory_id = ?")
+            params.append(memory_id)
+        if event:
+            conditions.append("event = ?")
+            params.append(event.upper())
+        if actor_id:
+            conditions.append("actor_id = ?")
+            params.append(actor_id)
+        if since:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("created_at < ?")
+            params.append(until)
+
+        descending = order.lower() != "asc"
+        last_rowid = decode_cursor(cursor)
+        if last_rowid is not None:
+            conditions.append("rowid < ?" if descending else "rowid > ?")
+            params.append(int(last_rowid))
+
+        sql = f"SELECT rowid AS _rowid, {', '.join(HISTORY_COLUMNS)} FROM history"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY rowid {'DESC' if descending else 'ASC'} LIMIT ?"
+        page_size = min(max(1, limit), MAX_HISTORY_PAGE_SIZE)
+        params.append(page_size + 1)
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        events = [{column: row[column] for column in HISTORY_COLUMNS} for row in rows]
+        next_cursor = encode_cursor(rows[-1]["_rowid"]) if has_more else None
+        return events, next_cursor
@@ -0,0 +1,312 @@
+"""
+基于 SQLite 的持久化任务队列
+供 mem0_server.py 的异步添加记忆（POST /memories + async_mode）使用
+
+- enqueue() 把任务写入 jobs 表后立即返回 job_id
+- N 个后台工作线程按创建顺序领取任务并调用 handler
+- 领取任务时记录执行者（boot_id + pid + 进程启动时间）；启动时以及空闲时每 RECOVERY_INTERVAL 秒，
+  把执行者已不存在的 running 任务重新置为 pending。多个进程共用同一个队列时，
+  仍在运行的进程的任务不会被重置，已退出进程的任务由任意存活进程接手
+- 领取次数达到 max_attempts 的任务不再执行，直接标记为 failed
+  （任务本身导致进程崩溃时，避免每次重启都再崩溃一次）
+- stop() 不再领取新任务，等待正在执行的任务完成；排队中的任务保留到下次启动
+- handler 执行期间可调用 report_progress() 更新当前任务的进度，GET 查询时返回
+
+任务状态: pending -> running -> succeeded / failed
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+from contextlib import closing
+from typing import Any, Callable, Dict, List, Optional
+
+
+DEFAULT_JOB_DB_PATH = "./memorydb/jobs/jobs.db"
+
+# 已完成任务的保留时间（秒）
+FINISHED_JOB_RETENTION = 7 * 24 * 3600
+
+# 每个任务最多领取的次数（含进程崩溃后的重新执行）
+DEFAULT_MAX_ATTEMPTS = 3
+
+# 空闲的工作线程检查已退出进程遗留任务的间隔（秒）
+RECOVERY_INTERVAL = 60.0
+
+
+def _boot_id() -> str:
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _process_start_time(pid: int) -> Optional[str]:
+    """进程启动时间（/proc/<pid>/stat 第 22 列），用于区分复用的 pid；进程不存在时返回 None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except FileNotFoundError:
+        return None
+    except (OSError, IndexError):
+        # 没有 /proc 的系统只判断 pid 是否存在
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            pass
+        return ""
+
+
+def owner_token(pid: Optional[int] = None) -> str:
+    pid = pid or os.getpid()
+    return f"{_boot_id()}:{pid}:{_process_start_time(pid) or ''}"
+
+
+def owner_alive(token: Optional[str]) -> bool:
+    """领取任务的进程是否仍在运行（旧版本没有记录执行者的任务视为已退出）"""
+    if not token:
+        return False
+    boot_id, pid, started = token.split(":")
+    if boot_id != _boot_id():
+        return False
+    current = _process_start_time(int(pid))
+    return current is not None and (not started or not current or current == started)
+
+
+class JobQueue:
+    """持久化任务队列 + 工作线程池"""
+
+    def __init__(
+        self,
+        handler: Callable[[str, Dict[str, Any]], Any],
+        path: str = DEFAULT_JOB_DB_PATH,
+        workers: int = 2,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ):
+        self.handler = handler
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._wakeup = threading.Condition()
+        self._running = 0
+        self._running_lock = threading.Lock()
+        self._current = threading.local()
+        self.owner = owner_token()
+        self._last_recovery = 0.0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    progress TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at)")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "progress" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN progress TEXT")
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ----------------------------------------
+    # 生命周期
+    # ----------------------------------------
+
+    def start(self) -> int:
+        """启动工作线程，返回恢复的未完成任务数"""
+        with closing(self._connect()) as conn:
+            resumed = self._recover(conn)
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+                (time.time() - FINISHED_JOB_RETENTION,)
+            )
+
+        self._stopping.clear()
+        for idx in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"mem0-job-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return resumed
+
+    def _recover(self, conn: sqlite3.Connection) -> int:
+        """把执行者已退出的 running 任务重新置为 pending，返回重置的任务数"""
+        self._last_recovery = time.monotonic()
+        orphaned = [
+            (row["id"], row["owner"]) for row in conn.execute("SELECT id, owner FROM jobs WHERE status = 'running'")
+            if not owner_alive(row["owner"])
+        ]
+        recovered = 0
+        for job_id, owner in orphaned:
+            # 只重置执行者未变的任务（期间可能已被其他进程恢复并重新领取）
+            recovered += conn.execute(
+                "UPDATE jobs SET status = 'pending', started_at = NULL, owner = NULL "
+                "WHERE id = ? AND status = 'running' AND owner IS ?",
+                (job_id, owner)
+            ).rowcount
+        return recovered
+
+    def stop(self, timeout: float = 30.0):
+        """停止领取新任务，等待执行中的任务完成"""
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    # ----------------------------------------
+    # 任务接口
+    # ----------------------------------------
+
+    def enqueue(self, kind: str, payload: Dict[str, Any]) -> str:
+        """写入任务并唤醒一个工作线程"""
+        job_id = str(uuid.uuid4())
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, 'pending', ?)",
+                (job_id, kind, json.dumps(payload, ensure_ascii=False), time.time())
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def report_progress(self, progress: Dict[str, Any]):
+        """在 handler 中调用：更新当前任务的进度（不在任务线程中调用时忽略）"""
+        job_id = getattr(self._current, "job_id", None)
+        if job_id is None:
+            return
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ? WHERE id = ?",
+                (json.dumps(progress, ensure_ascii=False, default=str), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态与结果"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "progress": json.loads(row["progress"]) if row["progress"] else None,
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+        }
+        if row["status"] == "pending":
+            with closing(self._connect()) as conn:
+                job["queue_position"] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'pending' AND created_at < ?",
+                    (row["created_at"],)
+                ).fetchone()[0]
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with closing(self._connect()) as conn:
+            counts = {
+                row["status"]: row["n"]
+                for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+            }
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "pending": counts.get("pending", 0),
+            "succeeded": counts.get("succeeded", 0),
+            "failed": counts.get("failed", 0),
+        }
+
+    # ----------------------------------------
+    # 工作线程
+    # ----------------------------------------
+
+    def _claim(self, conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+        """原子地领取最早的 pending 任务；已达到 max_attempts 的任务标记为 failed 并跳过"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'pending' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None or row["attempts"] < self.max_attempts:
+                    break
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                    (f"已执行 {row['attempts']} 次仍未完成（进程可能在执行中崩溃），不再重试", time.time(), row["id"])
+                )
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1, owner = ? WHERE id = ?",
+                    (time.time(), self.owner, row["id"])
+                )
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _worker_loop(self):
+        conn = self._connect()
+        try:
+            while not self._stopping.is_set():
+                row = self._claim(conn)
+                if row is None:
+                    if time.monotonic() - self._last_recovery >= RECOVERY_INTERVAL and self._recover(conn):
+                        continue
+                    with self._wakeup:
+                        self._wakeup.wait(timeout=1.0)
+                    continue
+
+                with self._running_lock:
+                    self._running += 1
+                self._current.job_id = row["id"]
+                try:
+                    result = self.handler(row["kind"], json.loads(row["payload"]))
+                    conn.execute(
+                        "UPDATE jobs SET status = 'succeeded', result = ?, finished_at = ? WHERE id = ?",
+                        (json.dumps(result, ensure_ascii=False, default=str), time.time(), row["id"])
+                    )
+                except Exception:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                        (traceback.format_exc(), time.time(), row["id"])
+                    )
+                finally:
+                    self._current.job_id = None
+                    with self._running_lock:
+                        self._running -= 1
+        finally:
+            conn.close()
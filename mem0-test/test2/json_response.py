@@ -0,0 +1,292 @@
+"""
+大响应的 JSON 编码与压缩
+get_all / /history / 看板接口一次返回成千上万条中文记忆时，编码耗时和传输字节占了响应时间的大头。
+
+- FastJSONResponse：用 orjson 编码（未安装时退回标准库 json，不转义非 ASCII），
+  作为 FastAPI 的 default_response_class 用于所有接口
+- ResponseEncodingMiddleware（ASGI 中间件）:
+    压缩  按 Accept-Encoding 协商 zstd（需安装 zstandard）/ gzip，超过 minimum_size 字节才压缩；
+          流式响应（NDJSON）逐块压缩并 flush，客户端仍可边收边解析
+    紧凑  ?compact=1 时成功响应只返回 data 部分，去掉 success / message 外层；失败响应保持原格式
+
+编码与压缩的耗时对比（合成的中文记忆列表）:
+    python json_response.py --memories 5000
+"""
+
+import gzip
+import json
+import time
+import zlib
+import random
+import argparse
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+from typing import Any, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+_compact: ContextVar[bool] = ContextVar("mem0_compact_response", default=False)
+
+_TRUE_VALUES = ("1", "true", "yes")
+
+
+def dumps(content: Any) -> bytes:
+    """紧凑 UTF-8 JSON，不转义中文"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def compact_content(content: Any) -> Any:
+    """成功响应（MemoryResponse 及看板接口的 success / data 外层）只保留 data"""
+    if isinstance(content, dict) and content.get("success") is True and "data" in content:
+        return content["data"]
+    return content
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson 编码的 JSONResponse"""
+
+    def render(self, content: Any) -> bytes:
+        if _compact.get():
+            content = compact_content(content)
+        return dumps(content)
+
+
+# ============================================
+# 压缩
+# ============================================
+
+def available_encodings() -> List[str]:
+    """按优先级排列的可用压缩算法"""
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """按 Accept-Encoding 选择压缩算法，客户端都不接受时返回 None"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level or 3).compress(body)
+    return gzip.compress(body, compresslevel=level or 6)
+
+
+class _StreamCompressor:
+    """流式响应逐块压缩，每块之后 flush，保证已发送的行可以立即解压"""
+
+    def __init__(self, encoding: str, level: Optional[int] = None):
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=level or 3).compressobj()
+            self._sync = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._obj = zlib.compressobj(level or 6, zlib.DEFLATED, 31)   # wbits=31：gzip 格式
+            self._sync = zlib.Z_SYNC_FLUSH
+
+    def chunk(self, data: bytes, final: bool) -> bytes:
+        out = self._obj.compress(data)
+        return out + (self._obj.flush() if final else self._obj.flush(self._sync))
+
+
+def _header(headers: List[tuple], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class ResponseEncodingMiddleware:
+    """
+    ASGI 中间件：?compact=1 紧凑响应 + 按 Accept-Encoding 压缩
+    levels 为各算法的压缩级别，如 {"gzip": 6, "zstd": 3}
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, levels: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = levels or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        query = parse_qs(scope.get("query_string", b"").decode())
+        token = _compact.set(query.get("compact", [""])[0].lower() in _TRUE_VALUES)
+        try:
+            encoding = negotiate((_header(scope["headers"], b"accept-encoding") or b"").decode("latin-1"))
+            if encoding is None:
+                return await self.app(scope, receive, send)
+            await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size, self.levels.get(encoding)))
+        finally:
+            _compact.reset(token)
+
+
+class _CompressingSend:
+    """缓存 response.start，看到第一块响应体后决定是否压缩"""
+
+    def __init__(self, send, encoding: str, minimum_size: int, level: Optional[int]):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.level = level
+        self.start: Optional[Dict[str, Any]] = None
+        self.stream: Optional[_StreamCompressor] = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.stream is not None:
+            return await self.send({
+                "type": "http.response.body",
+                "body": self.stream.chunk(body, final=not more_body),
+                "more_body": more_body,
+            })
+
+        start, self.start = self.start, None
+        headers = list(start.get("headers", []))
+        if (
+            _header(headers, b"content-encoding") is not None
+            or start["status"] in (204, 304)
+            or (not more_body and len(body) < self.minimum_size)
+        ):
+            self.passthrough = True
+            await self.send(start)
+            return await self.send(message)
+
+        headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+        headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", b"Accept-Encoding"))
+
+        if more_body:
+            self.stream = _StreamCompressor(self.encoding, self.level)
+            await self.send({**start, "headers": headers})
+            return await self.send({
+                "type": "http.response.body",
+                "body": self.stream.chunk(body, final=False),
+                "more_body": True,
+            })
+
+        compressed = compress(body, self.encoding, self.level)
+        if len(compressed) >= len(body):
+            self.passthrough = True
+            await self.send(start)
+            return await self.send(message)
+        headers.append((b"content-length", str(len(compressed)).encode()))
+        await self.send({**start, "headers": headers})
+        await self.send({"type": "http.response.body", "body": compressed})
+
+
+# ============================================
+# 编码耗时对比
+# ============================================
+
+_PHRASES = [
+    "喜欢吃苹果", "每天早上跑步五公里", "在北京工作", "对海鲜过敏", "周末经常去爬山",
+    "正在学习日语", "养了一只叫豆豆的猫", "不喝咖啡只喝绿茶", "女儿今年上小学", "计划明年去云南旅行",
+]
+
+
+def synthetic_memories(count: int, seed: int = 0) -> Dict[str, Any]:
+    """与 GET /memories 结构相同的合成响应"""
+    rng = random.Random(seed)
+    results = []
+    for i in range(count):
+        text = "，".join(rng.sample(_PHRASES, rng.randint(1, 3)))
+        results.append({
+            "id": f"{rng.getrandbits(128):032x}",
+            "memory": f"用户{text}",
+            "hash": f"{rng.getrandbits(128):032x}",
+            "created_at": "2025-01-01T08:00:00.000000-08:00",
+            "updated_at": None,
+            "user_id": f"user_{i % 20}",
+            "metadata": {"role": "user"},
+        })
+    return {"success": True, "message": f"找到 {count} 条记忆", "data": {"results": results}}
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def benchmark(count: int, repeat: int = 5) -> Dict[str, Any]:
+    content = synthetic_memories(count)
+    encoders = {
+        "json (ensure_ascii=True)": lambda: json.dumps(content).encode(),
+        "json (ensure_ascii=False)": lambda: json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode(),
+    }
+    if orjson is not None:
+        encoders["orjson"] = lambda: orjson.dumps(content)
+    encoders["orjson compact" if orjson is not None else "json compact"] = lambda: dumps(compact_content(content))
+
+    report: Dict[str, Any] = {"memories": count, "encode": {}, "compress": {}}
+    for name, fn in encoders.items():
+        report["encode"][name] = {"ms": round(_best_of(fn, repeat), 2), "bytes": len(fn())}
+
+    body = dumps(content)
+    for encoding in available_encodings():
+        for level in ((1, 6, 9) if encoding == "gzip" else (1, 3, 9)):
+            report["compress"][f"{encoding} level {level}"] = {
+                "ms": round(_best_of(lambda: compress(body, encoding, level), repeat), 2),
+                "bytes": len(compress(body, encoding, level)),
+            }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='大响应的 JSON 编码与压缩耗时对比')
+    parser.add_argument('--memories', type=int, default=5000, help='合成记忆条数（默认: 5000）')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数，取最快一次（默认: 5）')
+    args = parser.parse_args()
+
+    report = benchmark(args.memories, args.repeat)
+    print("=" * 60)
+    print(f"{report['memories']} 条记忆")
+    print("编码:")
+    for name, row in report["encode"].items():
+        print(f"  {name:28s} {row['ms']:8.2f}ms  {row['bytes'] / 1024:9.1f} KB")
+    print("压缩（orjson 输出）:")
+    for name, row in report["compress"].items():
+        print(f"  {name:28s} {row['ms']:8.2f}ms  {row['bytes'] / 1024:9.1f} KB")
+    if zstandard is None:
+        print("  （未安装 zstandard，zstd 不可用）")
+    print("=" * 60)
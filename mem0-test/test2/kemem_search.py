@@ -18,7 +18,7 @@ config = {
             "azure_kwargs": {
                 "api_key": os.getenv("GPT_41_NANO_KEY"),
                 "azure_deployment": "gpt-4.1-nano",
-                "azure_endpoint": "https://bk-us-2.openai.azure.com",
+                "azure_endpoint": os.getenv("AZURE_OPENAI_LLM_ENDPOINT", "https://bk-us-2.openai.azure.com"),
                 "api_version": "2025-01-01-preview",
             }
         }
@@ -32,7 +32,7 @@ config = {
             "azure_kwargs": {
                 "api_key": os.getenv("TEXT_EMBEDDING_3_SMALL"),
                 "azure_deployment": "text-embedding-3-small",
-                "azure_endpoint": "https://bk-cloud.openai.azure.com",
+                "azure_endpoint": os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT", "https://bk-cloud.openai.azure.com"),
                 "api_version": "2023-05-15",
             }
         }
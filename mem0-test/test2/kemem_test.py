@@ -9,6 +9,8 @@ import json
 import os
 from mem0 import Memory
 
+from embedding_cache import install_embedding_cache
+
 
 # 修改代码，通过命令行参数 --infer 决定是否启用add方法的infer参数
 # 如果有 --infer 参数，则设置add方法的infer参数为True
@@ -81,6 +83,12 @@ parser.add_argument(
     help='启用 add 方法的 infer 参数，用于推理记忆内容'
 )
 
+parser.add_argument(
+    '--no-embed-cache',
+    action='store_true',
+    help='禁用 embedding 缓存（默认缓存到 ./memorydb/embcache/embeddings.db）'
+)
+
 args = parser.parse_args()
 
 # 读取自定义 prompt（如果提供）
@@ -105,7 +113,7 @@ config = {
             "azure_kwargs": {
                 "api_key": os.getenv("GPT_41_NANO_KEY"),
                 "azure_deployment": "gpt-4.1-nano",
-                "azure_endpoint": "https://bk-us-2.openai.azure.com",
+                "azure_endpoint": os.getenv("AZURE_OPENAI_LLM_ENDPOINT", "https://bk-us-2.openai.azure.com"),
                 "api_version": "2025-01-01-preview",
             }
         }
@@ -119,7 +127,7 @@ config = {
             "azure_kwargs": {
                 "api_key": os.getenv("TEXT_EMBEDDING_3_SMALL"),
                 "azure_deployment": "text-embedding-3-small",
-                "azure_endpoint": "https://bk-cloud.openai.azure.com",
+                "azure_endpoint": os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT", "https://bk-cloud.openai.azure.com"),
                 "api_version": "2023-05-15",
             }
         }
@@ -157,6 +165,12 @@ else:
 print("创建 Memory 实例...")
 memory = Memory.from_config(config_dict=config)
 
+# 挂载 embedding 缓存，重复运行时相同文本不再请求 Azure
+embedding_cache = None
+if not args.no_embed_cache:
+    embedding_cache = install_embedding_cache(memory, path="./memorydb/embcache/embeddings.db")
+    print("✅ 已启用 embedding 缓存")
+
 # 显示是否启用了图数据库
 if hasattr(memory, 'enable_graph'):
     print(f"图数据库状态: {memory.enable_graph}")
@@ -295,5 +309,7 @@ for query_msg in queries:
     print()
 
 print("=" * 60)
+if embedding_cache is not None:
+    print(f"Embedding 缓存统计: {json.dumps(embedding_cache.stats(), ensure_ascii=False)}")
 print("测试完成！")
 print("=" * 60)
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""
+记忆文本的本地倒排索引（字符 n-gram，BM25 打分）
+供 mem0_server.py 的搜索接口使用：mode=lexical 只查倒排索引，mode=hybrid 与向量搜索融合
+
+记忆多为简短的中文事实（"喜欢吃橘子" / "橘子富含营养"），纯向量搜索常漏掉精确的实体匹配，
+且每次搜索都要请求一次 embedding。这里不依赖外部分词器:
+
+- 中文（CJK 统一表意文字）按单字 + 相邻二字切分，其它文字按连续字母数字切为单词（小写）
+- 倒排表按 user_id 分区，带 user_id 的搜索只访问该用户的分区，BM25 统计量也按分区计算
+- 启动时 scroll 向量库建立索引；之后在 vector_store.insert / update / delete 上增量维护，
+  mem0 内部写入、批量导入、程序性记忆摘要都会经过这三个方法
+- 绕过 vector_store 的批量删除（bulk_purge）需调用 remove_where
+- 索引只在进程内存中；多进程模式下各进程看不到彼此的写入，因此不启用
+"""
+
+import re
+import math
+import time
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from memory_pager import format_record
+
+
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_CJK_RUN = re.compile(f"[{_CJK}]+")
+_TOKEN_RUN = re.compile(f"[{_CJK}]+|[^\\W_{_CJK}]+")
+
+FILTER_KEYS = ("user_id", "agent_id", "run_id")
+
+
+def tokenize(text: str) -> List[str]:
+    """中文切为单字与二字，其它文字切为小写单词"""
+    tokens: List[str] = []
+    for run in _TOKEN_RUN.findall(text.lower()):
+        if _CJK_RUN.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class _Doc:
+    """与 Qdrant 记录同形（id + payload），用于 format_record"""
+
+    __slots__ = ("id", "payload", "length")
+
+    def __init__(self, memory_id: str, payload: Dict[str, Any], length: int):
+        self.id = memory_id
+        self.payload = payload
+        self.length = length
+
+
+class _Partition:
+    """单个 user_id 下的倒排表"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.docs: Dict[str, _Doc] = {}
+        self.total_length = 0
+
+    def add(self, doc: _Doc, counts: Counter):
+        self.docs[doc.id] = doc
+        self.total_length += doc.length
+        for token, tf in counts.items():
+            self.postings.setdefault(token, {})[doc.id] = tf
+
+    def remove(self, doc: _Doc):
+        self.docs.pop(doc.id, None)
+        self.total_length -= doc.length
+        for token in set(tokenize(doc.payload.get("data") or "")):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(doc.id, None)
+            if not posting:
+                del self.postings[token]
+
+
+class LexicalIndex:
+    """按 user_id 分区的 BM25 倒排索引（线程安全）"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._partitions: Dict[str, _Partition] = {}
+        self._doc_partition: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self.searches = 0
+        self.search_seconds = 0.0
+
+    # ----------------------------------------
+    # 维护
+    # ----------------------------------------
+
+    def upsert(self, memory_id: Any, payload: Optional[Dict[str, Any]]):
+        memory_id = str(memory_id)
+        payload = dict(payload or {})
+        counts = Counter(tokenize(payload.get("data") or ""))
+        partition_key = payload.get("user_id") or ""
+        with self._lock:
+            self._remove_locked(memory_id)
+            partition = self._partitions.setdefault(partition_key, _Partition())
+            partition.add(_Doc(memory_id, payload, sum(counts.values())), counts)
+            self._doc_partition[memory_id] = partition_key
+
+    def remove(self, memory_id: Any):
+        with self._lock:
+            self._remove_locked(str(memory_id))
+
+    def remove_where(self, filters: Dict[str, Any]) -> int:
+        """删除匹配过滤条件的全部文档，返回删除数"""
+        with self._lock:
+            matched = [doc.id for doc in self._candidates(filters) if self._matches(doc, filters)]
+            for memory_id in matched:
+                self._remove_locked(memory_id)
+        return len(matched)
+
+    def _remove_locked(self, memory_id: str):
+        partition_key = self._doc_partition.pop(memory_id, None)
+        if partition_key is None:
+            return
+        partition = self._partitions[partition_key]
+        partition.remove(partition.docs[memory_id])
+        if not partition.docs:
+            del self._partitions[partition_key]
+
+    def build(self, memory, batch_size: int = 1000) -> int:
+        """scroll 向量库建立索引，返回文档数"""
+        vector_store = memory.vector_store
+        count = 0
+        offset = None
+        while True:
+            records, offset = vector_store.client.scroll(
+                collection_name=vector_store.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            for record in records:
+                self.upsert(record.id, record.payload)
+            count += len(records)
+            if offset is None:
+                return count
+
+    # ----------------------------------------
+    # 搜索
+    # ----------------------------------------
+
+    def _candidates(self, filters: Dict[str, Any]) -> Iterable[_Doc]:
+        if filters.get("user_id"):
+            partition = self._partitions.get(filters["user_id"])
+            return list(partition.docs.values()) if partition else []
+        return [doc for partition in self._partitions.values() for doc in partition.docs.values()]
+
+    @staticmethod
+    def _matches(doc: _Doc, filters: Dict[str, Any]) -> bool:
+        return all(doc.payload.get(key) == filters[key] for key in FILTER_KEYS if filters.get(key))
+
+    def search(self, query: str, filters: Dict[str, Any], limit: int = 5) -> List[Dict[str, Any]]:
+        """BM25 搜索，返回格式与 Memory.search 的单条结果相同"""
+        started = time.perf_counter()
+        query_tokens = Counter(tokenize(query))
+        with self._lock:
+            if filters.get("user_id"):
+                partition = self._partitions.get(filters["user_id"])
+                partitions = [partition] if partition else []
+            else:
+                partitions = list(self._partitions.values())
+
+            scored: List[Tuple[float, _Doc]] = []
+            for partition in partitions:
+                scored.extend(self._score(partition, query_tokens, filters))
+            scored.sort(key=lambda pair: pair[0], reverse=True)
+            results = []
+            for score, doc in scored[:limit]:
+                item = format_record(doc)
+                item["score"] = round(score, 6)
+                results.append(item)
+            self.searches += 1
+            self.search_seconds += time.perf_counter() - started
+        return results
+
+    def _score(self, partition: _Partition, query_tokens: Counter, filters: Dict[str, Any]):
+        n_docs = len(partition.docs)
+        if not n_docs:
+            return []
+        avg_length = partition.total_length / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        for token, qtf in query_tokens.items():
+            posting = partition.postings.get(token)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for memory_id, tf in posting.items():
+                length = partition.docs[memory_id].length
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+                scores[memory_id] = scores.get(memory_id, 0.0) + qtf * idf * norm
+        return [
+            (score, partition.docs[memory_id])
+            for memory_id, score in scores.items()
+            if self._matches(partition.docs[memory_id], filters)
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self._doc_partition),
+                "partitions": len(self._partitions),
+                "tokens": sum(len(p.postings) for p in self._partitions.values()),
+                "searches": self.searches,
+                "avg_search_us": round(self.search_seconds / self.searches * 1e6, 1) if self.searches else 0.0,
+            }
+
+
+def fuse_rrf(
+    vector_results: List[Dict[str, Any]],
+    lexical_results: List[Dict[str, Any]],
+    limit: int,
+    k: int = 60
+) -> List[Dict[str, Any]]:
+    """
+    倒数排名融合（RRF）：score = Σ 1 / (k + rank)
+    两路分数量纲不同（余弦相似度 / BM25），只按排名融合；原始分数保留在 scores 中
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for source, results in (("vector", vector_results), ("lexical", lexical_results)):
+        for rank, item in enumerate(results, 1):
+            entry = fused.get(item["id"])
+            if entry is None:
+                entry = fused[item["id"]] = {**item, "score": 0.0, "scores": {}}
+            entry["score"] += 1.0 / (k + rank)
+            entry["scores"][source] = item.get("score")
+    ranked = sorted(fused.values(), key=lambda item: item["score"], reverse=True)[:limit]
+    for item in ranked:
+        item["score"] = round(item["score"], 6)
+    return ranked
+
+
+def install_lexical_index(memory, index: Optional[LexicalIndex] = None) -> LexicalIndex:
+    """建立索引，并在 Memory 实例的向量库写入方法上增量维护"""
+    index = index or LexicalIndex()
+    index.build(memory)
+
+    vector_store = memory.vector_store
+    original_insert = vector_store.insert
+    original_update = vector_store.update
+    original_delete = vector_store.delete
+
+    def insert(vectors, payloads=None, ids=None):
+        result = original_insert(vectors=vectors, payloads=payloads, ids=ids)
+        for memory_id, payload in zip(ids or [], payloads or []):
+            index.upsert(memory_id, payload)
+        return result
+
+    def update(vector_id, vector=None, payload=None):
+        result = original_update(vector_id=vector_id, vector=vector, payload=payload)
+        if payload is not None:
+            index.upsert(vector_id, payload)
+        return result
+
+    def delete(vector_id):
+        result = original_delete(vector_id=vector_id)
+        index.remove(vector_id)
+        return result
+
+    vector_store.insert = insert
+    vector_store.update = update
+    vector_store.delete = delete
+    return index
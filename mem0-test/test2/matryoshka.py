@@ -0,0 +1,346 @@
+"""
+Matryoshka 截断向量 + 全维重打分的两级检索
+text-embedding-3-small 的向量前 N 维截断后重新归一化，效果等同于请求 dimensions=N 的短向量。
+
+    Qdrant 集合（mem0_mrl{N}）   截断到 256 / 512 维的向量，用于初筛
+    SQLite 侧存储               完整 1536 维向量（float32），用于重打分
+
+- embedder 仍只请求一次完整向量，截断在本地完成（embedding 缓存照常命中）
+- 搜索先在短向量上取 limit × oversampling 个候选，再用完整向量计算余弦相似度取前 limit 个
+- 以实例级包装替换 Memory.vector_store：insert / update / delete / search 自动维护两级存储，
+  mem0 内部写入、批量导入、程序性记忆摘要无需改动
+- 绕过 vector_store 的批量删除（bulk_purge）需调用 FullVectorStore.delete_user
+
+命令行工具（本地库有文件锁，需先停止 mem0_server.py）:
+    python matryoshka.py migrate --dims 256    从现有 mem0 集合生成 mem0_mrl256 集合与侧存储
+    python matryoshka.py report --dims 256,512 --oversampling 1,2,4
+                                              在现有向量上对比 recall@k 与模拟耗时
+"""
+
+import os
+import time
+import sqlite3
+import argparse
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from qdrant_client.models import QueryRequest
+
+
+DEFAULT_SIDE_STORE_PATH = "./memorydb/fullvec/vectors.db"
+
+
+def collection_name_for(dims: int, base: str = "mem0") -> str:
+    return f"{base}_mrl{dims}"
+
+
+def truncate(vector: Sequence[float], dims: int) -> List[float]:
+    """取前 dims 维并重新归一化"""
+    head = np.asarray(vector[:dims], dtype=np.float32)
+    norm = float(np.linalg.norm(head))
+    return (head / norm if norm else head).tolist()
+
+
+class FullVectorStore:
+    """完整维度向量的 SQLite 侧存储"""
+
+    def __init__(self, path: str = DEFAULT_SIDE_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS full_vectors (
+                memory_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                vector BLOB NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_full_vectors_user ON full_vectors(user_id)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def put_many(self, entries: List[Tuple[str, Optional[str], Sequence[float]]]):
+        if not entries:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO full_vectors (memory_id, user_id, vector) VALUES (?, ?, ?)",
+                [
+                    (str(memory_id), user_id, np.asarray(vector, dtype=np.float32).tobytes())
+                    for memory_id, user_id, vector in entries
+                ]
+            )
+            self._conn.commit()
+
+    def get_many(self, memory_ids: List[str]) -> Dict[str, np.ndarray]:
+        if not memory_ids:
+            return {}
+        placeholders = ",".join("?" * len(memory_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT memory_id, vector FROM full_vectors WHERE memory_id IN ({placeholders})",
+                [str(m) for m in memory_ids]
+            ).fetchall()
+        return {memory_id: np.frombuffer(blob, dtype=np.float32) for memory_id, blob in rows}
+
+    def delete(self, memory_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM full_vectors WHERE memory_id = ?", (str(memory_id),))
+            self._conn.commit()
+
+    def delete_user(self, user_id: str) -> int:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM full_vectors WHERE user_id = ?", (user_id,)).rowcount
+            self._conn.commit()
+        return deleted
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM full_vectors").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TwoTierVectorStore:
+    """
+    包装 mem0 的向量库：短向量写入 Qdrant，完整向量写入侧存储，搜索时重打分
+    未拦截的属性（client、collection_name、get、list 等）原样转发
+    """
+
+    def __init__(self, inner, side: FullVectorStore, dims: int, oversampling: int = 4):
+        self._inner = inner
+        self.side = side
+        self.dims = dims
+        self.oversampling = max(1, oversampling)
+        self._stats_lock = threading.Lock()
+        self.searches = 0
+        self.rescored = 0
+        self.missing_full = 0
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def insert(self, vectors, payloads=None, ids=None):
+        payloads = payloads or [{} for _ in vectors]
+        self.side.put_many([
+            (memory_id, (payload or {}).get("user_id"), vector)
+            for memory_id, payload, vector in zip(ids or [], payloads, vectors)
+        ])
+        return self._inner.insert(
+            vectors=[truncate(vector, self.dims) for vector in vectors], payloads=payloads, ids=ids
+        )
+
+    def update(self, vector_id, vector=None, payload=None):
+        if vector is not None:
+            user_id = (payload or {}).get("user_id")
+            if user_id is None:
+                existing = self._inner.get(vector_id=vector_id)
+                user_id = (getattr(existing, "payload", None) or {}).get("user_id")
+            self.side.put_many([(vector_id, user_id, vector)])
+            vector = truncate(vector, self.dims)
+        return self._inner.update(vector_id=vector_id, vector=vector, payload=payload)
+
+    def delete(self, vector_id):
+        result = self._inner.delete(vector_id=vector_id)
+        self.side.delete(vector_id)
+        return result
+
+    def search(self, query, vectors, limit: int = 5, filters=None, top_k: Optional[int] = None):
+        limit = top_k or limit
+        # 位置参数调用：兼容 mem0 不同版本的 limit / top_k 参数名
+        shortlist = self._inner.search(query, truncate(vectors, self.dims), limit * self.oversampling, filters)
+        return self._rescore(vectors, shortlist, limit)
+
+    def query_batch(self, vectors: List[List[float]], filters: Dict[str, Any], limit: int) -> List[List[Any]]:
+        """批量搜索（batch_search.py 使用）：一次 query_batch_points 初筛后逐条重打分"""
+        responses = self._inner.client.query_batch_points(
+            collection_name=self._inner.collection_name,
+            requests=[
+                QueryRequest(
+                    query=truncate(vector, self.dims),
+                    filter=self._inner._create_filter(filters),
+                    limit=limit * self.oversampling,
+                    with_payload=True,
+                    params=getattr(self, "quantization_search_params", None),
+                )
+                for vector in vectors
+            ],
+        )
+        return [self._rescore(vector, response.points, limit) for vector, response in zip(vectors, responses)]
+
+    def _rescore(self, query_vector, shortlist, limit: int):
+        if not shortlist:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (float(np.linalg.norm(query)) or 1.0)
+        full = self.side.get_many([str(point.id) for point in shortlist])
+        missing = 0
+        for point in shortlist:
+            vector = full.get(str(point.id))
+            if vector is None:
+                # 没有完整向量（如迁移前写入）：保留短向量分数
+                missing += 1
+                continue
+            point.score = float(vector @ query / (float(np.linalg.norm(vector)) or 1.0))
+        with self._stats_lock:
+            self.searches += 1
+            self.rescored += len(shortlist) - missing
+            self.missing_full += missing
+        return sorted(shortlist, key=lambda point: point.score, reverse=True)[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "dims": self.dims,
+                "oversampling": self.oversampling,
+                "searches": self.searches,
+                "rescored_candidates": self.rescored,
+                "missing_full_vectors": self.missing_full,
+                "full_vectors": self.side.count(),
+            }
+
+
+def install_two_tier(
+    memory,
+    dims: int,
+    path: str = DEFAULT_SIDE_STORE_PATH,
+    oversampling: int = 4
+) -> TwoTierVectorStore:
+    """把 Memory 实例的向量库替换为两级存储（集合须已按 dims 维创建）"""
+    store = TwoTierVectorStore(memory.vector_store, FullVectorStore(path), dims, oversampling)
+    memory.vector_store = store
+    return store
+
+
+# ============================================
+# 迁移与评估
+# ============================================
+
+def migrate(client, source: str, dims: int, side_path: str, batch_size: int = 256) -> Dict[str, Any]:
+    """把 source 集合复制为截断向量的新集合，完整向量写入侧存储"""
+    from qdrant_client.models import Distance, PointStruct, VectorParams
+
+    target = collection_name_for(dims, source)
+    if not client.collection_exists(target):
+        client.create_collection(target, vectors_config=VectorParams(size=dims, distance=Distance.COSINE, on_disk=True))
+    side = FullVectorStore(side_path)
+    copied, offset = 0, None
+    started = time.perf_counter()
+    while True:
+        records, offset = client.scroll(
+            collection_name=source, limit=batch_size, offset=offset, with_payload=True, with_vectors=True
+        )
+        if records:
+            side.put_many([(str(r.id), (r.payload or {}).get("user_id"), r.vector) for r in records])
+            client.upsert(target, points=[
+                PointStruct(id=r.id, vector=truncate(r.vector, dims), payload=r.payload) for r in records
+            ])
+            copied += len(records)
+        if offset is None:
+            break
+    side.close()
+    return {"source": source, "target": target, "points": copied, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def simulate(
+    base: np.ndarray,
+    queries: np.ndarray,
+    dims_list: List[int],
+    k: int = 10,
+    oversampling: List[int] = (1, 2, 4)
+) -> Dict[str, Any]:
+    """在内存中对比全维暴力搜索、截断搜索、截断初筛 + 全维重打分的 recall@k 与每次查询耗时"""
+    from quantization import _recall, _rescore, _top_k
+
+    n, full_dims = base.shape
+    report: Dict[str, Any] = {"points": n, "queries": len(queries), "dims": full_dims, "k": k, "rows": []}
+
+    started = time.perf_counter()
+    exact = _top_k(queries @ base.T, k)
+    report["rows"].append({
+        "dims": full_dims, "oversampling": None, "recall": 1.0,
+        "query_ms": round((time.perf_counter() - started) / len(queries) * 1000, 3),
+    })
+
+    def head(matrix, dims):
+        part = matrix[:, :dims]
+        norms = np.linalg.norm(part, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return part / norms
+
+    for dims in dims_list:
+        short_base, short_queries = head(base, dims), head(queries, dims)
+        for factor in oversampling:
+            started = time.perf_counter()
+            candidates = _top_k(short_queries @ short_base.T, k * factor)
+            found = _rescore(candidates, queries, base, k) if factor > 1 else candidates
+            report["rows"].append({
+                "dims": dims,
+                "oversampling": factor,
+                "recall": round(_recall(found, exact), 4),
+                "query_ms": round((time.perf_counter() - started) / len(queries) * 1000, 3),
+            })
+    report["bytes_per_point"] = {"full": full_dims * 4, **{str(d): d * 4 for d in dims_list}}
+    return report
+
+
+def _print_report(report: Dict[str, Any]):
+    print("=" * 60)
+    print(f"点数 {report['points']}，查询 {report['queries']} 条，完整维度 {report['dims']}，k={report['k']}")
+    for row in report["rows"]:
+        label = "全维暴力搜索" if row["oversampling"] is None else (
+            "仅截断" if row["oversampling"] == 1 else f"初筛 x{row['oversampling']} + 重打分"
+        )
+        print(f"  {row['dims']:5d} 维  {label:16s} recall@{report['k']}={row['recall']:.4f}  模拟 {row['query_ms']}ms/查询")
+    print("主索引每点向量字节数: " + ", ".join(f"{k}={v}" for k, v in report["bytes_per_point"].items()))
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    from qdrant_client import QdrantClient
+    from quantization import _load_vectors
+
+    parser = argparse.ArgumentParser(description='Matryoshka 截断向量：迁移与召回率报告')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate', help='从现有集合生成截断向量集合与完整向量侧存储')
+    migrate_parser.add_argument('--path', default='./memorydb/vector', help='Qdrant 本地库路径（默认: ./memorydb/vector）')
+    migrate_parser.add_argument('--collection', default='mem0', help='源集合名称（默认: mem0）')
+    migrate_parser.add_argument('--dims', type=int, default=256, help='截断维度（默认: 256）')
+    migrate_parser.add_argument('--side-path', default=DEFAULT_SIDE_STORE_PATH, help='完整向量侧存储路径')
+
+    report_parser = subparsers.add_parser('report', help='recall vs 延迟报告')
+    report_parser.add_argument('--path', default='./memorydb/vector', help='Qdrant 本地库路径（默认: ./memorydb/vector）')
+    report_parser.add_argument('--collection', default='mem0', help='完整维度向量所在集合（默认: mem0）')
+    report_parser.add_argument('--dims', default='256,512', help='逗号分隔的截断维度（默认: 256,512）')
+    report_parser.add_argument('--oversampling', default='1,2,4', help='逗号分隔的初筛倍数（默认: 1,2,4）')
+    report_parser.add_argument('--k', type=int, default=10, help='recall@k（默认: 10）')
+    report_parser.add_argument('--queries', type=int, default=100, help='留出作为查询的点数（默认: 100）')
+    report_parser.add_argument('--max-points', type=int, default=50000, help='最多读取的点数（默认: 50000）')
+    report_parser.add_argument('--seed', type=int, default=0, help='抽样随机种子')
+    args = parser.parse_args()
+
+    qdrant = QdrantClient(path=args.path)
+    if args.command == 'migrate':
+        result = migrate(qdrant, args.collection, args.dims, args.side_path)
+        print(f"✅ {result['source']} -> {result['target']}: {result['points']} 个点，耗时 {result['seconds']} 秒")
+    else:
+        vectors = _load_vectors(qdrant, args.collection, args.max_points + args.queries)
+        if len(vectors) <= args.queries:
+            parser.error(f"集合中只有 {len(vectors)} 个点，不足以留出 {args.queries} 条查询")
+        order = np.random.default_rng(args.seed).permutation(len(vectors))
+        _print_report(simulate(
+            vectors[order[args.queries:]],
+            vectors[order[:args.queries]],
+            [int(x) for x in args.dims.split(',') if x.strip()],
+            k=args.k,
+            oversampling=[int(x) for x in args.oversampling.split(',') if x.strip()]
+        ))
@@ -11,19 +11,65 @@ Mem0 HTTP 服务器
 环境变量要求:
     GPT_41_NANO_KEY - Azure OpenAI GPT-4.1-nano API Key
     TEXT_EMBEDDING_3_SMALL - Azure OpenAI Embedding API Key
+
+可选环境变量（离线基准测试时指向 fake_azure_server.py）:
+    AZURE_OPENAI_LLM_ENDPOINT - LLM 服务地址
+    AZURE_OPENAI_EMBEDDING_ENDPOINT - Embedding 服务地址
+
+多进程运行（Qdrant 本地库与 Kuzu 由单独的存储进程持有，见 storage_owner.py）:
+    MEM0_API_WORKERS - uvicorn 工作进程数（默认 1，即单进程直接访问存储）
 """
 
 import os
+import re
 import json
+import time
+import atexit
+import shutil
+import secrets
+import tempfile
 import traceback
-from typing import List, Optional, Dict, Any
+from copy import deepcopy
+from typing import List, Literal, Optional, Dict, Any
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Query, Body
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Body, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel, Field
+
+# 多进程模式下的工作进程：mem0 初始化时会在 MEM0_DIR 下打开自己的 Qdrant 本地库，
+# 每个工作进程使用独立目录，避免互相争用文件锁（必须在导入 mem0 之前设置）
+if os.getenv("MEM0_STORAGE_SOCKET"):
+    os.environ["MEM0_DIR"] = tempfile.mkdtemp(prefix="mem0-worker-")
+    # 工作进程退出（含 uvicorn 重启工作进程）时删除占位目录
+    atexit.register(shutil.rmtree, os.environ["MEM0_DIR"], ignore_errors=True)
+
 from mem0 import Memory
 
+from executor_pool import ExecutorLayer, PoolFullError, install_storage_lock
+from admission import AdmissionController, AdmissionMiddleware
+from batch_ingest import BatchIngestor
+from embedding_cache import EmbeddingCache, install_embedding_cache
+from search_cache import SearchCache
+from single_flight import SingleFlight
+from job_queue import JobQueue
+from memory_pager import MemoryPager, MAX_PAGE_SIZE, parse_fields
+from history_store import HistoryStore, MAX_HISTORY_PAGE_SIZE
+from procedural_summary import ProceduralSummarizer
+from bulk_purge import BulkPurger
+from compaction import Compactor, CompactionScheduler
+import snapshot
+from batch_search import MAX_BATCH_QUERIES, merge_results, search_many
+from payload_index import ensure_payload_indexes
+from quantization import apply_quantization
+from matryoshka import TwoTierVectorStore, collection_name_for, install_two_tier
+from lexical_index import LexicalIndex, fuse_rrf, install_lexical_index
+from dedup import DedupIndex, install_dedup_index, request_digest
+from json_response import FastJSONResponse, ResponseEncodingMiddleware
+from graph_mode import add_with_graph_mode, add_graph_relations, search_with_graph_mode
+from storage_owner import DEFAULT_SOCKET_PATH, attach_remote_storage, run_owner
+from metrics import registry as metrics_registry, instrument_memory, start_trace, end_trace, current_trace
+
 
 # ============================================
 # Pydantic 数据模型
@@ -121,8 +167,25 @@ class AddMemoryRequest(BaseModel):
     messages: List[Message] = Field(..., description="对话消息列表")
     user_id: str = Field(default="default_user", description="用户 ID")
     agent_id: Optional[str] = Field(default=None, description="Agent ID，用于程序性记忆")
+    run_id: Optional[str] = Field(default=None, description="运行 ID，区分同一 Agent 的不同执行")
     infer: bool = Field(default=False, description="是否启用推理")
     memory_type: Optional[str] = Field(default=None, description="记忆类型，可选值为 'procedural_memory' 或 None")
+    incremental: bool = Field(
+        default=False,
+        description="程序性记忆增量模式：按 (user_id, agent_id, run_id) 只发送新消息，摘要追加到同一条记忆"
+    )
+    async_mode: bool = Field(default=False, description="异步模式：立即返回 202 和 job_id，后台执行添加")
+    graph: Literal["on", "off", "only", "deferred"] = Field(
+        default="on",
+        description="图数据库路径：on 同时写入 / off 只写向量库 / only 只写图数据库 / deferred 同步写向量库、后台构建图关系"
+    )
+    include_timings: bool = Field(default=False, description="在响应 data.timings 中附带各阶段耗时")
+
+
+class BatchAddMemoryRequest(BaseModel):
+    """批量添加记忆请求"""
+    items: List[AddMemoryRequest] = Field(..., max_length=1000, description="待添加的记忆请求列表")
+    llm_concurrency: int = Field(default=8, ge=1, le=32, description="LLM 调用并发数")
 
 
 class SearchMemoryRequest(BaseModel):
@@ -130,6 +193,29 @@ class SearchMemoryRequest(BaseModel):
     query: str = Field(..., description="搜索查询")
     user_id: str = Field(default="default_user", description="用户 ID")
     limit: Optional[int] = Field(default=5, description="返回结果数量限制")
+    graph: Literal["on", "off", "only"] = Field(
+        default="on",
+        description="图数据库路径：on 同时搜索 / off 只搜索向量库 / only 只搜索图数据库"
+    )
+    mode: Literal["vector", "lexical", "hybrid"] = Field(
+        default="vector",
+        description="检索方式：vector 向量搜索 / lexical 只查本地倒排索引（不请求 embedding，忽略 graph）/ hybrid 两路按排名融合"
+    )
+    include_timings: bool = Field(default=False, description="在响应 data.timings 中附带各阶段耗时")
+
+
+class BatchSearchMemoryRequest(BaseModel):
+    """批量搜索记忆请求"""
+    queries: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_QUERIES, description="搜索查询列表")
+    user_id: str = Field(default="default_user", description="用户 ID")
+    limit: int = Field(default=5, ge=1, le=100, description="每条查询返回结果数量限制")
+    graph: Literal["on", "off"] = Field(
+        default="off",
+        description="图数据库路径：on 同时搜索（每条查询一次实体抽取）/ off 只搜索向量库"
+    )
+    merge: bool = Field(default=False, description="按记忆 ID 合并去重全部查询的结果（保留最高分）")
+    merge_limit: Optional[int] = Field(default=None, ge=1, description="合并结果的数量上限（默认不限）")
+    include_timings: bool = Field(default=False, description="在响应 data.timings 中附带各阶段耗时")
 
 
 class UpdateMemoryRequest(BaseModel):
@@ -150,6 +236,31 @@ class MemoryResponse(BaseModel):
 
 memory_instance: Optional[Memory] = None
 config: Dict[str, Any] = {}
+executors: Optional[ExecutorLayer] = None
+embedding_cache: Optional[EmbeddingCache] = None
+search_cache: Optional[SearchCache] = None
+single_flight: Optional[SingleFlight] = None
+job_queue: Optional[JobQueue] = None
+memory_pager: Optional[MemoryPager] = None
+history_store: Optional[HistoryStore] = None
+procedural_summarizer: Optional[ProceduralSummarizer] = None
+admission: Optional[AdmissionController] = None
+lexical_index: Optional[LexicalIndex] = None
+two_tier_store: Optional[TwoTierVectorStore] = None
+dedup_index: Optional[DedupIndex] = None
+compaction_scheduler: Optional[CompactionScheduler] = None
+
+# 由本服务自行处理、不传给 mem0 的配置项
+SERVER_CONFIG_KEYS = (
+    "embedding_cache", "search_cache", "single_flight", "job_queue", "procedural_summary", "admission",
+    "lexical_index", "quantization", "matryoshka", "dedup", "compaction", "snapshot"
+)
+
+# compaction 配置中只用于定时任务的键，其余传给 Compactor
+COMPACTION_SCHEDULE_KEYS = ("schedule_enabled", "interval_seconds")
+
+# 快照名称只允许字母、数字、下划线、点和横线，限定在 snapshot.root 目录下
+SNAPSHOT_NAME_PATTERN = re.compile(r"[\w.-]+")
 
 
 # ============================================
@@ -159,7 +270,7 @@ config: Dict[str, Any] = {}
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    global memory_instance, config
+    global memory_instance, config, executors, embedding_cache, search_cache, single_flight, job_queue, memory_pager, history_store, procedural_summarizer, admission, lexical_index, two_tier_store, dedup_index, compaction_scheduler
     
     # 启动时初始化
     print("=" * 60)
@@ -188,7 +299,7 @@ async def lifespan(app: FastAPI):
                 "azure_kwargs": {
                     "api_key": gpt_key,
                     "azure_deployment": "gpt-4.1-nano",
-                    "azure_endpoint": "https://bk-us-2.openai.azure.com",
+                    "azure_endpoint": os.getenv("AZURE_OPENAI_LLM_ENDPOINT", "https://bk-us-2.openai.azure.com"),
                     "api_version": "2025-01-01-preview",
                 }
             }
@@ -202,7 +313,7 @@ async def lifespan(app: FastAPI):
                 "azure_kwargs": {
                     "api_key": embedding_key,
                     "azure_deployment": "text-embedding-3-small",
-                    "azure_endpoint": "https://bk-cloud.openai.azure.com",
+                    "azure_endpoint": os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT", "https://bk-cloud.openai.azure.com"),
                     "api_version": "2023-05-15",
                 }
             }
@@ -223,12 +334,215 @@ async def lifespan(app: FastAPI):
             }
         },
         # 历史记录配置
-        "history_db_path": "./memorydb/history/history.db"
+        "history_db_path": "./memorydb/history/history.db",
+        # Embedding 缓存配置（键为 model + dims + 文本 md5）
+        "embedding_cache": {
+            "enabled": True,
+            "path": "./memorydb/embcache/embeddings.db",
+            "max_entries": 10000
+        },
+        # 搜索结果缓存配置（写操作按 user_id 失效）
+        "search_cache": {
+            "enabled": True,
+            "ttl_seconds": 60,
+            "max_entries": 2048
+        },
+        # 相同读请求合并执行（search / GET /memories）
+        "single_flight": {
+            "enabled": True
+        },
+        # 异步添加任务队列配置
+        "job_queue": {
+            "enabled": True,
+            "path": "./memorydb/jobs/jobs.db",
+            "workers": 2,
+            # 任务最多执行次数（进程在执行中崩溃后重启会再次执行）
+            "max_attempts": 3
+        },
+        # 增量式程序性记忆摘要（按 user_id + agent_id + run_id 保存摘要与水位线）
+        "procedural_summary": {
+            "enabled": True,
+            "path": "./memorydb/procedural/state.db",
+            "head_chars": 1500,
+            "tail_chars": 4000
+        },
+        # 向量量化（none / scalar / binary）；mem0 的 vector_store 配置不接受额外字段，因此单独配置
+        # Qdrant 本地模式不支持量化，只对 Qdrant 服务端生效（见 quantization.py）
+        "quantization": {
+            "mode": "none",
+            "oversampling": 2.0
+        },
+        # Matryoshka 两级检索：Qdrant 存截断到 dims 维的向量（集合 mem0_mrl{dims}），
+        # 完整 1536 维向量存 SQLite 侧存储，搜索取 limit × oversampling 个候选后用完整向量重打分
+        # 已有数据先用 python matryoshka.py migrate --dims 256 生成新集合
+        "matryoshka": {
+            "enabled": False,
+            "dims": 256,
+            "oversampling": 4,
+            "path": "./memorydb/fullvec/vectors.db"
+        },
+        # 近似重复记忆合并（POST /memories/compact；schedule_enabled 时按间隔提交后台任务）
+        "compaction": {
+            "schedule_enabled": False,
+            "interval_seconds": 6 * 3600,
+            "threshold": 0.92,
+            "block_size": 1024,
+            "use_llm": False,
+            "max_merges_per_run": 500,
+            "writes_per_second": 20,
+            "llm_calls_per_minute": 30
+        },
+        # 快照导出 / 导入（POST /admin/snapshot/export、/admin/snapshot/import，需安装 pyarrow）
+        "snapshot": {
+            "root": "./snapshots",
+            "chunk_size": 1000,
+            "import_workers": 4
+        },
+        # 添加前的哈希去重：完全相同的重发直接返回，infer=False 时跳过已存在的消息
+        "dedup": {
+            "enabled": True,
+            "max_digests_per_user": 1024
+        },
+        # 记忆文本的字符 n-gram 倒排索引（mode=lexical / hybrid）
+        "lexical_index": {
+            "enabled": True,
+            "rrf_k": 60,
+            "hybrid_candidates": 20
+        },
+        # 准入控制：按接口类别限制并发与排队，超出时返回 429 + Retry-After
+        "admission": {
+            "enabled": True,
+            "per_user_max_pending": 8,
+            "classes": {
+                "read": {"max_in_flight": 32, "max_queued": 128, "max_wait_seconds": 10},
+                "write": {"max_in_flight": 16, "max_queued": 64, "max_wait_seconds": 30},
+                "batch": {"max_in_flight": 2, "max_queued": 8, "max_wait_seconds": 60}
+            }
+        }
     }
     
+    storage_socket = os.getenv("MEM0_STORAGE_SOCKET")
+
     try:
-        memory_instance = Memory.from_config(config_dict=config)
+        mem0_config = {k: v for k, v in config.items() if k not in SERVER_CONFIG_KEYS}
+        if storage_socket:
+            # 工作进程：本地只创建占位存储，随后替换为存储进程的代理
+            mem0_config = deepcopy(mem0_config)
+            mem0_config["vector_store"]["config"]["path"] = os.path.join(os.environ["MEM0_DIR"], "vector")
+            mem0_config["graph_store"]["config"]["db"] = os.path.join(os.environ["MEM0_DIR"], "graph.db")
+
+        mrl_config = config["matryoshka"]
+        if mrl_config["enabled"] and storage_socket:
+            # 存储进程按完整维度创建集合
+            print("⚪ Matryoshka 两级检索: 多进程模式下禁用")
+        elif mrl_config["enabled"]:
+            mem0_config = deepcopy(mem0_config)
+            mem0_config["vector_store"]["config"]["embedding_model_dims"] = mrl_config["dims"]
+            mem0_config["vector_store"]["config"]["collection_name"] = collection_name_for(mrl_config["dims"])
+
+        memory_instance = Memory.from_config(config_dict=mem0_config)
         print("✅ Memory 实例创建成功")
+
+        if mrl_config["enabled"] and not storage_socket:
+            two_tier_store = install_two_tier(
+                memory_instance,
+                dims=mrl_config["dims"],
+                path=mrl_config["path"],
+                oversampling=mrl_config["oversampling"]
+            )
+            print(
+                f"🪆 Matryoshka 两级检索: {mrl_config['dims']} 维初筛 x{mrl_config['oversampling']} + 完整向量重打分 "
+                f"(集合 {collection_name_for(mrl_config['dims'])}, 侧存储 {mrl_config['path']})"
+            )
+
+        if storage_socket:
+            attach_remote_storage(
+                memory_instance, storage_socket, bytes.fromhex(os.environ["MEM0_STORAGE_AUTHKEY"])
+            )
+            print(f"🔌 存储: 转发到存储进程 (socket {storage_socket}, pid {os.getpid()})")
+        else:
+            # 多进程模式下由存储进程负责
+            vector_store = memory_instance.vector_store
+            indexes = ensure_payload_indexes(vector_store.client, vector_store.collection_name)
+            if set(indexes.values()) == {"skipped"}:
+                print("⚪ Payload 索引: Qdrant 本地模式不支持，按 user_id 过滤为全量扫描")
+            else:
+                print(f"🏷️  Payload 索引: {indexes}")
+
+            quantization = config["quantization"]
+            status = apply_quantization(vector_store, quantization["mode"], quantization["oversampling"])
+            if status == "skipped":
+                print(f"⚪ 向量量化: Qdrant 本地模式不支持 {quantization['mode']}，按 float32 存储")
+            elif status == "applied":
+                print(f"🗜️  向量量化: {quantization['mode']} (rescore, oversampling {quantization['oversampling']})")
+
+            # 执行器的多个线程同时访问本地 Qdrant / Kuzu，经同一把锁串行
+            locked = install_storage_lock(memory_instance)
+            if any(locked.values()):
+                print(f"🔒 嵌入式存储串行访问: {', '.join(name for name, on in locked.items() if on)}")
+
+        memory_pager = MemoryPager(memory_instance)
+
+        # 历史记录直接查询 history 表：建索引，并补齐记忆归属（history 表没有 user_id）
+        history_store = HistoryStore(config["history_db_path"])
+        history_store.ensure_schema()
+        backfilled = history_store.backfill_owners(memory_instance)
+        print(f"📜 历史索引已就绪 (补齐 {backfilled} 条记忆归属)")
+
+        cache_config = config["embedding_cache"]
+        if cache_config["enabled"]:
+            embedding_cache = install_embedding_cache(
+                memory_instance,
+                path=cache_config["path"],
+                max_entries=cache_config["max_entries"]
+            )
+            print(f"🗂️  Embedding 缓存: SQLite (路径: {cache_config['path']})")
+
+        search_cache_config = config["search_cache"]
+        if storage_socket and search_cache_config["enabled"]:
+            # 写失效只在本进程内生效，多进程时其他进程会读到过期结果
+            print("⚪ 搜索缓存: 多进程模式下禁用")
+        elif search_cache_config["enabled"]:
+            search_cache = SearchCache(
+                ttl_seconds=search_cache_config["ttl_seconds"],
+                max_entries=search_cache_config["max_entries"]
+            )
+            print(f"🗂️  搜索缓存: TTL {search_cache_config['ttl_seconds']} 秒, 上限 {search_cache_config['max_entries']} 条")
+
+        procedural_config = config["procedural_summary"]
+        if procedural_config["enabled"]:
+            procedural_summarizer = ProceduralSummarizer(
+                memory_instance,
+                prompt=MY_ROCEDURAL_MEMORY_SYSTEM_PROMPT,
+                path=procedural_config["path"],
+                head_chars=procedural_config["head_chars"],
+                tail_chars=procedural_config["tail_chars"]
+            )
+            print(f"📝 增量程序性记忆: SQLite (路径: {procedural_config['path']})")
+
+        if config["single_flight"]["enabled"]:
+            single_flight = SingleFlight()
+            print("🔀 读请求合并: 已启用")
+
+        # 阶段耗时埋点（包在缓存之外，缓存命中也计入 embedding 阶段）
+        instrument_memory(memory_instance)
+        print("📈 指标: http://localhost:8000/metrics")
+
+        if storage_socket and config["lexical_index"]["enabled"]:
+            # 索引在进程内存中，其他进程的写入无法增量维护
+            print("⚪ 倒排索引: 多进程模式下禁用")
+        elif config["lexical_index"]["enabled"]:
+            lexical_index = install_lexical_index(memory_instance)
+            print(f"🔤 倒排索引: 已索引 {lexical_index.stats()['documents']} 条记忆")
+
+        dedup_config = config["dedup"]
+        if storage_socket and dedup_config["enabled"]:
+            print("⚪ 添加去重: 多进程模式下禁用")
+        elif dedup_config["enabled"]:
+            dedup_index = install_dedup_index(
+                memory_instance, DedupIndex(max_digests_per_user=dedup_config["max_digests_per_user"])
+            )
+            print(f"♻️  添加去重: 已索引 {dedup_index.stats()['memories']} 条记忆的 hash")
         
         # 显示配置信息
         print(f"📊 向量数据库: Qdrant (路径: ./memorydb/vector)")
@@ -247,6 +561,47 @@ async def lifespan(app: FastAPI):
         print(f"❌ 初始化失败: {e}")
         traceback.print_exc()
     
+    # 读写分离的线程池，同步的 Memory 调用都在这里执行
+    executors = ExecutorLayer.from_env()
+    print(f"🧵 执行器: 读池 {executors.read.max_workers} 线程 / 写池 {executors.write.max_workers} 线程")
+
+    # 异步添加任务队列，依赖 Memory 实例
+    job_config = config["job_queue"]
+    if memory_instance is not None and job_config["enabled"]:
+        job_queue = JobQueue(
+            _run_job, path=job_config["path"], workers=job_config["workers"], max_attempts=job_config["max_attempts"]
+        )
+        resumed = job_queue.start()
+        print(f"📬 任务队列: {job_config['workers']} 个工作线程 (路径: {job_config['path']}, 恢复 {resumed} 个未完成任务)")
+
+        compaction_config = config["compaction"]
+        if compaction_config["schedule_enabled"] and storage_socket:
+            # 每个工作进程都会提交任务
+            print("⚪ 定时记忆合并: 多进程模式下禁用")
+        elif compaction_config["schedule_enabled"]:
+            compaction_scheduler = CompactionScheduler(job_queue, compaction_config["interval_seconds"])
+            compaction_scheduler.start()
+            print(f"🧹 定时记忆合并: 每 {compaction_config['interval_seconds']} 秒, 阈值 {compaction_config['threshold']}")
+
+    admission_config = config["admission"]
+    if admission_config["enabled"]:
+        admission = AdmissionController(
+            admission_config["classes"],
+            per_user_max_pending=admission_config["per_user_max_pending"],
+            on_wait=lambda cls, waited: metrics_registry.observe(
+                "mem0_admission_wait_seconds", {"class": cls}, waited
+            ),
+            on_shed=lambda cls, reason: metrics_registry.inc(
+                "mem0_admission_shed_total", {"class": cls, "reason": reason}
+            )
+        )
+        limits = ", ".join(
+            f"{name} {c['max_in_flight']}+{c['max_queued']}" for name, c in admission_config["classes"].items()
+        )
+        print(f"🚦 准入控制: {limits} (并发+排队), 每用户 {admission_config['per_user_max_pending']}")
+
+    metrics_registry.add_collector(_collect_component_metrics)
+
     yield
     
     # 关闭时清理
@@ -254,6 +609,15 @@ async def lifespan(app: FastAPI):
     print("🛑 Mem0 HTTP 服务器关闭中...")
     print("=" * 60)
 
+    if compaction_scheduler is not None:
+        compaction_scheduler.stop()
+    if job_queue is not None:
+        print("⏳ 等待执行中的异步任务完成...")
+        job_queue.stop()
+    executors.shutdown(wait=True)
+    if embedding_cache is not None:
+        embedding_cache.close()
+
 
 # ============================================
 # FastAPI 应用
@@ -263,10 +627,319 @@ app = FastAPI(
     title="Mem0 记忆管理 API",
     description="提供记忆的增删改查和搜索功能",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 
+def _admission_class(method: str, path: str) -> Optional[str]:
+    """按接口划分准入类别；返回 None 的接口（健康检查、统计、任务查询）不限流"""
+    if not (path == "/memories" or path.startswith("/memories/") or path == "/history"):
+        return None
+    if method == "POST" and path == "/memories/batch":
+        return "batch"
+    if method == "GET" or (method == "POST" and path.startswith("/memories/search")):
+        return "read"
+    return "write"
+
+
+# 先于指标中间件注册，位于其内层：被拒绝的请求也计入请求延迟
+# 响应压缩 + ?compact=1（最内层：准入拒绝的 429 很小，不需要压缩）
+app.add_middleware(ResponseEncodingMiddleware, minimum_size=1024)
+app.add_middleware(AdmissionMiddleware, classify=_admission_class, get_controller=lambda: admission)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """记录每个请求的延迟，并为请求建立阶段耗时明细"""
+    trace, token = start_trace()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        end_trace(token)
+        route = request.scope.get("route")
+        labels = {
+            "method": request.method,
+            "route": route.path if route is not None else "unmatched",
+        }
+        metrics_registry.observe(
+            "mem0_http_request_duration_seconds", labels, time.perf_counter() - trace.started
+        )
+        if status_code >= 500:
+            metrics_registry.inc("mem0_http_errors_total", {**labels, "status": str(status_code)})
+
+
+def _collect_component_metrics():
+    """线程池、缓存、任务队列的瞬时状态"""
+    if executors is not None:
+        for pool_name, pool in executors.stats().items():
+            labels = {"pool": pool_name}
+            yield "mem0_pool_active", "Tasks running in the executor pool", labels, pool["active"]
+            yield "mem0_pool_queued", "Tasks waiting in the executor pool", labels, pool["queued"]
+            yield "mem0_pool_rejected", "Tasks rejected because the pool queue was full", labels, pool["rejected"]
+    if embedding_cache is not None:
+        cache_stats = embedding_cache.stats()
+        yield "mem0_embedding_cache_hits", "Embedding cache hits", {"tier": "memory"}, cache_stats["memory_hits"]
+        yield "mem0_embedding_cache_hits", "Embedding cache hits", {"tier": "disk"}, cache_stats["disk_hits"]
+        yield "mem0_embedding_cache_misses", "Embedding cache misses", {}, cache_stats["misses"]
+    if search_cache is not None:
+        cache_stats = search_cache.stats()
+        yield "mem0_search_cache_hits", "Search result cache hits", {}, cache_stats["hits"]
+        yield "mem0_search_cache_misses", "Search result cache misses", {}, cache_stats["misses"]
+        yield "mem0_search_cache_saved_seconds", "Latency saved by search cache hits", {}, cache_stats["saved_seconds"]
+    if single_flight is not None:
+        flight_stats = single_flight.stats()
+        yield "mem0_singleflight_executed", "Read requests that ran their own computation", {}, flight_stats["executed"]
+        yield "mem0_singleflight_deduplicated", "Read requests served by joining an in-flight computation", {}, flight_stats["deduplicated"]
+    if admission is not None:
+        for cls, class_stats in admission.stats().items():
+            labels = {"class": cls}
+            yield "mem0_admission_in_flight", "Requests admitted and running", labels, class_stats["in_flight"]
+            yield "mem0_admission_queued", "Requests waiting for admission", labels, class_stats["queued"]
+            yield "mem0_admission_service_seconds", "Smoothed service time used for Retry-After", labels, class_stats["service_time_ms"] / 1000
+    if lexical_index is not None:
+        index_stats = lexical_index.stats()
+        yield "mem0_lexical_index_documents", "Memories in the lexical index", {}, index_stats["documents"]
+        yield "mem0_lexical_index_searches", "Searches answered by the lexical index", {}, index_stats["searches"]
+    if dedup_index is not None:
+        dedup_stats = dedup_index.stats()
+        for level, hits in dedup_stats["hits"].items():
+            labels = {"level": level}
+            yield "mem0_dedup_hits", "Add requests that skipped work because of exact repeats", labels, hits
+            yield "mem0_dedup_skipped", "Messages or facts skipped as exact repeats", labels, dedup_stats["skipped"][level]
+    if job_queue is not None:
+        job_stats = job_queue.stats()
+        for status in ("pending", "succeeded", "failed"):
+            yield "mem0_jobs", "Async jobs by status", {"status": status}, job_stats[status]
+        yield "mem0_jobs", "Async jobs by status", {"status": "running"}, job_stats["running"]
+
+
+def _with_timings(result: Optional[Dict[str, Any]], include_timings: bool) -> Optional[Dict[str, Any]]:
+    """按需在结果中附带当前请求的阶段耗时"""
+    trace = current_trace()
+    if not include_timings or trace is None:
+        return result
+    return {**(result or {}), "timings": trace.summary()}
+
+
+# ============================================
+# 读结果失效（搜索缓存 + 合并中的读请求）
+# ============================================
+
+def _memory_owner(memory_id: str) -> Optional[str]:
+    """查询记忆所属用户，用于写操作后精确失效搜索缓存"""
+    existing = memory_instance.get(memory_id=memory_id)
+    return existing.get("user_id") if existing else None
+
+
+def _invalidate_reads(user_id: Optional[str]):
+    """写操作完成后失效该用户的搜索缓存与合并中的读请求；用户未知时全部失效"""
+    if single_flight is not None:
+        single_flight.forget(user_id or None)
+    if search_cache is None:
+        return
+    if user_id:
+        search_cache.invalidate_user(user_id)
+    else:
+        search_cache.invalidate_all()
+
+
+# ============================================
+# 添加记忆（同步 / 异步任务共用）
+# ============================================
+
+def _record_owners(user_id: Optional[str], results: Optional[List[Dict[str, Any]]]):
+    """登记新增记忆的归属，供 /history 按 user_id 过滤"""
+    if history_store is None or not user_id:
+        return
+    history_store.record_owners(
+        (r.get("id"), user_id) for r in results or [] if r.get("event") == "ADD"
+    )
+
+
+def _dedup_add(request: AddMemoryRequest, messages: List[Dict[str, Any]]):
+    """
+    添加前的去重检查，返回 (摘要, 剩余消息, 去重信息)
+    剩余消息为空时整条请求无需执行
+    """
+    digest = request_digest(request, messages)
+    if dedup_index.seen(request.user_id, digest):
+        dedup_index.record_hit("messages", len(messages))
+        return digest, [], {"level": "messages", "skipped": len(messages)}
+
+    # infer=False 时每条消息即一条记忆；写图数据库时消息还要用于关系抽取，不做删减
+    writes_graph = request.graph == "on" and getattr(memory_instance, "enable_graph", False)
+    if request.infer or request.memory_type == "procedural_memory" or request.graph == "only" or writes_graph:
+        return digest, messages, None
+    kept, skipped = dedup_index.drop_known_messages(request.dict(include={"user_id", "agent_id", "run_id"}), messages)
+    if not skipped:
+        return digest, messages, None
+    dedup_index.record_hit("facts", skipped)
+    if all(msg["role"] == "system" for msg in kept):
+        kept = []
+    return digest, kept, {"level": "facts", "skipped": skipped}
+
+
+def _add_memory_sync(request: AddMemoryRequest) -> Dict[str, Any]:
+    """执行一次添加记忆，并失效该用户的搜索缓存"""
+    messages = [msg.dict() for msg in request.messages]
+    incremental = request.memory_type == "procedural_memory" and request.agent_id and request.incremental and procedural_summarizer
+
+    digest, deduplicated = None, None
+    if dedup_index is not None and not incremental:
+        digest, messages, deduplicated = _dedup_add(request, messages)
+        if not messages:
+            return {"results": [], "deduplicated": deduplicated}
+
+    try:
+        if incremental:
+            result = procedural_summarizer.add(
+                messages,
+                agent_id=request.agent_id,
+                user_id=request.user_id,
+                run_id=request.run_id
+            )
+        elif request.memory_type == "procedural_memory":
+            result = memory_instance.add(
+                messages=messages,
+                user_id=request.user_id,
+                agent_id=request.agent_id,
+                run_id=request.run_id,
+                infer=request.infer,
+                memory_type=request.memory_type,
+                prompt=MY_ROCEDURAL_MEMORY_SYSTEM_PROMPT
+            )
+        else:
+            result = add_with_graph_mode(
+                memory_instance,
+                messages,
+                request.graph,
+                user_id=request.user_id,
+                agent_id=request.agent_id,
+                run_id=request.run_id,
+                infer=request.infer
+            )
+            if request.graph == "deferred" and getattr(memory_instance, 'enable_graph', False):
+                result["graph_job_id"] = _enqueue_graph_job(request)
+        _record_owners(request.user_id, result.get("results"))
+        if digest is not None:
+            dedup_index.remember(request.user_id, digest)
+        if deduplicated is not None:
+            result["deduplicated"] = deduplicated
+        return result
+    finally:
+        _invalidate_reads(request.user_id)
+
+
+def _enqueue_graph_job(request: AddMemoryRequest) -> str:
+    """deferred 模式：把图关系构建放入任务队列"""
+    return job_queue.enqueue("add_graph", request.dict(include={"messages", "user_id", "agent_id", "run_id"}))
+
+
+def _add_graph_sync(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """后台构建图关系"""
+    try:
+        relations = add_graph_relations(
+            memory_instance,
+            payload["messages"],
+            user_id=payload.get("user_id"),
+            agent_id=payload.get("agent_id"),
+            run_id=payload.get("run_id")
+        )
+        return {"relations": relations}
+    finally:
+        _invalidate_reads(payload.get("user_id"))
+
+
+def _purge_sync(user_id: str, progress=None) -> Dict[str, Any]:
+    """批量清除用户的全部记忆"""
+    try:
+        return BulkPurger(memory_instance).purge({"user_id": user_id}, progress=progress)
+    finally:
+        if lexical_index is not None:
+            lexical_index.remove_where({"user_id": user_id})
+        if two_tier_store is not None:
+            two_tier_store.side.delete_user(user_id)
+        if dedup_index is not None:
+            dedup_index.forget_user(user_id)
+        _invalidate_reads(user_id)
+
+
+def _compact_sync(user_id: Optional[str] = None, dry_run: bool = False, progress=None) -> Dict[str, Any]:
+    """合并近似重复的记忆（user_id 为空时处理全部用户）"""
+    options = {k: v for k, v in config["compaction"].items() if k not in COMPACTION_SCHEDULE_KEYS}
+    try:
+        return Compactor(memory_instance, **options).run(user_id, dry_run=dry_run, progress=progress)
+    finally:
+        if not dry_run:
+            _invalidate_reads(user_id)
+
+
+def _snapshot_dir(name: str) -> str:
+    if not SNAPSHOT_NAME_PATTERN.fullmatch(name) or name in (".", ".."):
+        raise ValueError(f"无效的快照名称: {name}")
+    return os.path.join(config["snapshot"]["root"], name)
+
+
+def _graph_execute():
+    if getattr(memory_instance, "enable_graph", False):
+        return memory_instance.graph.kuzu_execute
+    return None
+
+
+def _snapshot_export_sync(name: str, user_id: Optional[str] = None, vector_dtype: str = "float32", progress=None) -> Dict[str, Any]:
+    """导出快照到 snapshot.root/name（user_id 为空时导出全部租户）"""
+    return snapshot.export_snapshot(
+        _snapshot_dir(name),
+        memory_instance.vector_store,
+        _graph_execute(),
+        config["history_db_path"],
+        user_id=user_id,
+        vector_dtype=vector_dtype,
+        chunk_size=config["snapshot"]["chunk_size"],
+        progress=progress
+    )
+
+
+def _snapshot_import_sync(name: str, workers: Optional[int] = None, progress=None) -> Dict[str, Any]:
+    """从 snapshot.root/name 导入快照"""
+    try:
+        return snapshot.import_snapshot(
+            _snapshot_dir(name),
+            memory_instance.vector_store,
+            _graph_execute(),
+            config["history_db_path"],
+            workers=workers or config["snapshot"]["import_workers"],
+            progress=progress
+        )
+    finally:
+        _invalidate_reads(None)
+
+
+def _run_job(kind: str, payload: Dict[str, Any]) -> Any:
+    """任务队列的处理函数"""
+    if kind == "add":
+        return _add_memory_sync(AddMemoryRequest(**payload))
+    if kind == "add_graph":
+        return _add_graph_sync(payload)
+    if kind == "purge":
+        return _purge_sync(payload["user_id"], progress=job_queue.report_progress)
+    if kind == "compact":
+        return _compact_sync(
+            payload.get("user_id"), dry_run=payload.get("dry_run", False), progress=job_queue.report_progress
+        )
+    if kind == "snapshot_export":
+        return _snapshot_export_sync(
+            payload["name"], payload.get("user_id"), payload.get("vector_dtype", "float32"), progress=job_queue.report_progress
+        )
+    if kind == "snapshot_import":
+        return _snapshot_import_sync(payload["name"], payload.get("workers"), progress=job_queue.report_progress)
+    raise ValueError(f"未知的任务类型: {kind}")
+
+
 # ============================================
 # API 端点
 # ============================================
@@ -279,7 +952,9 @@ async def root():
         "version": "1.0.0",
         "status": "running",
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "stats": "/stats",
+        "metrics": "/metrics"
     }
 
 
@@ -296,6 +971,33 @@ async def health_check():
     }
 
 
+@app.get("/stats", response_model=dict)
+async def get_stats():
+    """运行统计 - 线程池排队深度与延迟"""
+    return {
+        "executors": executors.stats() if executors else None,
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "search_cache": search_cache.stats() if search_cache else None,
+        "single_flight": single_flight.stats() if single_flight else None,
+        "job_queue": job_queue.stats() if job_queue else None,
+        "procedural_summary": procedural_summarizer.stats() if procedural_summarizer else None,
+        "admission": admission.stats() if admission else None,
+        "lexical_index": lexical_index.stats() if lexical_index else None,
+        "matryoshka": two_tier_store.stats() if two_tier_store else None,
+        "dedup": dedup_index.stats() if dedup_index else None,
+        "compaction": compaction_scheduler.stats() if compaction_scheduler else None
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus 文本格式的指标（阶段耗时、接口延迟、token 数、错误数）"""
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 @app.post("/memories", response_model=MemoryResponse)
 async def add_memory(request: AddMemoryRequest):
     """
@@ -305,31 +1007,44 @@ async def add_memory(request: AddMemoryRequest):
     - **user_id**: 用户 ID，用于隔离不同用户的记忆
     - **agent_id**: Agent ID，用于程序性记忆
     - **infer**: 是否启用推理模式
+    - **run_id**: 运行 ID
     - **memory_type**: 记忆类型，可选值为 'procedural_memory' 或 None
+    - **incremental**: 程序性记忆增量模式，每次只需发送新的执行步骤
+    - **async_mode**: 异步模式，立即返回 202 和 job_id，通过 GET /jobs/{job_id} 查询结果
+    - **graph**: 图数据库路径 on / off / only / deferred（deferred 返回 graph_job_id）
     """
     if memory_instance is None:
         raise HTTPException(status_code=503, detail="Memory 实例未初始化")
+    if request.graph == "deferred" and job_queue is None:
+        raise HTTPException(status_code=503, detail="任务队列未启用，不能使用 graph=deferred")
+
+    if request.async_mode:
+        if job_queue is None:
+            raise HTTPException(status_code=503, detail="任务队列未启用")
+        job_id = job_queue.enqueue("add", request.dict(exclude={"async_mode"}))
+        return FastJSONResponse(
+            status_code=202,
+            content=MemoryResponse(
+                success=True,
+                message="记忆添加任务已提交",
+                data={"job_id": job_id, "status": "pending", "status_url": f"/jobs/{job_id}"}
+            ).dict()
+        )
 
     try:
-        # 转换消息格式
-        messages = [msg.dict() for msg in request.messages]
-
         # 添加记忆
-        result = memory_instance.add(
-            messages=messages,
-            user_id=request.user_id,
-            agent_id=request.agent_id,
-            infer=request.infer,
-            memory_type=request.memory_type,
-            prompt=MY_ROCEDURAL_MEMORY_SYSTEM_PROMPT
-        )
+        result = await executors.run_write(_add_memory_sync, request)
 
         return MemoryResponse(
             success=True,
             message="记忆添加成功",
-            data=result
+            data=_with_timings(result, request.include_timings)
         )
 
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         return MemoryResponse(
             success=False,
@@ -338,6 +1053,125 @@ async def add_memory(request: AddMemoryRequest):
         )
 
 
+@app.get("/jobs/{job_id}", response_model=MemoryResponse)
+async def get_job(job_id: str):
+    """
+    查询异步任务状态
+
+    - **job_id**: 提交异步添加时返回的任务 ID
+
+    status 取值: pending / running / succeeded / failed，成功时 result 为添加结果
+    """
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="任务队列未启用")
+
+    job = job_queue.get(job_id)
+    if job is None:
+        return MemoryResponse(
+            success=False,
+            message=f"未找到 ID 为 {job_id} 的任务",
+            data=None
+        )
+
+    return MemoryResponse(
+        success=True,
+        message=f"任务状态: {job['status']}",
+        data=job
+    )
+
+
+@app.post("/memories/batch", response_model=MemoryResponse)
+async def add_memories_batch(request: BatchAddMemoryRequest):
+    """
+    批量添加记忆
+
+    - **items**: AddMemoryRequest 列表（最多 1000 条）
+    - **llm_concurrency**: LLM 调用并发数（默认 8）
+
+    事实抽取并行执行，embedding 合并为多输入请求，向量库与历史表合并写入。
+    返回结果与 items 一一对应；各条目的 graph 参数与单条添加相同。
+    """
+    if memory_instance is None:
+        raise HTTPException(status_code=503, detail="Memory 实例未初始化")
+    if job_queue is None and any(item.graph == "deferred" for item in request.items):
+        raise HTTPException(status_code=503, detail="任务队列未启用，不能使用 graph=deferred")
+
+    try:
+        ingestor = BatchIngestor(
+            memory_instance,
+            llm_concurrency=request.llm_concurrency,
+            procedural_prompt=MY_ROCEDURAL_MEMORY_SYSTEM_PROMPT,
+            dedup=dedup_index,
+            procedural_summarizer=procedural_summarizer
+        )
+        items = await executors.run_write(ingestor.run, request.items)
+        for item in items:
+            item_request = request.items[item["index"]]
+            _record_owners(item_request.user_id, item.get("results"))
+            if item["success"] and item_request.graph == "deferred" and getattr(memory_instance, 'enable_graph', False):
+                item["graph_job_id"] = _enqueue_graph_job(item_request)
+        failed = sum(1 for item in items if not item["success"])
+
+        return MemoryResponse(
+            success=failed == 0,
+            message=f"批量添加完成: {len(items) - failed} 条成功, {failed} 条失败",
+            data={"items": items}
+        )
+
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        return MemoryResponse(
+            success=False,
+            message=f"批量添加记忆失败: {str(e)}",
+            data={"error": traceback.format_exc()}
+        )
+    finally:
+        for user_id in {item.user_id for item in request.items}:
+            _invalidate_reads(user_id)
+
+
+def _hybrid_search_sync(request: SearchMemoryRequest) -> Dict[str, Any]:
+    """向量与倒排索引各取候选，按排名融合"""
+    lexical_config = config["lexical_index"]
+    candidates = max(request.limit or 5, lexical_config["hybrid_candidates"])
+    result = search_with_graph_mode(
+        memory_instance,
+        request.query,
+        request.graph,
+        user_id=request.user_id,
+        limit=candidates
+    )
+    lexical_results = lexical_index.search(request.query, {"user_id": request.user_id}, candidates)
+    result["results"] = fuse_rrf(
+        result.get("results", []), lexical_results, request.limit or 5, k=lexical_config["rrf_k"]
+    )
+    return result
+
+
+async def _search_and_cache(request: SearchMemoryRequest, cache_key) -> Dict[str, Any]:
+    """执行搜索并写入搜索缓存"""
+    generation = search_cache.generation(request.user_id) if search_cache else None
+    started = time.perf_counter()
+
+    # 搜索记忆
+    if request.mode == "hybrid":
+        result = await executors.run_read(_hybrid_search_sync, request)
+    else:
+        result = await executors.run_read(
+            search_with_graph_mode,
+            memory_instance,
+            request.query,
+            request.graph,
+            user_id=request.user_id,
+            limit=request.limit
+        )
+
+    if search_cache:
+        search_cache.put(cache_key, result, time.perf_counter() - started, generation)
+    return result
+
+
 @app.post("/memories/search", response_model=MemoryResponse)
 async def search_memories(request: SearchMemoryRequest):
     """
@@ -346,24 +1180,55 @@ async def search_memories(request: SearchMemoryRequest):
     - **query**: 搜索查询文本
     - **user_id**: 用户 ID
     - **limit**: 返回结果数量限制（默认 5）
+    - **graph**: 图数据库路径 on / off / only
+    - **mode**: 检索方式 vector / lexical / hybrid
     """
     if memory_instance is None:
         raise HTTPException(status_code=503, detail="Memory 实例未初始化")
+    if request.mode != "vector" and lexical_index is None:
+        raise HTTPException(status_code=400, detail=f"倒排索引未启用，不能使用 mode={request.mode}")
     
     try:
-        # 搜索记忆
-        result = memory_instance.search(
-            query=request.query,
-            user_id=request.user_id,
-            limit=request.limit
+        if request.mode == "lexical":
+            # 本地倒排索引，直接在事件循环中完成
+            result = {
+                "results": lexical_index.search(request.query, {"user_id": request.user_id}, request.limit or 5)
+            }
+            return MemoryResponse(
+                success=True,
+                message=f"找到 {len(result['results'])} 条记忆",
+                data=_with_timings(result, request.include_timings)
+            )
+
+        graph = request.graph if getattr(memory_instance, 'enable_graph', False) else "off"
+        cache_key = SearchCache.make_key(
+            request.user_id,
+            request.query,
+            request.limit,
+            graph if request.mode == "vector" else (graph, request.mode)
         )
+        result = search_cache.get(cache_key) if search_cache else None
+
+        if result is None:
+            if single_flight is not None:
+                # 并发中的相同搜索只执行一次
+                result = await single_flight.do(
+                    (request.user_id, "search", *cache_key[1:]),
+                    _search_and_cache, request, cache_key
+                )
+            else:
+                result = await _search_and_cache(request, cache_key)
         
         return MemoryResponse(
             success=True,
             message=f"找到 {len(result.get('results', []))} 条记忆",
-            data=result
+            data=_with_timings(result, request.include_timings)
         )
     
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         return MemoryResponse(
             success=False,
@@ -372,20 +1237,121 @@ async def search_memories(request: SearchMemoryRequest):
         )
 
 
+def _search_batch_sync(request: BatchSearchMemoryRequest, queries: List[str]) -> List[Dict[str, Any]]:
+    return search_many(
+        memory_instance,
+        queries,
+        request.graph,
+        user_id=request.user_id,
+        limit=request.limit
+    )
+
+
+@app.post("/memories/search/batch", response_model=MemoryResponse)
+async def search_memories_batch(request: BatchSearchMemoryRequest):
+    """
+    批量搜索记忆
+
+    全部查询共用一次 embedding 请求和一次向量库批量查询；
+    每条查询的结果与 /memories/search 相同，并共用搜索缓存
+
+    - **queries**: 搜索查询列表（最多 50 条）
+    - **user_id**: 用户 ID
+    - **limit**: 每条查询返回结果数量限制
+    - **graph**: 图数据库路径 on / off（默认 off）
+    - **merge**: 额外返回按记忆 ID 合并去重后的结果
+    """
+    if memory_instance is None:
+        raise HTTPException(status_code=503, detail="Memory 实例未初始化")
+
+    try:
+        graph = request.graph if getattr(memory_instance, 'enable_graph', False) else "off"
+        keys = [SearchCache.make_key(request.user_id, query, request.limit, graph) for query in request.queries]
+        cached = {key: search_cache.get(key) for key in set(keys)} if search_cache else {}
+        missing = list(dict.fromkeys(key for key in keys if cached.get(key) is None))
+
+        if missing:
+            generation = search_cache.generation(request.user_id) if search_cache else None
+            started = time.perf_counter()
+            computed = await executors.run_read(_search_batch_sync, request, [key[1] for key in missing])
+            elapsed = (time.perf_counter() - started) / len(missing)
+            for key, result in zip(missing, computed):
+                cached[key] = result
+                if search_cache:
+                    search_cache.put(key, result, elapsed, generation)
+
+        per_query = [cached[key] for key in keys]
+        data: Dict[str, Any] = {
+            "results": [{"query": query, **result} for query, result in zip(request.queries, per_query)],
+            "cache_hits": len(set(keys)) - len(missing),
+        }
+        if request.merge:
+            data["merged"] = merge_results(per_query, request.merge_limit)
+
+        return MemoryResponse(
+            success=True,
+            message=f"完成 {len(request.queries)} 条查询",
+            data=_with_timings(data, request.include_timings)
+        )
+
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        return MemoryResponse(
+            success=False,
+            message=f"批量搜索记忆失败: {str(e)}",
+            data={"error": traceback.format_exc()}
+        )
+
+
+def _get_memories_page(
+    user_id: str,
+    page_size: int,
+    cursor: Optional[str],
+    fields: Optional[List[str]]
+) -> Dict[str, Any]:
+    """读取一页记忆；首页在启用图数据库时附带关系数据（与 get_all 一致）"""
+    filters = {"user_id": user_id}
+    results, next_cursor = memory_pager.page(filters, page_size, cursor, fields)
+    result = {"results": results, "next_cursor": next_cursor}
+    if cursor is None and getattr(memory_instance, 'enable_graph', False):
+        result["relations"] = memory_instance.graph.get_all(filters, page_size)
+    return result
+
+
 @app.get("/memories", response_model=MemoryResponse)
 async def get_all_memories(
-    user_id: str = Query(default="default_user", description="用户 ID")
+    user_id: str = Query(default="default_user", description="用户 ID"),
+    cursor: Optional[str] = Query(default=None, description="分页游标，取自上一页返回的 next_cursor"),
+    page_size: int = Query(default=100, ge=1, le=MAX_PAGE_SIZE, description="每页条数"),
+    fields: Optional[str] = Query(default=None, description="返回字段，逗号分隔，如 id,memory,created_at")
 ):
     """
-    获取所有记忆
+    分页获取记忆
     
     - **user_id**: 用户 ID
+    - **cursor**: 分页游标，首页不传；返回的 next_cursor 为空表示已到最后一页
+    - **page_size**: 每页条数（默认 100，最大 1000）
+    - **fields**: 只返回指定字段（id / memory / hash / created_at / updated_at /
+      user_id / agent_id / run_id / actor_id / role / metadata）
     """
     if memory_instance is None:
         raise HTTPException(status_code=503, detail="Memory 实例未初始化")
     
     try:
-        result = memory_instance.get_all(user_id=user_id)
+        selected_fields = parse_fields(fields)
+        if single_flight is not None:
+            # 并发中的相同分页请求只执行一次
+            key = (user_id, "page", page_size, cursor, tuple(selected_fields) if selected_fields is not None else None)
+            result = await single_flight.do(
+                key, executors.run_read, _get_memories_page, user_id, page_size, cursor, selected_fields
+            )
+        else:
+            result = await executors.run_read(
+                _get_memories_page, user_id, page_size, cursor, selected_fields
+            )
         
         return MemoryResponse(
             success=True,
@@ -393,6 +1359,10 @@ async def get_all_memories(
             data=result
         )
     
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         return MemoryResponse(
             success=False,
@@ -401,6 +1371,41 @@ async def get_all_memories(
         )
 
 
+@app.get("/memories/stream")
+async def stream_memories(
+    user_id: str = Query(default="default_user", description="用户 ID"),
+    page_size: int = Query(default=256, ge=1, le=MAX_PAGE_SIZE, description="服务端每次读取的条数"),
+    fields: Optional[str] = Query(default=None, description="返回字段，逗号分隔，如 id,memory")
+):
+    """
+    以 NDJSON 流式返回用户的全部记忆（每行一条 JSON）
+
+    - **user_id**: 用户 ID
+    - **page_size**: 服务端每次从向量库读取的条数
+    - **fields**: 只返回指定字段
+    """
+    if memory_instance is None:
+        raise HTTPException(status_code=503, detail="Memory 实例未初始化")
+
+    try:
+        selected_fields = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def generate():
+        cursor = None
+        while True:
+            items, cursor = await executors.run_read(
+                memory_pager.page, {"user_id": user_id}, page_size, cursor, selected_fields
+            )
+            for item in items:
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            if cursor is None:
+                break
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 @app.get("/memories/{memory_id}", response_model=MemoryResponse)
 async def get_memory(memory_id: str):
     """
@@ -412,7 +1417,7 @@ async def get_memory(memory_id: str):
         raise HTTPException(status_code=503, detail="Memory 实例未初始化")
     
     try:
-        result = memory_instance.get(memory_id=memory_id)
+        result = await executors.run_read(memory_instance.get, memory_id=memory_id)
         
         if not result:
             return MemoryResponse(
@@ -427,6 +1432,8 @@ async def get_memory(memory_id: str):
             data=result
         )
     
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         return MemoryResponse(
             success=False,
@@ -449,8 +1456,11 @@ async def update_memory(
     if memory_instance is None:
         raise HTTPException(status_code=503, detail="Memory 实例未初始化")
     
+    owner = None
     try:
-        result = memory_instance.update(
+        owner = await executors.run_read(_memory_owner, memory_id)
+        result = await executors.run_write(
+            memory_instance.update,
             memory_id=memory_id,
             data=request.data
         )
@@ -461,12 +1471,16 @@ async def update_memory(
             data=result
         )
     
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         return MemoryResponse(
             success=False,
             message=f"更新记忆失败: {str(e)}",
             data={"error": traceback.format_exc()}
         )
+    finally:
+        _invalidate_reads(owner)
 
 
 @app.delete("/memories/{memory_id}", response_model=MemoryResponse)
@@ -479,8 +1493,10 @@ async def delete_memory(memory_id: str):
     if memory_instance is None:
         raise HTTPException(status_code=503, detail="Memory 实例未初始化")
     
+    owner = None
     try:
-        memory_instance.delete(memory_id=memory_id)
+        owner = await executors.run_read(_memory_owner, memory_id)
+        await executors.run_write(memory_instance.delete, memory_id=memory_id)
         
         return MemoryResponse(
             success=True,
@@ -488,35 +1504,59 @@ async def delete_memory(memory_id: str):
             data=None
         )
     
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         return MemoryResponse(
             success=False,
             message=f"删除记忆失败: {str(e)}",
             data={"error": traceback.format_exc()}
         )
+    finally:
+        _invalidate_reads(owner)
 
 
 @app.delete("/memories", response_model=MemoryResponse)
 async def delete_all_memories(
-    user_id: str = Query(default="default_user", description="用户 ID")
+    user_id: str = Query(default="default_user", description="用户 ID"),
+    async_mode: bool = Query(default=False, description="异步模式：立即返回 202 和 job_id，通过 GET /jobs/{job_id} 查看进度")
 ):
     """
     删除用户的所有记忆
     
     - **user_id**: 用户 ID
+    - **async_mode**: 异步模式，任务进度（当前阶段、已处理条数、耗时）通过 GET /jobs/{job_id} 查询
+
+    向量库一次过滤删除，图数据库一条 Cypher 删除，历史表一个事务写入。
+    返回各阶段的条数与耗时。
     """
     if memory_instance is None:
         raise HTTPException(status_code=503, detail="Memory 实例未初始化")
+
+    if async_mode:
+        if job_queue is None:
+            raise HTTPException(status_code=503, detail="任务队列未启用")
+        job_id = job_queue.enqueue("purge", {"user_id": user_id})
+        return FastJSONResponse(
+            status_code=202,
+            content=MemoryResponse(
+                success=True,
+                message="记忆删除任务已提交",
+                data={"job_id": job_id, "status": "pending", "status_url": f"/jobs/{job_id}"}
+            ).dict()
+        )
     
     try:
-        memory_instance.delete_all(user_id=user_id)
+        report = await executors.run_write(_purge_sync, user_id)
         
         return MemoryResponse(
             success=True,
-            message=f"用户 {user_id} 的所有记忆已删除",
-            data=None
+            message=f"用户 {user_id} 的所有记忆已删除（{report['deleted']} 条，耗时 {report['duration_seconds']} 秒）",
+            data=report
         )
     
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         return MemoryResponse(
             success=False,
@@ -525,28 +1565,231 @@ async def delete_all_memories(
         )
 
 
+@app.post("/memories/compact", response_model=MemoryResponse)
+async def compact_memories(
+    user_id: Optional[str] = Query(default=None, description="用户 ID，不传表示全部用户"),
+    dry_run: bool = Query(default=False, description="只返回合并计划，不修改数据"),
+    async_mode: bool = Query(default=False, description="异步模式：立即返回 202 和 job_id，通过 GET /jobs/{job_id} 查看进度")
+):
+    """
+    合并近似重复的记忆
+
+    - **user_id**: 用户 ID，不传表示全部用户
+    - **dry_run**: 只返回合并计划
+    - **async_mode**: 异步模式，进度（已处理用户、合并簇数）通过 GET /jobs/{job_id} 查询
+
+    向量余弦相似度超过阈值的记忆聚成簇，每簇保留一条（历史记 UPDATE），其余删除（历史记 DELETE）。
+    返回各用户合并前后的条数与合并明细。
+    """
+    if memory_instance is None:
+        raise HTTPException(status_code=503, detail="Memory 实例未初始化")
+
+    if async_mode:
+        if job_queue is None:
+            raise HTTPException(status_code=503, detail="任务队列未启用")
+        job_id = job_queue.enqueue("compact", {"user_id": user_id, "dry_run": dry_run})
+        return FastJSONResponse(
+            status_code=202,
+            content=MemoryResponse(
+                success=True,
+                message="记忆合并任务已提交",
+                data={"job_id": job_id, "status": "pending", "status_url": f"/jobs/{job_id}"}
+            ).dict()
+        )
+
+    try:
+        report = await executors.run_write(_compact_sync, user_id, dry_run)
+
+        return MemoryResponse(
+            success=True,
+            message=(
+                f"记忆合并{'计划' if dry_run else '完成'}: {report['before']} -> {report['after']} 条"
+                f"（{report['merged_clusters']} 簇，耗时 {report['duration_seconds']} 秒）"
+            ),
+            data=report
+        )
+
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        return MemoryResponse(
+            success=False,
+            message=f"合并记忆失败: {str(e)}",
+            data={"error": traceback.format_exc()}
+        )
+
+
+@app.post("/admin/snapshot/export", response_model=MemoryResponse)
+async def export_snapshot(
+    name: str = Query(description="快照名称，写入 snapshot.root/name"),
+    user_id: Optional[str] = Query(default=None, description="只导出该用户，不传表示全部用户"),
+    vector_dtype: Literal["float32", "float16"] = Query(default="float32", description="向量精度，float16 体积减半"),
+    async_mode: bool = Query(default=False, description="异步模式：立即返回 202 和 job_id，通过 GET /jobs/{job_id} 查看进度")
+):
+    """
+    导出快照（Arrow IPC，zstd 压缩）
+
+    - **name**: 快照名称
+    - **user_id**: 只导出该用户的向量、图节点 / 关系与历史
+    - **vector_dtype**: 向量列精度
+    - **async_mode**: 异步模式
+
+    向量、图与历史按块流式写入，内存占用与数据量无关。返回 manifest（各表行数、维度、文件大小）。
+    """
+    if memory_instance is None:
+        raise HTTPException(status_code=503, detail="Memory 实例未初始化")
+    if not snapshot.is_available():
+        raise HTTPException(status_code=503, detail="快照需要 pyarrow，未安装")
+
+    try:
+        _snapshot_dir(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if async_mode:
+        if job_queue is None:
+            raise HTTPException(status_code=503, detail="任务队列未启用")
+        job_id = job_queue.enqueue("snapshot_export", {"name": name, "user_id": user_id, "vector_dtype": vector_dtype})
+        return FastJSONResponse(
+            status_code=202,
+            content=MemoryResponse(
+                success=True,
+                message="快照导出任务已提交",
+                data={"job_id": job_id, "status": "pending", "status_url": f"/jobs/{job_id}"}
+            ).dict()
+        )
+
+    try:
+        manifest = await executors.run_write(_snapshot_export_sync, name, user_id, vector_dtype)
+
+        return MemoryResponse(
+            success=True,
+            message=f"快照 {name} 已导出: {manifest['counts']}（耗时 {manifest['duration_seconds']} 秒）",
+            data=manifest
+        )
+
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        return MemoryResponse(
+            success=False,
+            message=f"导出快照失败: {str(e)}",
+            data={"error": traceback.format_exc()}
+        )
+
+
+@app.post("/admin/snapshot/import", response_model=MemoryResponse)
+async def import_snapshot(
+    name: str = Query(description="快照名称，读取 snapshot.root/name"),
+    workers: Optional[int] = Query(default=None, ge=1, le=32, description="向量并行写入线程数，默认 snapshot.import_workers"),
+    async_mode: bool = Query(default=False, description="异步模式：立即返回 202 和 job_id，通过 GET /jobs/{job_id} 查看进度")
+):
+    """
+    导入快照
+
+    - **name**: 快照名称
+    - **workers**: 向量并行写入线程数
+    - **async_mode**: 异步模式
+
+    向量按 ID 覆盖、历史按 ID 去重；图节点会重新创建，导入租户前先 DELETE /memories?user_id=... 清空。
+    不调用 LLM 与 Embedding。
+    """
+    if memory_instance is None:
+        raise HTTPException(status_code=503, detail="Memory 实例未初始化")
+    if not snapshot.is_available():
+        raise HTTPException(status_code=503, detail="快照需要 pyarrow，未安装")
+
+    try:
+        snapshot.read_manifest(_snapshot_dir(name))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if async_mode:
+        if job_queue is None:
+            raise HTTPException(status_code=503, detail="任务队列未启用")
+        job_id = job_queue.enqueue("snapshot_import", {"name": name, "workers": workers})
+        return FastJSONResponse(
+            status_code=202,
+            content=MemoryResponse(
+                success=True,
+                message="快照导入任务已提交",
+                data={"job_id": job_id, "status": "pending", "status_url": f"/jobs/{job_id}"}
+            ).dict()
+        )
+
+    try:
+        report = await executors.run_write(_snapshot_import_sync, name, workers)
+
+        return MemoryResponse(
+            success=True,
+            message=f"快照 {name} 已导入: {report['counts']}（耗时 {report['duration_seconds']} 秒）",
+            data=report
+        )
+
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        return MemoryResponse(
+            success=False,
+            message=f"导入快照失败: {str(e)}",
+            data={"error": traceback.format_exc()}
+        )
+
+
 @app.get("/history", response_model=MemoryResponse)
 async def get_history(
-    user_id: str = Query(default="default_user", description="用户 ID")
+    user_id: Optional[str] = Query(default="default_user", description="用户 ID，传空字符串表示不按用户过滤"),
+    memory_id: Optional[str] = Query(default=None, description="记忆 ID"),
+    event: Optional[str] = Query(default=None, description="事件类型: ADD / UPDATE / DELETE"),
+    actor_id: Optional[str] = Query(default=None, description="执行者 ID"),
+    since: Optional[str] = Query(default=None, description="起始时间（含），ISO 8601"),
+    until: Optional[str] = Query(default=None, description="结束时间（不含），ISO 8601"),
+    order: str = Query(default="desc", pattern="^(asc|desc)$", description="排序: desc 最新在前 / asc 最早在前"),
+    cursor: Optional[str] = Query(default=None, description="分页游标，取自上一页返回的 next_cursor"),
+    page_size: int = Query(default=100, ge=1, le=MAX_HISTORY_PAGE_SIZE, description="每页条数")
 ):
     """
-    获取用户的记忆历史记录（所有记忆列表）
+    获取记忆的变更历史（ADD / UPDATE / DELETE 事件，分页）
 
+    直接查询 history 表，不访问向量库。
     - **user_id**: 用户 ID
+    - **memory_id** / **event** / **actor_id**: 过滤条件
+    - **since** / **until**: 按 created_at 过滤时间范围（mem0 的 DELETE 事件没有 created_at，不会被时间范围匹配）
+    - **order**: 排序方向（按写入顺序）
+    - **cursor**: 分页游标
+    - **page_size**: 每页条数（默认 100）
     """
-    if memory_instance is None:
+    if history_store is None:
         raise HTTPException(status_code=503, detail="Memory 实例未初始化")
 
     try:
-        # 获取用户的所有记忆作为"历史记录"
-        result = memory_instance.get_all(user_id=user_id)
+        results, next_cursor = await executors.run_read(
+            history_store.query,
+            user_id=user_id,
+            memory_id=memory_id,
+            event=event,
+            actor_id=actor_id,
+            since=since,
+            until=until,
+            cursor=cursor,
+            limit=page_size,
+            order=order
+        )
 
         return MemoryResponse(
             success=True,
-            message=f"获取到 {len(result.get('results', []))} 条记忆记录",
-            data={"history": result.get('results', [])}
+            message=f"获取到 {len(results)} 条历史事件",
+            data={"history": results, "next_cursor": next_cursor}
         )
 
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         return MemoryResponse(
             success=False,
@@ -559,13 +1802,63 @@ async def get_history(
 # 主程序入口
 # ============================================
 
+def _run_workers(workers: int):
+    """启动存储进程，再以多个 uvicorn 工作进程运行 API"""
+    import multiprocessing
+    import uvicorn
+
+    socket_path = os.path.abspath(os.getenv("MEM0_STORAGE_SOCKET", DEFAULT_SOCKET_PATH))
+    authkey = secrets.token_bytes(32)
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+
+    owner = multiprocessing.Process(
+        target=run_owner,
+        kwargs={
+            "address": socket_path,
+            "authkey": authkey,
+            # 与 lifespan 中 config 的 vector_store / graph_store 保持一致
+            "vector_config": {"path": "./memorydb/vector", "on_disk": True, "embedding_model_dims": 1536},
+            "graph_db": "./memorydb/graph/kemem_graph.db",
+        },
+        name="mem0-storage-owner",
+        daemon=True
+    )
+    owner.start()
+
+    # 等待 socket 就绪
+    deadline = time.monotonic() + 60
+    while not os.path.exists(socket_path) and owner.is_alive() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    if not os.path.exists(socket_path):
+        owner.terminate()
+        raise RuntimeError("存储进程启动失败")
+
+    os.environ["MEM0_STORAGE_SOCKET"] = socket_path
+    os.environ["MEM0_STORAGE_AUTHKEY"] = authkey.hex()
+    try:
+        uvicorn.run(
+            "mem0_server:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=workers,
+            log_level="info"
+        )
+    finally:
+        owner.terminate()
+        owner.join(timeout=10)
+
+
 if __name__ == "__main__":
     import uvicorn
-    
-    # 运行服务器
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=8000,
-        log_level="info"
-    )
\ No newline at end of file
+
+    api_workers = int(os.getenv("MEM0_API_WORKERS", "1"))
+    if api_workers > 1:
+        _run_workers(api_workers)
+    else:
+        # 运行服务器
+        uvicorn.run(
+            app,
+            host="0.0.0.0",
+            port=8000,
+            log_level="info"
+        )
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+记忆列表的游标分页与流式读取
+替代 Memory.get_all 一次性把用户的全部记忆读入内存
+
+- 游标是 Qdrant scroll offset 的 base64 编码，对客户端不透明
+- fields 参数做 payload 投影，只从 Qdrant 读取需要的字段
+- 服务端逐页读取并输出 NDJSON，内存占用与记忆总数无关
+
+返回条目的格式与 mem0 get_all 保持一致:
+    id / memory / hash / created_at / updated_at / user_id / agent_id / run_id /
+    actor_id / role / metadata
+"""
+
+import json
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+
+PROMOTED_PAYLOAD_KEYS = ["user_id", "agent_id", "run_id", "actor_id", "role"]
+CORE_PAYLOAD_KEYS = {"data", "hash", "created_at", "updated_at", "id", *PROMOTED_PAYLOAD_KEYS}
+
+# 返回字段 -> payload 字段
+FIELD_TO_PAYLOAD = {
+    "memory": "data",
+    "hash": "hash",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    **{key: key for key in PROMOTED_PAYLOAD_KEYS},
+}
+
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析"""
+
+
+def encode_cursor(offset: Any) -> Optional[str]:
+    if offset is None:
+        return None
+    raw = json.dumps({"o": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Any:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))["o"]
+    except Exception as e:
+        raise InvalidCursorError(f"无效的游标: {cursor}") from e
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """解析逗号分隔的字段列表；None 表示返回全部字段"""
+    if not fields:
+        return None
+    parsed = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in parsed if f not in FIELD_TO_PAYLOAD and f not in ("id", "metadata")]
+    if unknown:
+        raise ValueError(f"未知的字段: {', '.join(unknown)}")
+    return parsed
+
+
+def format_record(record, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """把 Qdrant 记录转换为 mem0 get_all 的条目格式"""
+    payload = record.payload or {}
+    item: Dict[str, Any] = {"id": str(record.id)}
+
+    if fields is None or "memory" in fields:
+        item["memory"] = payload.get("data")
+    for field in ("hash", "created_at", "updated_at"):
+        if fields is None or field in fields:
+            item[field] = payload.get(field)
+    for key in PROMOTED_PAYLOAD_KEYS:
+        if key in payload and (fields is None or key in fields):
+            item[key] = payload[key]
+    if fields is None or "metadata" in fields:
+        metadata = {k: v for k, v in payload.items() if k not in CORE_PAYLOAD_KEYS}
+        if metadata:
+            item["metadata"] = metadata
+    return item
+
+
+class MemoryPager:
+    """基于 Qdrant scroll 的分页读取"""
+
+    def __init__(self, memory):
+        self.memory = memory
+
+    def _payload_selector(self, fields: Optional[List[str]]):
+        if fields is None or "metadata" in fields:
+            return True
+        keys = [FIELD_TO_PAYLOAD[f] for f in fields if f in FIELD_TO_PAYLOAD]
+        return keys or False
+
+    def page(
+        self,
+        filters: Dict[str, Any],
+        page_size: int = 100,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """读取一页，返回 (条目列表, 下一页游标)"""
+        vector_store = self.memory.vector_store
+        records, next_offset = vector_store.client.scroll(
+            collection_name=vector_store.collection_name,
+            scroll_filter=vector_store._create_filter(filters),
+            limit=min(max(1, page_size), MAX_PAGE_SIZE),
+            offset=decode_cursor(cursor),
+            with_payload=self._payload_selector(fields),
+            with_vectors=False,
+        )
+        return [format_record(r, fields) for r in records], encode_cursor(next_offset)
@@ -0,0 +1,372 @@
+"""
+Mem0 服务器的延迟埋点与 Prometheus 指标
+供 mem0_server.py 的 /metrics 接口使用
+
+埋点方式：包装 Memory 实例上的组件方法（不修改 mem0 源码）
+    llm.generate_response      -> llm_fact_extraction / llm_update_decision / llm_procedural
+    llm client 的 completions  -> LLM token 计数
+    embedding_model.embed      -> embedding
+    vector_store.*             -> vector_search / vector_insert / vector_update / ...
+    db.add_history             -> history_insert
+    graph.add / graph.search   -> graph_add / graph_search（图数据库内部的 LLM 调用记为 graph_llm）
+
+每个 HTTP 请求有一个 RequestTrace（通过 contextvars 传递），
+记录该请求内各阶段的耗时与 token 数，可以附带在响应的 data.timings 中。
+"""
+
+import time
+import bisect
+import threading
+import types
+import contextvars
+import concurrent.futures
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# 延迟直方图的桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """计数器 + 直方图 + 外部采集函数，输出 Prometheus 文本格式"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]] = []
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1.0):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(
+        self,
+        name: str,
+        labels: Optional[Dict[str, str]] = None,
+        value: float = 0.0,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]):
+        """
+        注册 gauge 采集函数，返回 (name, help, labels, value) 的序列
+        用于输出线程池、缓存等组件的瞬时状态
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+
+            for name in sorted(self._histograms):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {histogram.total}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.total}")
+
+        gauges: Dict[str, Tuple[str, List[Tuple[LabelKey, float]]]] = {}
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                continue
+            for name, help_text, labels, value in samples:
+                gauges.setdefault(name, (help_text, []))[1].append((_label_key(labels), value))
+        for name in sorted(gauges):
+            help_text, samples = gauges[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in samples:
+                lines.append(f"{name}{_format_labels(key)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# ============================================
+# 单个请求的耗时明细
+# ============================================
+
+class RequestTrace:
+    """一次请求内各阶段的耗时与 token 数"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, List[float]] = {}   # stage -> [count, seconds]
+        self.tokens: Dict[str, int] = {"prompt": 0, "completion": 0}
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def add_tokens(self, prompt: int, completion: int):
+        with self._lock:
+            self.tokens["prompt"] += prompt
+            self.tokens["completion"] += completion
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+                "stages": {
+                    stage: {"count": count, "ms": round(seconds * 1000, 2)}
+                    for stage, (count, seconds) in self.stages.items()
+                },
+                "tokens": dict(self.tokens),
+            }
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("mem0_trace", default=None)
+
+
+def start_trace() -> Tuple[RequestTrace, contextvars.Token]:
+    trace = RequestTrace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token: contextvars.Token):
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+# ============================================
+# 全局注册表与阶段计时
+# ============================================
+
+registry = MetricsRegistry()
+registry.describe("mem0_stage_duration_seconds", "Duration of internal memory pipeline stages")
+registry.describe("mem0_stage_errors_total", "Exceptions raised by internal memory pipeline stages")
+registry.describe("mem0_llm_tokens_total", "LLM tokens consumed, by stage and token type")
+registry.describe("mem0_http_request_duration_seconds", "HTTP request latency by route")
+registry.describe("mem0_http_errors_total", "HTTP responses with status >= 500")
+
+_llm_stage = threading.local()
+_active_stages = threading.local()
+
+
+@contextmanager
+def stage(name: str):
+    """记录一个阶段的耗时（全局直方图 + 当前请求明细）"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registry.inc("mem0_stage_errors_total", {"stage": name})
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe("mem0_stage_duration_seconds", {"stage": name}, elapsed)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(name, elapsed)
+
+
+def _wrap(obj, method: str, stage_name):
+    """把 obj.method 替换为计时版本；stage_name 可以是字符串或根据参数返回阶段名的函数"""
+    original = getattr(obj, method, None)
+    if original is None or getattr(original, "_mem0_instrumented", False):
+        return
+
+    def wrapper(*args, **kwargs):
+        name = stage_name(*args, **kwargs) if callable(stage_name) else stage_name
+        active = getattr(_active_stages, "names", None)
+        if active is None:
+            active = _active_stages.names = set()
+        if name in active:
+            # 同名阶段嵌套调用（如 embed -> embed_batch）只计一次
+            return original(*args, **kwargs)
+        active.add(name)
+        try:
+            with stage(name):
+                return original(*args, **kwargs)
+        finally:
+            active.discard(name)
+
+    wrapper._mem0_instrumented = True
+    setattr(obj, method, wrapper)
+
+
+def _classify_llm_call(messages=None, *args, **kwargs) -> str:
+    """根据消息结构区分 mem0 的几类 LLM 调用"""
+    messages = messages if messages is not None else kwargs.get("messages", [])
+    if messages and str(messages[-1].get("content", "")).startswith("Create procedural memory"):
+        return "llm_procedural"
+    if len(messages) == 1 and messages[0].get("role") == "user":
+        return "llm_update_decision"
+    if messages and messages[0].get("role") == "system":
+        return "llm_fact_extraction"
+    return "llm_other"
+
+
+def _instrument_llm(llm, classify):
+    """LLM 调用计时 + token 计数"""
+    original = getattr(llm, "generate_response", None)
+    if original is None or getattr(original, "_mem0_instrumented", False):
+        return
+
+    def generate_response(*args, **kwargs):
+        name = classify(*args, **kwargs) if callable(classify) else classify
+        previous = getattr(_llm_stage, "name", None)
+        _llm_stage.name = name
+        try:
+            with stage(name):
+                return original(*args, **kwargs)
+        finally:
+            _llm_stage.name = previous
+
+    generate_response._mem0_instrumented = True
+    llm.generate_response = generate_response
+
+    # token 数来自 OpenAI 客户端的原始响应
+    try:
+        completions = llm.client.chat.completions
+    except AttributeError:
+        return
+    original_create = completions.create
+    if getattr(original_create, "_mem0_instrumented", False):
+        return
+
+    def create(*args, **kwargs):
+        response = original_create(*args, **kwargs)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            stage_name = getattr(_llm_stage, "name", None) or "llm_other"
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            registry.inc("mem0_llm_tokens_total", {"stage": stage_name, "type": "prompt"}, prompt_tokens)
+            registry.inc("mem0_llm_tokens_total", {"stage": stage_name, "type": "completion"}, completion_tokens)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.add_tokens(prompt_tokens, completion_tokens)
+        return response
+
+    create._mem0_instrumented = True
+    completions.create = create
+
+
+class _ContextThreadPoolExecutor(concurrent.futures.ThreadPoolExecutor):
+    """submit 时复制调用方的 contextvars，任务在该副本中执行"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class _ContextFutures:
+    """concurrent.futures 的替身：ThreadPoolExecutor 换成复制上下文的版本，其余属性照常转发"""
+
+    ThreadPoolExecutor = _ContextThreadPoolExecutor
+
+    def __getattr__(self, name: str):
+        return getattr(concurrent.futures, name)
+
+
+def _install_fanout_bridge():
+    """
+    mem0 在内部线程池中并行执行向量与图两条路径，普通线程池的线程不继承 contextvars。
+    只替换 mem0.memory.main 模块看到的 ThreadPoolExecutor，请求的 trace 随上下文带入工作线程
+    """
+    try:
+        import mem0.memory.main as mem0_main
+    except ImportError:
+        return
+    if getattr(mem0_main, "ThreadPoolExecutor", None) is concurrent.futures.ThreadPoolExecutor:
+        mem0_main.ThreadPoolExecutor = _ContextThreadPoolExecutor
+    module = getattr(mem0_main, "concurrent", None)
+    if module is concurrent:
+        mem0_main.concurrent = types.SimpleNamespace(futures=_ContextFutures())
+
+
+def instrument_memory(memory):
+    """给 Memory 实例的各组件加上阶段计时"""
+    _instrument_llm(memory.llm, _classify_llm_call)
+
+    _wrap(memory.embedding_model, "embed", "embedding")
+    _wrap(memory.embedding_model, "embed_batch", "embedding")
+
+    vector_store = memory.vector_store
+    for method, name in (
+        ("search", "vector_search"),
+        ("insert", "vector_insert"),
+        ("update", "vector_update"),
+        ("delete", "vector_delete"),
+        ("get", "vector_get"),
+        ("list", "vector_list"),
+    ):
+        _wrap(vector_store, method, name)
+
+    _wrap(memory.db, "add_history", "history_insert")
+
+    graph = getattr(memory, "graph", None)
+    if graph is not None:
+        _wrap(graph, "add", "graph_add")
+        _wrap(graph, "search", "graph_search")
+        _wrap(graph, "delete_all", "graph_delete_all")
+        if getattr(graph, "llm", None) is not None and graph.llm is not memory.llm:
+            _instrument_llm(graph.llm, "graph_llm")
+        if getattr(graph, "embedding_model", None) is not None and graph.embedding_model is not memory.embedding_model:
+            _wrap(graph.embedding_model, "embed", "graph_embedding")
+
+    _install_fanout_bridge()
@@ -0,0 +1,183 @@
+"""
+Qdrant payload 索引（租户与元数据字段）
+mem0 的每次搜索与 get_all 都按 user_id（以及 agent_id / run_id）过滤，
+集合没有 payload schema 时过滤是全量扫描。
+
+- ensure_payload_indexes：服务启动时为以下字段声明 keyword 索引（已存在的跳过）
+    user_id（is_tenant，按租户组织存储）/ agent_id / run_id / actor_id / role / hash
+- 命令行工具：给已有的 memorydb/vector 补建索引，并输出建索引前后过滤搜索的延迟
+
+注意：Qdrant 本地模式（path=...，即本服务默认配置）不支持 payload 索引，
+create_payload_index 是空操作，过滤始终为全量扫描；索引只对 Qdrant 服务端（url / host）生效。
+本地模式下函数返回 skipped，工具照常输出基准数据以便对比。
+本地库有文件锁，运行工具前需先停止 mem0_server.py。
+
+运行方式:
+    python payload_index.py --path ./memorydb/vector
+    python payload_index.py --url http://localhost:6333 --rounds 50
+"""
+
+import time
+import random
+import argparse
+from typing import Any, Dict, List
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import FieldCondition, Filter, KeywordIndexParams, MatchValue, PayloadSchemaType
+
+
+DEFAULT_COLLECTION = "mem0"
+
+# 字段 -> 索引参数
+PAYLOAD_INDEXES: Dict[str, Any] = {
+    "user_id": KeywordIndexParams(type="keyword", is_tenant=True),
+    "agent_id": PayloadSchemaType.KEYWORD,
+    "run_id": PayloadSchemaType.KEYWORD,
+    "actor_id": PayloadSchemaType.KEYWORD,
+    "role": PayloadSchemaType.KEYWORD,
+    "hash": PayloadSchemaType.KEYWORD,
+}
+
+
+def is_local_client(client) -> bool:
+    """QdrantClient(path=...) / (":memory:") 为本地模式"""
+    try:
+        from qdrant_client.local.qdrant_local import QdrantLocal
+    except ImportError:
+        return False
+    return isinstance(getattr(client, "_client", None), QdrantLocal)
+
+
+def ensure_payload_indexes(client, collection_name: str = DEFAULT_COLLECTION) -> Dict[str, str]:
+    """为租户与元数据字段建立 keyword 索引，返回 字段 -> created / exists / skipped"""
+    if is_local_client(client):
+        return {field: "skipped" for field in PAYLOAD_INDEXES}
+
+    existing = client.get_collection(collection_name).payload_schema or {}
+    status: Dict[str, str] = {}
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field in existing:
+            status[field] = "exists"
+            continue
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field,
+            field_schema=schema,
+            wait=True,
+        )
+        status[field] = "created"
+    return status
+
+
+# ============================================
+# 补建索引 + 前后对比
+# ============================================
+
+def _sample_user_ids(client, collection_name: str, limit: int = 20) -> List[str]:
+    users, offset = set(), None
+    while len(users) < limit:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=256,
+            offset=offset,
+            with_payload=["user_id"],
+            with_vectors=False,
+        )
+        users.update((r.payload or {}).get("user_id") for r in records)
+        if offset is None:
+            break
+    users.discard(None)
+    return sorted(users)[:limit]
+
+
+def benchmark_filtered_search(
+    client,
+    collection_name: str,
+    user_ids: List[str],
+    rounds: int = 20,
+    limit: int = 10,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """按 user_id 过滤的向量搜索延迟（随机查询向量）"""
+    info = client.get_collection(collection_name)
+    dims = info.config.params.vectors.size
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    for _ in range(rounds):
+        for user_id in user_ids:
+            vector = [rng.uniform(-1, 1) for _ in range(dims)]
+            started = time.perf_counter()
+            client.query_points(
+                collection_name=collection_name,
+                query=vector,
+                query_filter=Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))]),
+                limit=limit,
+            )
+            latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        if not latencies:
+            return 0.0
+        return round(latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))] * 1000, 3)
+
+    return {
+        "points": info.points_count,
+        "queries": len(latencies),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+    }
+
+
+def backfill(
+    client,
+    collection_name: str = DEFAULT_COLLECTION,
+    rounds: int = 20,
+    users: int = 20
+) -> Dict[str, Any]:
+    """基准 -> 建索引 -> 基准"""
+    user_ids = _sample_user_ids(client, collection_name, users)
+    report: Dict[str, Any] = {"collection": collection_name, "local_mode": is_local_client(client), "users": len(user_ids)}
+    report["before"] = benchmark_filtered_search(client, collection_name, user_ids, rounds) if user_ids else None
+    started = time.perf_counter()
+    report["indexes"] = ensure_payload_indexes(client, collection_name)
+    report["index_seconds"] = round(time.perf_counter() - started, 3)
+    report["after"] = benchmark_filtered_search(client, collection_name, user_ids, rounds) if user_ids else None
+    return report
+
+
+def _print_report(report: Dict[str, Any]):
+    print("=" * 60)
+    print(f"集合: {report['collection']} (抽样用户 {report['users']} 个)")
+    if report["local_mode"]:
+        print("⚠️  本地模式：payload 索引不生效，过滤仍为全量扫描（需 Qdrant 服务端）")
+    for field, status in report["indexes"].items():
+        print(f"  {field:10s} {status}")
+    print(f"建索引耗时: {report['index_seconds']} 秒")
+    for label in ("before", "after"):
+        stats = report[label]
+        if stats is None:
+            print(f"{label:7s} 集合为空，未测量")
+            continue
+        print(
+            f"{label:7s} points={stats['points']} queries={stats['queries']} "
+            f"mean={stats['mean_ms']}ms p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms"
+        )
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='为 mem0 集合补建 payload 索引，并对比过滤搜索延迟')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--path', default='./memorydb/vector', help='Qdrant 本地库路径（默认: ./memorydb/vector）')
+    target.add_argument('--url', default=None, help='Qdrant 服务端地址，如 http://localhost:6333')
+    parser.add_argument('--collection', default=DEFAULT_COLLECTION, help='集合名称（默认: mem0）')
+    parser.add_argument('--rounds', type=int, default=20, help='每个用户的查询轮数（默认: 20）')
+    parser.add_argument('--users', type=int, default=20, help='抽样用户数（默认: 20）')
+    args = parser.parse_args()
+
+    qdrant = QdrantClient(url=args.url) if args.url else QdrantClient(path=args.path)
+    _print_report(backfill(qdrant, args.collection, rounds=args.rounds, users=args.users))
@@ -0,0 +1,315 @@
+"""
+增量式程序性记忆（procedural memory）摘要
+供 mem0_server.py 的 POST /memories（memory_type=procedural_memory + incremental）使用
+
+mem0 每次都把完整消息列表连同"逐字记录全部输出"的系统提示发给 LLM，
+长时间运行的 Agent 每一步的 prompt 和 completion 都随历史线性增长，总成本呈平方增长。
+增量模式按 (user_id, agent_id, run_id) 保存上次的摘要与水位线（不同用户的同名 agent / run 互不影响）:
+
+- 只把水位线之后的新消息 + 已有摘要的压缩视图（开头概览 + 末尾若干字符）发给 LLM
+- LLM 只输出新增的步骤，追加到已有摘要后写回同一条记忆（mem0 UPDATE 事件）
+- 客户端既可以每次只发本步消息，也可以每次发完整历史：
+  若新请求以已摘要的消息开头（按消息哈希比对），自动跳过这部分
+
+状态保存在 SQLite 表 procedural_state 中，服务重启后继续累积。
+多进程共用状态表：LLM 调用在事务外进行，写入记忆与状态时在 BEGIN IMMEDIATE 事务内
+核对状态未被其他进程修改（比较 memory_id / watermark / digest），有冲突时按新状态重试。
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from copy import deepcopy
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+import mem0.memory.main as mem0_main
+from mem0.configs.prompts import PROCEDURAL_MEMORY_SYSTEM_PROMPT
+from mem0.memory.utils import remove_code_blocks
+
+
+DEFAULT_STATE_PATH = "./memorydb/procedural/state.db"
+
+_STEP_NUMBER = re.compile(r"^\s*(\d+)\.\s", re.MULTILINE)
+
+# 与其他进程并发更新同一状态时的最大尝试次数
+MAX_CONFLICT_RETRIES = 3
+
+_STATE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS procedural_state (
+        user_id TEXT NOT NULL,
+        agent_id TEXT NOT NULL,
+        run_id TEXT NOT NULL,
+        memory_id TEXT NOT NULL,
+        summary TEXT NOT NULL,
+        watermark INTEGER NOT NULL,
+        digest TEXT NOT NULL,
+        steps INTEGER NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (user_id, agent_id, run_id)
+    )
+"""
+
+_KEY_CLAUSE = "user_id = ? AND agent_id = ? AND run_id = ?"
+
+
+def _messages_digest(messages: List[Dict[str, Any]], previous: str = "") -> str:
+    """消息序列的链式哈希，用于判断新请求是否以已摘要的消息开头"""
+    digest = previous
+    for msg in messages:
+        raw = json.dumps([msg.get("role"), msg.get("content")], ensure_ascii=False)
+        digest = hashlib.md5((digest + raw).encode()).hexdigest()
+    return digest
+
+
+class ProceduralSummarizer:
+    """按 (user_id, agent_id, run_id) 增量维护程序性记忆"""
+
+    def __init__(
+        self,
+        memory,
+        prompt: Optional[str] = None,
+        path: str = DEFAULT_STATE_PATH,
+        head_chars: int = 1500,
+        tail_chars: int = 4000,
+        embed_chars: int = 8000
+    ):
+        self.memory = memory
+        self.prompt = prompt
+        self.path = path
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.embed_chars = embed_chars
+        self._key_locks: Dict[tuple, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.full_runs = 0
+        self.incremental_runs = 0
+        self.skipped_messages = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(procedural_state)")}
+                if columns and "user_id" not in columns:
+                    self._migrate(conn)
+                conn.execute(_STATE_SCHEMA)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """旧版状态表以 (agent_id, run_id) 为主键：按记忆 payload 中的 user_id 补齐归属"""
+        conn.execute("ALTER TABLE procedural_state RENAME TO procedural_state_old")
+        conn.execute(_STATE_SCHEMA)
+        for row in conn.execute("SELECT * FROM procedural_state_old").fetchall():
+            existing = self.memory.vector_store.get(vector_id=row["memory_id"])
+            if existing is None:
+                # 记忆已被删除，下次添加时会重新开始
+                continue
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO procedural_state
+                    (user_id, agent_id, run_id, memory_id, summary, watermark, digest, steps, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                ((existing.payload or {}).get("user_id") or "", row["agent_id"], row["run_id"], row["memory_id"],
+                 row["summary"], row["watermark"], row["digest"], row["steps"], row["updated_at"])
+            )
+        conn.execute("DROP TABLE procedural_state_old")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _lock_for(self, key: tuple) -> threading.Lock:
+        with self._locks_guard:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    # ----------------------------------------
+    # 入口
+    # ----------------------------------------
+
+    def add(
+        self,
+        messages: List[Dict[str, Any]],
+        agent_id: str,
+        user_id: Optional[str] = None,
+        run_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """追加一段 Agent 执行记录，返回 mem0 add 格式的结果"""
+        key = (user_id or "", agent_id, run_id or "")
+        # 进程内按 key 串行，避免重复的 LLM 调用；跨进程的冲突由 _commit 检测后重试
+        with self._lock_for(key):
+            for _ in range(MAX_CONFLICT_RETRIES):
+                result = self._try_add(key, messages, user_id, agent_id, run_id)
+                if result is not None:
+                    return result
+        raise RuntimeError(f"程序性记忆 {key} 被其他进程并发更新，重试 {MAX_CONFLICT_RETRIES} 次后仍冲突")
+
+    def _try_add(self, key, messages, user_id, agent_id, run_id) -> Optional[Dict[str, Any]]:
+        """基于当前状态生成并写入；状态在此期间被其他进程修改时返回 None"""
+        state = self._load(key)
+        expected = self._version(state)
+        if state is not None and self.memory.vector_store.get(vector_id=state["memory_id"]) is None:
+            # 记忆已被删除，重新开始
+            state = None
+
+        if state is None:
+            return self._create(key, expected, messages, _messages_digest(messages), user_id, agent_id, run_id)
+
+        watermark = state["watermark"]
+        skipped = 0
+        if len(messages) >= watermark and _messages_digest(messages[:watermark]) == state["digest"]:
+            # 客户端发送的是完整历史，跳过已摘要部分
+            new_messages = messages[watermark:]
+            skipped = watermark
+        else:
+            # 客户端只发送了本步消息
+            new_messages = messages
+
+        if not new_messages:
+            return {"results": [], "incremental": {"mode": "noop", "new_messages": 0}}
+        # 链式哈希：两种发送方式得到的水位线与哈希一致
+        digest = _messages_digest(new_messages, state["digest"])
+        result = self._append(key, expected, state, new_messages, digest, watermark + len(new_messages))
+        if result is not None:
+            self.skipped_messages += skipped
+        return result
+
+    def _create(self, key, expected, messages, digest, user_id, agent_id, run_id) -> Optional[Dict[str, Any]]:
+        summary = self._generate(messages, "Create procedural memory of the above conversation.")
+
+        metadata, _ = mem0_main._build_filters_and_metadata(user_id=user_id, agent_id=agent_id, run_id=run_id)
+        metadata["memory_type"] = "procedural_memory"
+        embeddings = self.memory.embedding_model.embed(self._embed_text(summary), memory_action="add")
+
+        def write() -> str:
+            return self.memory._create_memory(summary, {summary: embeddings}, metadata=deepcopy(metadata))
+
+        memory_id = self._commit(key, expected, write, summary, len(messages), digest, self._count_steps(summary, 0))
+        if memory_id is None:
+            return None
+        self.full_runs += 1
+        return {
+            "results": [{"id": memory_id, "memory": summary, "event": "ADD"}],
+            "incremental": {"mode": "full", "new_messages": len(messages)},
+        }
+
+    def _append(self, key, expected, state, new_messages, digest, watermark) -> Optional[Dict[str, Any]]:
+        steps = state["steps"]
+        context = [{
+            "role": "user",
+            "content": (
+                f"## Procedural memory so far (steps 1-{steps}, compacted)\n\n"
+                f"{self._compact(state['summary'])}\n\n"
+                "## New agent messages follow"
+            ),
+        }]
+        delta = self._generate(
+            context + new_messages,
+            f"Create procedural memory of the above conversation for the new agent messages only, "
+            f"continuing the numbered steps from {steps + 1}. Output only the new steps; "
+            f"do not repeat the overview or any earlier step."
+        )
+
+        summary = f"{state['summary'].rstrip()}\n\n{delta.strip()}"
+        embeddings = self.memory.embedding_model.embed(self._embed_text(summary), memory_action="update")
+
+        def write() -> str:
+            self.memory._update_memory(
+                state["memory_id"], summary, {summary: embeddings}, metadata={"memory_type": "procedural_memory"}
+            )
+            return state["memory_id"]
+
+        total_steps = self._count_steps(delta, steps)
+        if self._commit(key, expected, write, summary, watermark, digest, total_steps) is None:
+            return None
+        self.incremental_runs += 1
+        # 只返回本次新增的步骤，完整摘要可通过 GET /memories/{memory_id} 获取
+        return {
+            "results": [{"id": state["memory_id"], "memory": delta, "event": "UPDATE"}],
+            "incremental": {"mode": "delta", "new_messages": len(new_messages), "steps": total_steps},
+        }
+
+    # ----------------------------------------
+    # 工具方法
+    # ----------------------------------------
+
+    def _generate(self, messages: List[Dict[str, Any]], instruction: str) -> str:
+        parsed_messages = [
+            {"role": "system", "content": self.prompt or PROCEDURAL_MEMORY_SYSTEM_PROMPT},
+            *messages,
+            {"role": "user", "content": instruction},
+        ]
+        return remove_code_blocks(self.memory.llm.generate_response(messages=parsed_messages))
+
+    def _compact(self, summary: str) -> str:
+        """已有摘要的压缩视图：开头的任务概览 + 末尾最近的步骤"""
+        if len(summary) <= self.head_chars + self.tail_chars:
+            return summary
+        return f"{summary[:self.head_chars]}\n\n... (earlier steps omitted) ...\n\n{summary[-self.tail_chars:]}"
+
+    def _embed_text(self, summary: str) -> str:
+        """embedding 输入有长度上限，长摘要只取概览 + 最近步骤"""
+        if len(summary) <= self.embed_chars:
+            return summary
+        head = self.embed_chars // 4
+        return f"{summary[:head]}\n...\n{summary[-(self.embed_chars - head):]}"
+
+    @staticmethod
+    def _count_steps(text: str, previous: int) -> int:
+        numbers = [int(n) for n in _STEP_NUMBER.findall(text)]
+        return max([previous, *numbers])
+
+    @staticmethod
+    def _version(state: Optional[sqlite3.Row]) -> Optional[tuple]:
+        return None if state is None else (state["memory_id"], state["watermark"], state["digest"])
+
+    def _load(self, key: tuple) -> Optional[sqlite3.Row]:
+        with closing(self._connect()) as conn:
+            return conn.execute(f"SELECT * FROM procedural_state WHERE {_KEY_CLAUSE}", key).fetchone()
+
+    def _commit(self, key: tuple, expected: Optional[tuple], write, summary: str, watermark: int, digest: str, steps: int) -> Optional[str]:
+        """
+        在写事务内核对状态仍为 expected，再写入记忆（write 返回 memory_id）并保存新状态；
+        状态已被其他进程修改时不写入，返回 None
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = conn.execute(f"SELECT * FROM procedural_state WHERE {_KEY_CLAUSE}", key).fetchone()
+                if self._version(current) != expected:
+                    conn.execute("ROLLBACK")
+                    return None
+                memory_id = write()
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO procedural_state
+                        (user_id, agent_id, run_id, memory_id, summary, watermark, digest, steps, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (*key, memory_id, summary, watermark, digest, steps, time.time())
+                )
+                conn.execute("COMMIT")
+                return memory_id
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        with closing(self._connect()) as conn:
+            runs = conn.execute("SELECT COUNT(*) FROM procedural_state").fetchone()[0]
+        return {
+            "tracked_runs": runs,
+            "full_runs": self.full_runs,
+            "incremental_runs": self.incremental_runs,
+            "skipped_messages": self.skipped_messages,
+        }
@@ -0,0 +1,288 @@
+"""
+记忆集合的向量量化（int8 标量 / 1-bit 二值）
+每个记忆点存一条 1536 维 float32 向量（6 KB），量化后内存中的向量缩小 4x（int8）或 32x（binary），
+搜索先用量化向量取 limit × oversampling 个候选，再用原始向量重新打分（rescore）。
+
+- apply_quantization：服务启动时按 "quantization" 配置设置集合的量化参数，
+  并让向量搜索带上 rescore / oversampling 参数
+- 命令行工具:
+    migrate  给已有集合开启 / 关闭量化（Qdrant 在后台重建量化索引，原始向量保留用于 rescore）
+    report   对集合中的向量离线模拟 float32 / int8 / binary 搜索，输出各 oversampling 下的
+             recall@k、存储占用与模拟耗时（numpy 暴力计算，仅作相对参考）；
+             服务端模式下另测实际查询延迟
+
+注意：Qdrant 本地模式（path=...）不支持量化，quantization_config 被忽略，向量始终以 float32 存储；
+量化只对 Qdrant 服务端生效。本地模式下 apply_quantization 返回 skipped，
+report 的离线模拟不依赖运行模式，可在迁移到服务端前评估召回率。
+
+运行方式（本地库有文件锁，需先停止 mem0_server.py）:
+    python quantization.py report --path ./memorydb/vector --k 10
+    python quantization.py migrate --url http://localhost:6333 --mode scalar
+"""
+
+import time
+import argparse
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Disabled,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+)
+
+from payload_index import DEFAULT_COLLECTION, is_local_client
+
+
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+
+# 每个维度的存储位数
+_BITS_PER_DIM = {"none": 32, "scalar": 8, "binary": 1}
+
+
+def quantization_config(mode: str, quantile: float = 0.99, always_ram: bool = True):
+    if mode == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=quantile, always_ram=always_ram)
+        )
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=always_ram))
+    if mode == "none":
+        return Disabled.DISABLED
+    raise ValueError(f"未知的量化模式: {mode}")
+
+
+def search_params(mode: str, oversampling: float) -> Optional[SearchParams]:
+    if mode == "none":
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=oversampling))
+
+
+def apply_quantization(vector_store, mode: str = "none", oversampling: float = 2.0) -> str:
+    """
+    设置集合的量化参数，并在 query_points 上默认带 rescore / oversampling
+    返回 applied / skipped（本地模式）/ disabled
+    """
+    client = vector_store.client
+    if mode == "none":
+        return "disabled"
+    if is_local_client(client):
+        return "skipped"
+
+    client.update_collection(
+        collection_name=vector_store.collection_name,
+        quantization_config=quantization_config(mode),
+    )
+    params = search_params(mode, oversampling)
+    original_query_points = client.query_points
+
+    def query_points(*args, **kwargs):
+        kwargs.setdefault("search_params", params)
+        return original_query_points(*args, **kwargs)
+
+    client.query_points = query_points
+    # 批量搜索（batch_search.py）按请求设置参数
+    vector_store.quantization_search_params = params
+    return "applied"
+
+
+# ============================================
+# 离线模拟：recall vs 延迟
+# ============================================
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _load_vectors(client, collection_name: str, max_points: int) -> np.ndarray:
+    vectors, offset = [], None
+    while len(vectors) < max_points:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=min(1000, max_points - len(vectors)),
+            offset=offset,
+            with_payload=False,
+            with_vectors=True,
+        )
+        vectors.extend(r.vector for r in records)
+        if offset is None:
+            break
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[1])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, idx, axis=1), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def _recall(found: np.ndarray, exact: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found.tolist(), exact.tolist()))
+    return hits / exact.size if exact.size else 0.0
+
+
+def _rescore(candidates: np.ndarray, queries: np.ndarray, base: np.ndarray, k: int) -> np.ndarray:
+    results = []
+    for query, ids in zip(queries, candidates):
+        scores = base[ids] @ query
+        results.append(ids[np.argsort(-scores)[:k]])
+    return np.asarray(results)
+
+
+def simulate(
+    base: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    oversampling: List[float] = (1.0, 2.0, 4.0),
+    quantile: float = 0.99
+) -> Dict[str, Any]:
+    """在内存中按 Qdrant 的方式量化并搜索，返回各模式的 recall@k 与每次查询耗时"""
+    n, dims = base.shape
+    report: Dict[str, Any] = {"points": n, "queries": len(queries), "dims": dims, "k": k, "modes": {}}
+
+    started = time.perf_counter()
+    exact = _top_k(queries @ base.T, k)
+    report["modes"]["none"] = [{
+        "oversampling": 1.0,
+        "recall": 1.0,
+        "query_ms": round((time.perf_counter() - started) / len(queries) * 1000, 3),
+    }]
+
+    # int8：按分位数截断到 [lo, hi] 后线性映射
+    lo, hi = np.quantile(base, [(1 - quantile) / 2, 1 - (1 - quantile) / 2])
+    scale = (hi - lo) / 255.0 or 1.0
+
+    def to_int8(matrix):
+        return np.clip(np.round((matrix - lo) / scale) - 128, -128, 127).astype(np.int8)
+
+    base_int8 = to_int8(base).astype(np.int32)
+    # binary：符号位
+    base_bits = np.packbits(base > 0, axis=1)
+
+    for mode in ("scalar", "binary"):
+        rows = []
+        for factor in oversampling:
+            started = time.perf_counter()
+            if mode == "scalar":
+                approx = to_int8(queries).astype(np.int32) @ base_int8.T
+            else:
+                query_bits = np.packbits(queries > 0, axis=1)
+                approx = -np.stack([
+                    _POPCOUNT[np.bitwise_xor(base_bits, bits)].sum(axis=1, dtype=np.int32)
+                    for bits in query_bits
+                ])
+            candidates = _top_k(approx, max(k, int(round(k * factor))))
+            found = _rescore(candidates, queries, base, k)
+            rows.append({
+                "oversampling": factor,
+                "recall": round(_recall(found, exact), 4),
+                "query_ms": round((time.perf_counter() - started) / len(queries) * 1000, 3),
+            })
+        report["modes"][mode] = rows
+
+    report["footprint_bytes"] = {
+        mode: n * dims * bits // 8 for mode, bits in _BITS_PER_DIM.items()
+    }
+    return report
+
+
+def live_latency(
+    client,
+    collection_name: str,
+    queries: np.ndarray,
+    k: int,
+    oversampling: List[float]
+) -> Dict[str, float]:
+    """服务端模式：对当前集合实际查询的平均延迟（毫秒）"""
+    latencies: Dict[str, float] = {}
+    for label, params in [("exact", SearchParams(exact=True)), ("default", None)] + [
+        (f"rescore_x{factor:g}", QuantizationSearchParams(rescore=True, oversampling=factor))
+        for factor in oversampling
+    ]:
+        if isinstance(params, QuantizationSearchParams):
+            params = SearchParams(quantization=params)
+        started = time.perf_counter()
+        for query in queries:
+            client.query_points(
+                collection_name=collection_name, query=query.tolist(), limit=k, search_params=params
+            )
+        latencies[label] = round((time.perf_counter() - started) / len(queries) * 1000, 3)
+    return latencies
+
+
+def _print_report(report: Dict[str, Any]):
+    print("=" * 60)
+    print(f"点数 {report['points']}，查询 {report['queries']} 条，维度 {report['dims']}，k={report['k']}")
+    for mode, rows in report["modes"].items():
+        for row in rows:
+            print(
+                f"  {mode:7s} oversampling={row['oversampling']:<4g} "
+                f"recall@{report['k']}={row['recall']:.4f}  模拟 {row['query_ms']}ms/查询"
+            )
+    print("存储占用（仅向量）:")
+    full = report["footprint_bytes"]["none"] or 1
+    for mode, size in report["footprint_bytes"].items():
+        print(f"  {mode:7s} {size / 1024 / 1024:.2f} MB ({full / max(size, 1):.0f}x)")
+    if report.get("live_ms"):
+        print("服务端实际查询延迟:")
+        for label, ms in report["live_ms"].items():
+            print(f"  {label:14s} {ms}ms")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='mem0 集合的向量量化：迁移与召回率报告')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_target(sub):
+        target = sub.add_mutually_exclusive_group()
+        target.add_argument('--path', default='./memorydb/vector', help='Qdrant 本地库路径（默认: ./memorydb/vector）')
+        target.add_argument('--url', default=None, help='Qdrant 服务端地址，如 http://localhost:6333')
+        sub.add_argument('--collection', default=DEFAULT_COLLECTION, help='集合名称（默认: mem0）')
+
+    migrate_parser = subparsers.add_parser('migrate', help='开启 / 关闭集合的量化')
+    add_target(migrate_parser)
+    migrate_parser.add_argument('--mode', choices=QUANTIZATION_MODES, required=True, help='量化模式')
+    migrate_parser.add_argument('--quantile', type=float, default=0.99, help='int8 截断分位数（默认: 0.99）')
+
+    report_parser = subparsers.add_parser('report', help='recall vs 延迟报告')
+    add_target(report_parser)
+    report_parser.add_argument('--k', type=int, default=10, help='recall@k（默认: 10）')
+    report_parser.add_argument('--queries', type=int, default=100, help='留出作为查询的点数（默认: 100）')
+    report_parser.add_argument('--max-points', type=int, default=50000, help='最多读取的点数（默认: 50000）')
+    report_parser.add_argument('--oversampling', default='1,2,4', help='逗号分隔的 oversampling 列表（默认: 1,2,4）')
+    report_parser.add_argument('--seed', type=int, default=0, help='抽样随机种子')
+    args = parser.parse_args()
+
+    qdrant = QdrantClient(url=args.url) if args.url else QdrantClient(path=args.path)
+
+    if args.command == 'migrate':
+        if is_local_client(qdrant):
+            print("⚠️  本地模式不支持量化，集合未修改（需 Qdrant 服务端）")
+        else:
+            qdrant.update_collection(
+                collection_name=args.collection,
+                quantization_config=quantization_config(args.mode, quantile=args.quantile),
+            )
+            info = qdrant.get_collection(args.collection)
+            print(f"✅ {args.collection}: 量化模式 {args.mode}，集合状态 {info.status}（后台重建量化索引）")
+    else:
+        factors = [float(x) for x in args.oversampling.split(',') if x.strip()]
+        vectors = _load_vectors(qdrant, args.collection, args.max_points + args.queries)
+        if len(vectors) <= args.queries:
+            parser.error(f"集合中只有 {len(vectors)} 个点，不足以留出 {args.queries} 条查询")
+        order = np.random.default_rng(args.seed).permutation(len(vectors))
+        held_out, base = vectors[order[:args.queries]], vectors[order[args.queries:]]
+        report = simulate(base, held_out, k=args.k, oversampling=factors)
+        if not is_local_client(qdrant):
+            report["live_ms"] = live_latency(qdrant, args.collection, held_out, args.k, factors)
+        _print_report(report)
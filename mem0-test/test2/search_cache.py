@@ -0,0 +1,124 @@
+"""
+按用户划分的搜索结果缓存
+缓存 /memories/search 的结果，写操作按 user_id 精确失效
+
+- 缓存键: (user_id, query, limit, graph)
+- TTL 过期 + 条目数上限（LRU 淘汰）
+- 每个用户维护一个代数（generation），任何写操作都会让该用户的代数加一：
+  写操作期间开始的搜索，其结果因代数不一致不会被写入缓存，避免缓存脏数据；
+  代数表超过 max_generations 个用户时整体清空并让 epoch 加一（进行中的搜索结果一律不写入）
+- 统计命中率与节省的延迟（命中时按该条目原始计算耗时累计）
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class SearchCache:
+    """带 TTL 和写失效的搜索结果缓存"""
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 2048, max_generations: int = 65536):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_generations = max_generations
+        # key -> (expires_at, elapsed_seconds, value)
+        self._entries: "OrderedDict[Tuple, Tuple[float, float, Any]]" = OrderedDict()
+        self._user_keys: Dict[str, set] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0   # invalidate_all 时整体加一
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidated = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def make_key(user_id: str, query: str, limit: Optional[int], graph: Hashable) -> Tuple:
+        return (user_id, query, limit, graph)
+
+    def generation(self, user_id: str) -> Tuple[int, int]:
+        """搜索开始前读取，写入缓存时用于校验"""
+        with self._lock:
+            return (self._epoch, self._generations.get(user_id, 0))
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, elapsed, value = entry
+            if expires_at < now:
+                self._drop(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += elapsed
+            return dict(value)
+
+    def put(self, key: Tuple, value: Any, elapsed: float, generation: Tuple[int, int]):
+        user_id = key[0]
+        with self._lock:
+            if (self._epoch, self._generations.get(user_id, 0)) != generation:
+                # 搜索期间该用户有写操作，结果可能已过时
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, elapsed, value)
+            self._entries.move_to_end(key)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evicted += 1
+
+    def invalidate_user(self, user_id: str):
+        """某个用户发生写操作"""
+        with self._lock:
+            if user_id not in self._generations and len(self._generations) >= self.max_generations:
+                # 直接删除某个用户的代数会让它回到 0，与进行中搜索持有的旧代数重新相等
+                self._epoch += 1
+                self._generations.clear()
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in self._user_keys.pop(user_id, set()):
+                if self._entries.pop(key, None) is not None:
+                    self.invalidated += 1
+
+    def invalidate_all(self):
+        """无法确定受影响用户时清空全部缓存"""
+        with self._lock:
+            self._epoch += 1
+            self._generations.clear()
+            self.invalidated += len(self._entries)
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def _drop(self, key: Tuple):
+        self._entries.pop(key, None)
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "tracked_users": len(self._generations),
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "invalidated": self.invalidated,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
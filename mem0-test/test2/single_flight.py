@@ -0,0 +1,68 @@
+"""
+相同读请求的合并执行（single-flight）
+供 mem0_server.py 的 /memories/search 与 GET /memories 使用
+
+- 同一时刻键相同的读请求只执行一次，其余请求等待并共享结果
+- 键的第一个元素为 user_id；写操作后调用 forget(user_id)，
+  之后到达的请求不再加入写操作之前发起的计算
+- 计算在独立任务中执行，发起者断开不会影响等待中的其他请求
+- forget() 可能在写线程池 / 任务队列线程中调用，键表的读写加锁
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """按键合并并发中的相同异步调用"""
+
+    def __init__(self):
+        self._calls: Dict[Tuple, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executed = 0
+        self.deduplicated = 0
+
+    async def do(self, key: Tuple, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """执行 fn，或等待键相同且仍在执行中的调用；返回结果的浅拷贝"""
+        with self._lock:
+            self.calls += 1
+            task = self._calls.get(key)
+            leader = task is None
+            if leader:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+                self._calls[key] = task
+                self.executed += 1
+            else:
+                self.deduplicated += 1
+        if leader:
+            task.add_done_callback(lambda t: self._done(key, t))
+
+        result = await asyncio.shield(task)
+        return dict(result) if isinstance(result, dict) else result
+
+    def _done(self, key: Tuple, task: asyncio.Future):
+        with self._lock:
+            if self._calls.get(key) is task:
+                del self._calls[key]
+        if not task.cancelled():
+            # 所有等待者都已取消时也要取走异常，避免 "exception was never retrieved"
+            task.exception()
+
+    def forget(self, user_id: Optional[str] = None):
+        """写操作后调用：之后的请求重新计算（user_id 为空时对全部用户生效）"""
+        with self._lock:
+            for key in [k for k in self._calls if user_id is None or k[0] == user_id]:
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "in_flight": in_flight,
+            "calls": self.calls,
+            "executed": self.executed,
+            "deduplicated": self.deduplicated,
+            "dedup_ratio": round(self.deduplicated / self.calls, 4) if self.calls else 0.0,
+        }
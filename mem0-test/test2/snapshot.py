@@ -0,0 +1,593 @@
+"""
+memorydb 的流式快照导出 / 导入（Arrow IPC 列式格式）
+备份或迁移 memorydb/ 原来只能停服后复制 Qdrant / Kuzu / SQLite 目录；按租户在环境之间复制记忆则要
+把对话重新走一遍 LLM。快照按块流式读写，内存占用与 chunk_size 成正比，与库的大小无关。
+
+快照目录:
+    manifest.json       格式版本、来源租户、向量维度与精度、各表行数
+    vectors.arrow       id / user_id / payload（JSON）/ vector（float16 或 float32 定长列表）
+    graph_nodes.arrow   Kuzu Entity 节点：id / user_id / agent_id / run_id / name / mentions / created / embedding
+    graph_edges.arrow   Kuzu CONNECTED_TO 关系：source / target（节点 id）/ name / mentions / created / updated
+    history.arrow       history 表各列 + owner（memory_owner 中登记的 user_id）
+
+- 导出时向量为 Matryoshka 两级存储的完整向量（取自侧存储）；导入经过 vector_store.insert，
+  倒排索引 / 去重索引 / 两级存储的包装同步更新
+- 导入时向量按块并行写入，图与历史表同时导入
+- 图节点按块 UNWIND 批量创建，关系在全部节点之后按 id 映射批量创建
+- 向量按 ID 覆盖，历史按 ID 忽略重复；图节点没有稳定 ID，目标图中已有快照租户的实体时拒绝导入，
+  导入租户前先清空（DELETE /memories?user_id=...）
+- 依赖 pyarrow（可选安装）；未安装时 is_available() 为 False
+
+供 mem0_server.py 的 POST /admin/snapshot/export、/admin/snapshot/import 使用；
+命令行直接读写存储（本地库有文件锁，需先停止 mem0_server.py）:
+    python snapshot.py export --out ./snapshots/full
+    python snapshot.py export --out ./snapshots/user_001 --user-id user_001 --dtype float16
+    python snapshot.py import --in ./snapshots/user_001 --workers 4
+"""
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from contextlib import closing, nullcontext
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from qdrant_client.models import FieldCondition, Filter, MatchValue
+
+from history_store import HISTORY_COLUMNS, HistoryStore
+from matryoshka import DEFAULT_SIDE_STORE_PATH, FullVectorStore, TwoTierVectorStore, collection_name_for
+from payload_index import DEFAULT_COLLECTION, is_local_client
+from storage_owner import RemoteProxy
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+
+SNAPSHOT_FORMAT = "mem0-snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+TABLES = ("vectors", "graph_nodes", "graph_edges", "history")
+VECTOR_DTYPES = ("float32", "float16")
+DEFAULT_CHUNK_SIZE = 1000
+
+GraphExecute = Callable[[str, Optional[Dict[str, Any]]], List[Dict[str, Any]]]
+
+
+def is_available() -> bool:
+    return pa is not None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("快照需要 pyarrow：pip install pyarrow")
+
+
+# ============================================
+# Arrow 读写
+# ============================================
+
+class _TableWriter:
+    """第一批数据到达时按其 schema 打开 IPC 流；没有数据时不生成文件"""
+
+    def __init__(self, path: str, compression: Optional[str]):
+        self.path = path
+        self.compression = compression
+        self.rows = 0
+        self._sink = None
+        self._writer = None
+
+    def write(self, batch):
+        if batch.num_rows == 0:
+            return
+        if self._writer is None:
+            self._sink = pa.OSFile(self.path, "wb")
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            self._writer = pa.ipc.new_stream(self._sink, batch.schema, options=options)
+        self._writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+
+
+def _read_batches(path: str):
+    if not os.path.exists(path):
+        return
+    with pa.memory_map(path, "r") as source:
+        yield from pa.ipc.open_stream(source)
+
+
+def _fixed_vectors(matrix: np.ndarray, dtype: str):
+    return pa.FixedSizeListArray.from_arrays(pa.array(matrix.astype(dtype).ravel()), matrix.shape[1])
+
+
+def _list_vectors(vectors: List[Optional[List[float]]], dtype: str):
+    """变长向量列（图节点 embedding 可能为空）"""
+    offsets, values = [0], []
+    for vector in vectors:
+        if vector is not None:
+            values.append(np.asarray(vector, dtype=np.float32))
+        offsets.append(offsets[-1] + (len(vector) if vector is not None else 0))
+    flat = np.concatenate(values) if values else np.zeros(0, dtype=np.float32)
+    return pa.ListArray.from_arrays(
+        pa.array(offsets, pa.int32()), pa.array(flat.astype(dtype)), mask=pa.array([v is None for v in vectors])
+    )
+
+
+def _vector_rows(column) -> List[Optional[List[float]]]:
+    """Arrow 向量列 -> float32 的 Python 列表"""
+    return [None if v is None else np.asarray(v, dtype=np.float32).tolist() for v in column.to_numpy(zero_copy_only=False)]
+
+
+# ============================================
+# 导出
+# ============================================
+
+def _export_vectors(writer: _TableWriter, vector_store, user_id: Optional[str], dtype: str, chunk_size: int, report):
+    side = vector_store.side if isinstance(vector_store, TwoTierVectorStore) else None
+    scroll_filter = Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))]) if user_id else None
+    offset = None
+    while True:
+        records, offset = vector_store.client.scroll(
+            collection_name=vector_store.collection_name, scroll_filter=scroll_filter, limit=chunk_size,
+            offset=offset, with_payload=True, with_vectors=side is None,
+        )
+        if side is not None:
+            full = side.get_many([str(r.id) for r in records])
+            report["skipped_vectors"] += sum(1 for r in records if str(r.id) not in full)
+            pairs = [(r, full[str(r.id)]) for r in records if str(r.id) in full]
+        else:
+            pairs = [(r, r.vector) for r in records]
+        if pairs:
+            matrix = np.asarray([vector for _, vector in pairs], dtype=np.float32)
+            report["dims"] = int(matrix.shape[1])
+            writer.write(pa.RecordBatch.from_arrays(
+                [
+                    pa.array([str(r.id) for r, _ in pairs], pa.string()),
+                    pa.array([(r.payload or {}).get("user_id") for r, _ in pairs], pa.string()),
+                    pa.array([json.dumps(r.payload or {}, ensure_ascii=False) for r, _ in pairs], pa.string()),
+                    _fixed_vectors(matrix, dtype),
+                ],
+                names=["id", "user_id", "payload", "vector"],
+            ))
+        if offset is None:
+            return
+
+
+def _export_graph(nodes: _TableWriter, edges: _TableWriter, execute: GraphExecute, user_id: Optional[str], dtype: str, chunk_size: int):
+    """按节点 id 分段（keyset）导出节点，以及起点落在该段内的关系"""
+    user_clause = "AND n.user_id = $user_id" if user_id else ""
+    after = -1
+    while True:
+        params: Dict[str, Any] = {"after": after}
+        if user_id:
+            params["user_id"] = user_id
+        rows = execute(
+            f"""
+            MATCH (n:Entity) WHERE n.id > $after {user_clause}
+            RETURN n.id AS id, n.user_id AS user_id, n.agent_id AS agent_id, n.run_id AS run_id,
+                   n.name AS name, n.mentions AS mentions, n.created AS created, n.embedding AS embedding
+            ORDER BY n.id LIMIT {int(chunk_size)}
+            """,
+            params,
+        )
+        if not rows:
+            return
+        nodes.write(pa.RecordBatch.from_arrays(
+            [
+                pa.array([r["id"] for r in rows], pa.int64()),
+                *(pa.array([r[key] for r in rows], pa.string()) for key in ("user_id", "agent_id", "run_id", "name")),
+                pa.array([r["mentions"] for r in rows], pa.int64()),
+                pa.array([r["created"] for r in rows], pa.timestamp("us")),
+                _list_vectors([r["embedding"] for r in rows], dtype),
+            ],
+            names=["id", "user_id", "agent_id", "run_id", "name", "mentions", "created", "embedding"],
+        ))
+
+        edge_params = {"lo": rows[0]["id"], "hi": rows[-1]["id"], **({"user_id": user_id} if user_id else {})}
+        edge_rows = execute(
+            f"""
+            MATCH (n:Entity)-[r:CONNECTED_TO]->(m:Entity) WHERE n.id >= $lo AND n.id <= $hi {user_clause}
+            RETURN n.id AS source, m.id AS target, r.name AS name, r.mentions AS mentions,
+                   r.created AS created, r.updated AS updated
+            """,
+            edge_params,
+        )
+        if edge_rows:
+            edges.write(pa.RecordBatch.from_arrays(
+                [
+                    pa.array([r["source"] for r in edge_rows], pa.int64()),
+                    pa.array([r["target"] for r in edge_rows], pa.int64()),
+                    pa.array([r["name"] for r in edge_rows], pa.string()),
+                    pa.array([r["mentions"] for r in edge_rows], pa.int64()),
+                    pa.array([r["created"] for r in edge_rows], pa.timestamp("us")),
+                    pa.array([r["updated"] for r in edge_rows], pa.timestamp("us")),
+                ],
+                names=["source", "target", "name", "mentions", "created", "updated"],
+            ))
+        after = rows[-1]["id"]
+
+
+def _export_history(writer: _TableWriter, path: str, user_id: Optional[str], chunk_size: int, report):
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)) as conn:
+        has_owner = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'memory_owner'"
+        ).fetchone() is not None
+        if user_id and not has_owner:
+            # 没有归属表时无法按用户筛选历史
+            report["history_skipped"] = "memory_owner 表不存在，无法按 user_id 筛选"
+            return
+
+        columns = ", ".join(f"h.{c}" for c in HISTORY_COLUMNS)
+        owner = "o.user_id" if has_owner else "NULL"
+        join = "LEFT JOIN memory_owner o ON o.memory_id = h.memory_id" if has_owner else ""
+        user_clause = "AND o.user_id = ?" if user_id else ""
+        after = 0
+        while True:
+            rows = conn.execute(
+                f"""
+                SELECT h.rowid, {columns}, {owner} FROM history h {join}
+                WHERE h.rowid > ? {user_clause} ORDER BY h.rowid LIMIT ?
+                """,
+                [after, *([user_id] if user_id else []), chunk_size],
+            ).fetchall()
+            if not rows:
+                return
+            arrays = [
+                pa.array([row[i + 1] for row in rows], pa.int64() if name == "is_deleted" else pa.string())
+                for i, name in enumerate(HISTORY_COLUMNS)
+            ]
+            arrays.append(pa.array([row[-1] for row in rows], pa.string()))
+            writer.write(pa.RecordBatch.from_arrays(arrays, names=[*HISTORY_COLUMNS, "owner"]))
+            after = rows[-1][0]
+
+
+def export_snapshot(
+    out_dir: str,
+    vector_store,
+    graph_execute: Optional[GraphExecute] = None,
+    history_path: Optional[str] = None,
+    user_id: Optional[str] = None,
+    vector_dtype: str = "float32",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    compression: Optional[str] = "zstd",
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """导出快照（user_id 为空时导出全部租户），返回 manifest"""
+    _require_pyarrow()
+    if vector_dtype not in VECTOR_DTYPES:
+        raise ValueError(f"不支持的向量精度: {vector_dtype}")
+    if os.path.exists(os.path.join(out_dir, MANIFEST_FILE)):
+        raise ValueError(f"快照已存在: {out_dir}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    manifest: Dict[str, Any] = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now().astimezone().isoformat(),
+        "user_id": user_id,
+        "vector_dtype": vector_dtype,
+        "dims": None,
+        "skipped_vectors": 0,
+        "counts": {},
+        "seconds": {},
+    }
+    writers = {table: _TableWriter(os.path.join(out_dir, f"{table}.arrow"), compression) for table in TABLES}
+
+    def stage(table: str, fn, *args):
+        stage_started = time.perf_counter()
+        fn(*args)
+        manifest["seconds"][table] = round(time.perf_counter() - stage_started, 3)
+        if progress is not None:
+            progress({"stage": table, "rows": {t: w.rows for t, w in writers.items()}})
+
+    try:
+        stage("vectors", _export_vectors, writers["vectors"], vector_store, user_id, vector_dtype, chunk_size, manifest)
+        if graph_execute is not None:
+            stage("graph", _export_graph, writers["graph_nodes"], writers["graph_edges"],
+                  graph_execute, user_id, vector_dtype, chunk_size)
+        if history_path and os.path.exists(history_path):
+            stage("history", _export_history, writers["history"], history_path, user_id, chunk_size, manifest)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    manifest["counts"] = {table: writer.rows for table, writer in writers.items()}
+    manifest["bytes"] = sum(
+        os.path.getsize(w.path) for w in writers.values() if os.path.exists(w.path)
+    )
+    manifest["duration_seconds"] = round(time.perf_counter() - started, 3)
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+# ============================================
+# 导入
+# ============================================
+
+def read_manifest(in_dir: str) -> Dict[str, Any]:
+    path = os.path.join(in_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise ValueError(f"不是快照目录（缺少 {MANIFEST_FILE}）: {in_dir}")
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"不支持的快照格式: {manifest.get('format')} v{manifest.get('version')}")
+    return manifest
+
+
+def _is_local_qdrant(vector_store) -> bool:
+    """
+    本地模式（path / :memory:）的 Qdrant 客户端不是线程安全的；
+    多进程模式下的 RemoteProxy 转发到存储进程，后者持有的也是本地库
+    """
+    return isinstance(vector_store, RemoteProxy) or is_local_client(getattr(vector_store, "client", None))
+
+
+def _run_chunks(fn, batches, workers: int) -> int:
+    """按块并行执行 fn；同时在途的块数不超过 2 × workers，返回总行数"""
+    count = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mem0-snapshot") as pool:
+        pending = set()
+        for batch in batches:
+            pending.add(pool.submit(fn, batch))
+            count += batch.num_rows
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+        for future in pending:
+            future.result()
+    return count
+
+
+def _import_vectors(in_dir: str, vector_store, workers: int, history: Optional[HistoryStore] = None) -> int:
+    """
+    按块并行解码与 insert
+    本地模式的 Qdrant 写入串行执行，只并行解码
+    history 不为空时按向量的 user_id 登记记忆归属（快照可能不含历史表）
+    """
+    insert_lock = threading.Lock() if _is_local_qdrant(vector_store) else nullcontext()
+
+    def load(batch):
+        vectors = _vector_rows(batch.column("vector"))
+        payloads = [json.loads(p) for p in batch.column("payload").to_pylist()]
+        ids = batch.column("id").to_pylist()
+        with insert_lock:
+            vector_store.insert(vectors=vectors, payloads=payloads, ids=ids)
+        if history is not None:
+            history.record_owners(zip(ids, batch.column("user_id").to_pylist()))
+
+    return _run_chunks(load, _read_batches(os.path.join(in_dir, "vectors.arrow")), workers)
+
+
+def _snapshot_graph_users(in_dir: str) -> List[str]:
+    users = set()
+    for batch in _read_batches(os.path.join(in_dir, "graph_nodes.arrow")):
+        users.update(user_id for user_id in batch.column("user_id").to_pylist() if user_id)
+    return sorted(users)
+
+
+def _check_graph_empty(in_dir: str, execute: GraphExecute):
+    """图节点没有稳定 ID，无法按 ID 覆盖；目标图中已有快照租户的实体时拒绝导入"""
+    users = _snapshot_graph_users(in_dir)
+    if not users:
+        return
+    rows = execute(
+        "MATCH (n:Entity) WHERE list_contains($users, n.user_id) RETURN count(n) AS count",
+        {"users": users},
+    )
+    existing = rows[0]["count"] if rows else 0
+    if existing:
+        raise ValueError(
+            f"图数据库中已有快照租户的实体 {existing} 个，重复导入会产生重复节点；"
+            f"请先清空这些租户（DELETE /memories?user_id=...）: {', '.join(users[:10])}"
+        )
+
+
+def _import_graph(in_dir: str, execute: GraphExecute, workers: int) -> Dict[str, int]:
+    """
+    节点 id 是 SERIAL，导入后重新分配；先按块 UNWIND 创建全部节点，再按 id 映射按块创建关系
+    Kuzu 同一时刻只有一个写事务，写入串行执行，只并行解码与组装参数
+    """
+    write_lock = threading.Lock()
+    id_map: Dict[int, int] = {}
+    edges = [0]
+
+    def load_nodes(batch):
+        embeddings = _vector_rows(batch.column("embedding"))
+        rows = []
+        for row, embedding in zip(batch.drop_columns(["embedding"]).to_pylist(), embeddings):
+            row["old_id"] = row.pop("id")
+            row["embedding"] = embedding
+            rows.append(row)
+        with write_lock:
+            created = execute(
+                """
+                UNWIND $rows AS r
+                CREATE (n:Entity {user_id: r.user_id, agent_id: r.agent_id, run_id: r.run_id, name: r.name,
+                                  mentions: r.mentions, created: r.created, embedding: r.embedding})
+                RETURN r.old_id AS old_id, n.id AS id
+                """,
+                {"rows": rows},
+            )
+            id_map.update((r["old_id"], r["id"]) for r in created)
+
+    def load_edges(batch):
+        rows = []
+        for row in batch.to_pylist():
+            source, target = id_map.get(row.pop("source")), id_map.get(row.pop("target"))
+            if source is not None and target is not None:
+                rows.append({**row, "source": source, "target": target})
+        if not rows:
+            return
+        with write_lock:
+            execute(
+                """
+                UNWIND $rows AS r
+                MATCH (a:Entity), (b:Entity) WHERE a.id = r.source AND b.id = r.target
+                CREATE (a)-[:CONNECTED_TO {name: r.name, mentions: r.mentions, created: r.created, updated: r.updated}]->(b)
+                """,
+                {"rows": rows},
+            )
+            edges[0] += len(rows)
+
+    _run_chunks(load_nodes, _read_batches(os.path.join(in_dir, "graph_nodes.arrow")), workers)
+    _run_chunks(load_edges, _read_batches(os.path.join(in_dir, "graph_edges.arrow")), workers)
+    return {"graph_nodes": len(id_map), "graph_edges": edges[0]}
+
+
+def _import_history(in_dir: str, path: str) -> int:
+    placeholders = ", ".join("?" * len(HISTORY_COLUMNS))
+    count = 0
+    with closing(sqlite3.connect(path, timeout=30)) as conn:
+        for batch in _read_batches(os.path.join(in_dir, "history.arrow")):
+            rows = batch.to_pylist()
+            with conn:
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO history ({', '.join(HISTORY_COLUMNS)}) VALUES ({placeholders})",
+                    [tuple(row[c] for c in HISTORY_COLUMNS) for row in rows],
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO memory_owner (memory_id, user_id) VALUES (?, ?)",
+                    [(row["memory_id"], row["owner"]) for row in rows if row["memory_id"] and row["owner"]],
+                )
+            count += len(rows)
+    return count
+
+
+def import_snapshot(
+    in_dir: str,
+    vector_store,
+    graph_execute: Optional[GraphExecute] = None,
+    history_path: Optional[str] = None,
+    workers: int = 4,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """导入快照：向量按块并行写入，图与历史表同时导入，返回各表行数"""
+    _require_pyarrow()
+    manifest = read_manifest(in_dir)
+    # 两级存储的 insert 接收完整向量，其余情况维度必须与集合一致
+    expected = None if isinstance(vector_store, TwoTierVectorStore) else getattr(vector_store, "embedding_model_dims", None)
+    if manifest["dims"] and expected and manifest["dims"] != expected:
+        raise ValueError(f"快照向量维度 {manifest['dims']} 与目标集合 {expected} 不一致")
+
+    import_graph = graph_execute is not None and manifest["counts"].get("graph_nodes")
+    if import_graph:
+        _check_graph_empty(in_dir, graph_execute)
+
+    started = time.perf_counter()
+    report: Dict[str, Any] = {"source": in_dir, "user_id": manifest["user_id"], "counts": {}, "seconds": {}}
+    lock = threading.Lock()
+    history = None
+    if history_path:
+        history = HistoryStore(history_path)
+        history.ensure_schema()
+
+    def stage(name: str, fn, *args):
+        stage_started = time.perf_counter()
+        result = fn(*args)
+        with lock:
+            report["counts"].update(result if isinstance(result, dict) else {name: result})
+            report["seconds"][name] = round(time.perf_counter() - stage_started, 3)
+            if progress is not None:
+                progress({"finished": sorted(report["seconds"]), "counts": dict(report["counts"])})
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(stage, "vectors", _import_vectors, in_dir, vector_store, max(1, workers), history)]
+        if import_graph:
+            futures.append(pool.submit(stage, "graph", _import_graph, in_dir, graph_execute, max(1, workers)))
+        if history_path and manifest["counts"].get("history"):
+            futures.append(pool.submit(stage, "history", _import_history, in_dir, history_path))
+        for future in futures:
+            future.result()
+
+    report["duration_seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+# ============================================
+# 命令行
+# ============================================
+
+def _open_vector_store(args, dims: Optional[int] = None):
+    """按命令行参数打开 mem0 的 Qdrant 向量库（--mrl-dims 时包装为两级存储）"""
+    from mem0.utils.factory import VectorStoreFactory
+
+    collection = collection_name_for(args.mrl_dims) if args.mrl_dims else args.collection
+    config: Dict[str, Any] = {
+        "collection_name": collection,
+        "embedding_model_dims": args.mrl_dims or dims or 1536,
+        "on_disk": True,
+    }
+    if args.url:
+        config["url"] = args.url
+    else:
+        config["path"] = args.path
+    vector_store = VectorStoreFactory.create("qdrant", config)
+    if args.mrl_dims:
+        vector_store = TwoTierVectorStore(vector_store, FullVectorStore(args.side_path), args.mrl_dims)
+    return vector_store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='memorydb 的快照导出 / 导入（Arrow IPC）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_storage(sub):
+        target = sub.add_mutually_exclusive_group()
+        target.add_argument('--path', default='./memorydb/vector', help='Qdrant 本地库路径（默认: ./memorydb/vector）')
+        target.add_argument('--url', default=None, help='Qdrant 服务端地址，如 http://localhost:6333')
+        sub.add_argument('--collection', default=DEFAULT_COLLECTION, help='集合名称（默认: mem0）')
+        sub.add_argument('--mrl-dims', type=int, default=None, help='Matryoshka 两级存储的截断维度（集合 mem0_mrl{dims}）')
+        sub.add_argument('--side-path', default=DEFAULT_SIDE_STORE_PATH, help='两级存储的完整向量路径')
+        sub.add_argument('--graph-db', default='./memorydb/graph/kemem_graph.db', help='Kuzu 路径，传空字符串跳过图数据')
+        sub.add_argument('--history-db', default='./memorydb/history/history.db', help='历史库路径，传空字符串跳过历史')
+
+    export_parser = subparsers.add_parser('export', help='导出快照')
+    add_storage(export_parser)
+    export_parser.add_argument('--out', required=True, help='快照目录')
+    export_parser.add_argument('--user-id', default=None, help='只导出该租户（默认: 全部）')
+    export_parser.add_argument('--dtype', choices=VECTOR_DTYPES, default='float32', help='向量精度（默认: float32）')
+    export_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='每块行数（默认: 1000）')
+
+    import_parser = subparsers.add_parser('import', help='导入快照')
+    add_storage(import_parser)
+    import_parser.add_argument('--in', dest='in_dir', required=True, help='快照目录')
+    import_parser.add_argument('--workers', type=int, default=4, help='向量并行写入线程数（默认: 4）')
+    args = parser.parse_args()
+
+    if not is_available():
+        parser.error("快照需要 pyarrow：pip install pyarrow")
+
+    graph_execute = None
+    if args.graph_db and (args.command == 'import' or os.path.exists(args.graph_db)):
+        from storage_owner import KuzuExecutor
+        graph_execute = KuzuExecutor(args.graph_db).execute
+
+    if args.command == 'export':
+        result = export_snapshot(
+            args.out, _open_vector_store(args), graph_execute, args.history_db or None,
+            user_id=args.user_id, vector_dtype=args.dtype, chunk_size=args.chunk_size,
+            progress=lambda p: print(f"  {p['stage']}: {p['rows']}")
+        )
+        print(f"✅ 已导出 {result['counts']}，{result['bytes'] / 1024 / 1024:.2f} MB，耗时 {result['duration_seconds']} 秒")
+    else:
+        dims = read_manifest(args.in_dir)["dims"]
+        result = import_snapshot(
+            args.in_dir, _open_vector_store(args, dims), graph_execute, args.history_db or None,
+            workers=args.workers, progress=lambda p: print(f"  已完成 {p['finished']}: {p['counts']}")
+        )
+        print(f"✅ 已导入 {result['counts']}，耗时 {result['duration_seconds']} 秒")
@@ -0,0 +1,238 @@
+"""
+嵌入式存储的独占进程 + 多 API 进程转发
+Qdrant 本地模式与 Kuzu 都对数据文件加独占锁，mem0_server.py 只能以单进程运行。
+这里把两者放到一个存储进程中，多个 uvicorn 工作进程通过 Unix socket 转发存储操作:
+
+    uvicorn worker 1 ─┐
+    uvicorn worker 2 ─┼─ Unix socket ─> 存储进程（Qdrant 本地 + Kuzu）
+    uvicorn worker N ─┘
+
+- LLM 与 embedding 调用仍在各工作进程中执行，存储进程只做读写
+- 向量库以属性路径代理转发（vector_store.search / vector_store.client.scroll / ...），
+  调用方代码无需区分本地还是远程
+- 图数据库只转发 Cypher 执行（MemoryGraph.kuzu_execute），实体抽取等 LLM 调用留在工作进程
+- 历史表（SQLite）与 embedding 缓存本身支持多进程，各工作进程直接访问
+- 连接使用 multiprocessing.connection（pickle + authkey 认证），socket 文件权限为 0600
+- 只转发 ALLOWED_PATHS 中登记的属性路径；调用在一把锁内串行执行（Qdrant 本地客户端不是线程安全的）
+
+运行方式（由 mem0_server.py 自动启动，见其 MEM0_API_WORKERS 环境变量）:
+    MEM0_API_WORKERS=4 python mem0_server.py
+"""
+
+import os
+import traceback
+import threading
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, Optional, Tuple
+
+
+DEFAULT_SOCKET_PATH = "./memorydb/storage.sock"
+
+# getattr 时直接返回值（而非代理）的类型
+_PLAIN_TYPES = (str, int, float, bool, type(None), tuple, list, dict)
+
+# 工作进程可以访问的属性路径（mem0 Memory 与本项目各模块用到的向量库 / Qdrant 客户端方法）
+_VECTOR_STORE_ATTRS = (
+    "insert", "search", "search_batch", "keyword_search", "update", "delete", "get", "list",
+    "list_cols", "col_info", "delete_col", "reset", "_create_filter",
+    "collection_name", "embedding_model_dims", "quantization_search_params",
+)
+_QDRANT_CLIENT_ATTRS = (
+    "scroll", "count", "retrieve", "query_points", "query_batch_points", "search", "upsert", "delete",
+    "set_payload", "overwrite_payload", "get_collection", "collection_exists", "create_payload_index",
+)
+ALLOWED_PATHS = frozenset(
+    [("vector_store", name) for name in _VECTOR_STORE_ATTRS]
+    + [("vector_store", "client", name) for name in _QDRANT_CLIENT_ATTRS]
+    + [("kuzu", "execute")]
+)
+# 允许路径的各级前缀（代理逐级 getattr）
+_ALLOWED_PREFIXES = frozenset(path[:i] for path in ALLOWED_PATHS for i in range(1, len(path) + 1))
+
+
+# ============================================
+# 存储进程
+# ============================================
+
+class KuzuExecutor:
+    """在存储进程中执行 Cypher（Kuzu 连接串行使用）"""
+
+    def __init__(self, db_path: str):
+        import kuzu
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db = kuzu.Database(db_path)
+        self.connection = kuzu.Connection(self.db)
+        self._lock = threading.Lock()
+
+    def execute(self, query: str, parameters: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            results = self.connection.execute(query, parameters=parameters or {})
+            return list(results.rows_as_dict())
+
+
+class StorageOwner:
+    """持有嵌入式存储并响应工作进程的请求"""
+
+    def __init__(self, roots: Dict[str, Any], address: str, authkey: bytes):
+        self.roots = roots
+        self.address = address
+        self.authkey = authkey
+        self._stopping = threading.Event()
+        # 各连接线程的调用串行执行
+        self._call_lock = threading.RLock()
+
+    def _resolve(self, path: Tuple[str, ...]) -> Any:
+        if tuple(path) not in _ALLOWED_PREFIXES or path[0] not in self.roots:
+            # AttributeError：调用方的 getattr(obj, name, default) 探测照常退回默认值
+            raise AttributeError(f"不允许访问的属性路径: {'.'.join(map(str, path))}")
+        obj = self.roots[path[0]]
+        for name in path[1:]:
+            obj = getattr(obj, name)
+        return obj
+
+    def _handle(self, op: str, path: Tuple[str, ...], args: tuple, kwargs: dict) -> Tuple[str, Any]:
+        target = self._resolve(path)
+        if op == "getattr":
+            if callable(target):
+                return "callable", None
+            if isinstance(target, _PLAIN_TYPES):
+                return "value", target
+            return "object", None
+        if op == "call":
+            with self._call_lock:
+                return "value", target(*args, **kwargs)
+        raise ValueError(f"未知的操作: {op}")
+
+    def _serve_connection(self, conn):
+        with conn:
+            while not self._stopping.is_set():
+                try:
+                    op, path, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = self._handle(op, path, args, kwargs)
+                except Exception as e:
+                    reply = ("error", e)
+                try:
+                    conn.send(reply)
+                except Exception:
+                    # 结果或异常无法序列化
+                    conn.send(("error", RuntimeError(traceback.format_exc())))
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        os.chmod(self.address, 0o600)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    conn = listener.accept()
+                except Exception:
+                    # 认证失败等，继续等待下一个连接
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+
+def run_owner(
+    address: str,
+    authkey: bytes,
+    vector_config: Dict[str, Any],
+    graph_db: Optional[str] = None
+):
+    """存储进程入口：打开 Qdrant 本地库与 Kuzu，然后开始服务"""
+    from mem0.utils.factory import VectorStoreFactory
+    from payload_index import ensure_payload_indexes
+
+    vector_store = VectorStoreFactory.create("qdrant", dict(vector_config))
+    ensure_payload_indexes(vector_store.client, vector_store.collection_name)
+    roots: Dict[str, Any] = {
+        "vector_store": vector_store,
+    }
+    if graph_db:
+        roots["kuzu"] = KuzuExecutor(graph_db)
+    print(f"🗄️  存储进程已就绪 (pid {os.getpid()}, socket {address})")
+    StorageOwner(roots, address, authkey).serve_forever()
+
+
+# ============================================
+# 工作进程侧
+# ============================================
+
+class StorageClient:
+    """每个线程一条到存储进程的连接"""
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+        self.requests = 0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def request(self, op: str, path: Tuple[str, ...], args: tuple = (), kwargs: Optional[dict] = None):
+        conn = self._connection()
+        try:
+            conn.send((op, path, args, kwargs or {}))
+            status, payload = conn.recv()
+        except (EOFError, OSError):
+            # 连接已断开，下次请求重新建立（本次不重试，写操作不一定幂等）
+            self._local.conn = None
+            raise
+        self.requests += 1
+        if status == "error":
+            raise payload
+        return status, payload
+
+    def proxy(self, root: str) -> "RemoteProxy":
+        return RemoteProxy(self, (root,))
+
+
+class RemoteProxy:
+    """按属性路径转发到存储进程的代理；普通值属性取一次后缓存"""
+
+    def __init__(self, client: StorageClient, path: Tuple[str, ...]):
+        self._client = client
+        self._path = path
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        path = self._path + (name,)
+        kind, value = self._client.request("getattr", path)
+        result = value if kind == "value" else RemoteProxy(self._client, path)
+        setattr(self, name, result)
+        return result
+
+    def __call__(self, *args, **kwargs):
+        return self._client.request("call", self._path, args, kwargs)[1]
+
+    def __repr__(self) -> str:
+        return f"<RemoteProxy {'.'.join(self._path)}>"
+
+
+def attach_remote_storage(memory, address: str, authkey: bytes) -> StorageClient:
+    """把 Memory 实例的向量库替换为远程代理，图数据库的 Cypher 执行转发到存储进程"""
+    client = StorageClient(address, authkey)
+    memory.vector_store = client.proxy("vector_store")
+
+    graph = getattr(memory, "graph", None)
+    if graph is not None:
+        kuzu = client.proxy("kuzu")
+
+        def kuzu_execute(query, parameters=None):
+            return kuzu.execute(query, parameters)
+
+        graph.kuzu_execute = kuzu_execute
+        # 在真实的图数据库上建表（IF NOT EXISTS）
+        graph.kuzu_create_schema()
+    return client
@@ -68,9 +68,17 @@ class Mem0Client:
         user_id: str = "default_user",
         agent_id: Optional[str] = None,
         infer: bool = False,
-        memory_type: Optional[str] = None
+        memory_type: Optional[str] = None,
+        async_mode: bool = False,
+        graph: str = "on",
+        run_id: Optional[str] = None,
+        incremental: bool = False
     ) -> Dict[str, Any]:
-        """添加记忆"""
+        """
+        添加记忆（async_mode=True 时立即返回 job_id；graph 可选 on / off / only / deferred）
+
+        incremental=True 时程序性记忆按 (agent_id, run_id) 增量摘要，每次只需发送新的执行步骤
+        """
         data = {
             "messages": messages,
             "user_id": user_id,
@@ -78,30 +86,87 @@ class Mem0Client:
         }
         if agent_id is not None:
             data["agent_id"] = agent_id
+        if run_id is not None:
+            data["run_id"] = run_id
         if memory_type is not None:
             data["memory_type"] = memory_type
+        if incremental:
+            data["incremental"] = True
+        if async_mode:
+            data["async_mode"] = True
+        if graph != "on":
+            data["graph"] = graph
         response = requests.post(f"{self.base_url}/memories", json=data)
         return response.json()
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        """查询异步添加任务的状态"""
+        response = requests.get(f"{self.base_url}/jobs/{job_id}")
+        return response.json()
+
+    def add_memories_batch(
+        self,
+        items: List[Dict[str, Any]],
+        llm_concurrency: int = 8
+    ) -> Dict[str, Any]:
+        """批量添加记忆，items 中每一项与 add_memory 的请求体格式相同"""
+        data = {
+            "items": items,
+            "llm_concurrency": llm_concurrency
+        }
+        response = requests.post(f"{self.base_url}/memories/batch", json=data)
+        return response.json()
     
     def search_memories(
         self,
         query: str,
         user_id: str = "default_user",
-        limit: int = 5
+        limit: int = 5,
+        graph: str = "on",
+        mode: str = "vector"
     ) -> Dict[str, Any]:
-        """搜索记忆"""
+        """搜索记忆（graph 可选 on / off / only，mode 可选 vector / lexical / hybrid）"""
         data = {
             "query": query,
             "user_id": user_id,
-            "limit": limit
+            "limit": limit,
+            "graph": graph,
+            "mode": mode
         }
         response = requests.post(f"{self.base_url}/memories/search", json=data)
         return response.json()
     
+    def search_memories_batch(
+        self,
+        queries: List[str],
+        user_id: str = "default_user",
+        limit: int = 5,
+        merge: bool = False
+    ) -> Dict[str, Any]:
+        """批量搜索记忆（共用一次 embedding 请求）"""
+        data = {
+            "queries": queries,
+            "user_id": user_id,
+            "limit": limit,
+            "merge": merge
+        }
+        response = requests.post(f"{self.base_url}/memories/search/batch", json=data)
+        return response.json()
+    
     def get_all_memories(self, user_id: str = "default_user") -> Dict[str, Any]:
-        """获取所有记忆"""
+        """获取所有记忆（第一页）"""
         response = requests.get(f"{self.base_url}/memories", params={"user_id": user_id})
         return response.json()
+
+    def stream_memories(self, user_id: str = "default_user", fields: Optional[str] = None):
+        """以 NDJSON 流逐条读取用户的全部记忆"""
+        params = {"user_id": user_id}
+        if fields:
+            params["fields"] = fields
+        with requests.get(f"{self.base_url}/memories/stream", params=params, stream=True) as response:
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    yield json.loads(line)
     
     def get_memory(self, memory_id: str) -> Dict[str, Any]:
         """获取指定记忆"""
@@ -119,14 +184,31 @@ class Mem0Client:
         response = requests.delete(f"{self.base_url}/memories/{memory_id}")
         return response.json()
     
-    def delete_all_memories(self, user_id: str = "default_user") -> Dict[str, Any]:
-        """删除所有记忆"""
-        response = requests.delete(f"{self.base_url}/memories", params={"user_id": user_id})
+    def delete_all_memories(self, user_id: str = "default_user", async_mode: bool = False) -> Dict[str, Any]:
+        """删除所有记忆（async_mode=True 时立即返回 job_id，进度通过 get_job 查询）"""
+        params = {"user_id": user_id}
+        if async_mode:
+            params["async_mode"] = "true"
+        response = requests.delete(f"{self.base_url}/memories", params=params)
         return response.json()
     
-    def get_history(self, user_id: str = "default_user") -> Dict[str, Any]:
-        """获取历史记录"""
-        response = requests.get(f"{self.base_url}/history", params={"user_id": user_id})
+    def get_history(
+        self,
+        user_id: str = "default_user",
+        memory_id: Optional[str] = None,
+        event: Optional[str] = None,
+        cursor: Optional[str] = None,
+        page_size: int = 100
+    ) -> Dict[str, Any]:
+        """获取记忆变更历史（ADD / UPDATE / DELETE 事件）"""
+        params = {"user_id": user_id, "page_size": page_size}
+        if memory_id:
+            params["memory_id"] = memory_id
+        if event:
+            params["event"] = event
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(f"{self.base_url}/history", params=params)
         return response.json()
 
 
@@ -170,7 +252,7 @@ class AgentMemoryTest:
         ]
         print("原始 messages: ", messages1)
 
-        result1 = self.client.add_memory(messages1, user_id=user_id, agent_id=agent_id, infer=True, memory_type=memory_type)
+        result1 = self.client.add_memory(messages1, user_id=user_id, agent_id=agent_id, run_id=run_id, infer=True, memory_type=memory_type, incremental=True)
         print_result("Agent 开始任务记忆", result1)
 
         # 测试用例 2: Agent 执行中 - 发现内容
@@ -187,7 +269,7 @@ class AgentMemoryTest:
         ]
         print("原始 messages: ", messages2)
 
-        result2 = self.client.add_memory(messages2, user_id=user_id, agent_id=agent_id, infer=True, memory_type=memory_type)
+        result2 = self.client.add_memory(messages2, user_id=user_id, agent_id=agent_id, run_id=run_id, infer=True, memory_type=memory_type, incremental=True)
         print_result("Agent 保存网页内容记忆", result2)
 
         # 测试用例 3: Agent 完成任务
@@ -204,7 +286,7 @@ class AgentMemoryTest:
         ]
         print("原始 messages: ", messages3)
 
-        result3 = self.client.add_memory(messages3, user_id=user_id, agent_id=agent_id, infer=True, memory_type=memory_type)
+        result3 = self.client.add_memory(messages3, user_id=user_id, agent_id=agent_id, run_id=run_id, infer=True, memory_type=memory_type, incremental=True)
         print_result("Agent 完成任务记忆", result3)
 
         # 测试用例 4: 搜索相关记忆
@@ -410,11 +492,21 @@ class AgentMemoryTest:
         )
         print_result("搜索跨运行记忆", search_result)
 
+        # 多条相关查询一次请求完成
+        print("\n📝 批量搜索多条相关查询")
+        batch_result = self.client.search_memories_batch(
+            queries=["用户喜欢什么新闻", "推荐内容", f"Agent {agent_id}"],
+            user_id=user_id,
+            limit=5,
+            merge=True
+        )
+        print_result("批量搜索跨运行记忆", batch_result)
+
         return {
             "agent_id": agent_id,
             "user_id": user_id,
             "runs": [run_id_1, run_id_2],
-            "results": [result1, result2, search_result]
+            "results": [result1, result2, search_result, batch_result]
         }
 
     def test_procedural_memory_scenario(self):